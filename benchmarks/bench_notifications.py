@@ -0,0 +1,110 @@
+"""
+Comparison of the ring buffer NotificationManager against the previous list-based
+implementation, which used bisect.insort followed by a full reverse and a slice on
+every insert.
+
+Each run adds N notifications, then reads the most recent and the first 40. Two buffer
+sizes are measured: the default of 100, and a buffer as large as N. The list-based
+implementation is quadratic with a buffer of N, so it is skipped above --legacy-limit.
+
+Run from the repository root:
+    python -m benchmarks.bench_notifications --sizes 10000 100000 1000000
+"""
+
+import argparse
+import bisect
+import time
+from typing import Optional
+
+from notifications import Notification, NotificationManager, NotificationSource
+
+
+class LegacyNotificationManager:
+    """
+    The list-based NotificationManager, as it was before the ring buffer.
+    """
+
+    def __init__(self):
+        self.buffer_max_size = 100
+        self.notification_buffer = []
+
+    def update_buffer_size(self, new_buffer_size: int):
+        self.buffer_max_size = new_buffer_size
+
+    def add_notification(self, new_notification: Notification, cull_records: bool = True) -> int:
+        bisect.insort(self.notification_buffer, new_notification, key=lambda x: x.notification_time)
+        self.notification_buffer.reverse()
+
+        if cull_records:
+            self.notification_buffer = self.notification_buffer[: self.buffer_max_size]
+
+        return len(self.notification_buffer)
+
+    def get_most_recent_notification(self, re_sort: bool = True) -> Notification:
+        if re_sort:
+            self.notification_buffer.sort(key=lambda notification: notification.notification_time)
+
+        return self.notification_buffer[0]
+
+    def get_notifications(self, number_of_notifications: Optional[int] = None) -> list[Notification]:
+        return (
+            self.notification_buffer[:number_of_notifications]
+            if number_of_notifications
+            else self.notification_buffer
+        )
+
+
+def build_notifications(count: int) -> list[Notification]:
+    return [
+        Notification(title=f"Notification {index}", text="benchmark", source=NotificationSource.TEST)
+        for index in range(count)
+    ]
+
+
+def measure(manager_class, notifications: list[Notification], buffer_size: int) -> tuple[float, float]:
+    """
+    Returns:
+        Seconds spent adding every notification, and seconds spent reading afterwards.
+    """
+    manager = manager_class()
+    manager.update_buffer_size(buffer_size)
+
+    start = time.perf_counter()
+    for notification in notifications:
+        manager.add_notification(notification)
+    add_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    manager.get_most_recent_notification(re_sort=True)
+    for _ in manager.get_notifications(40):
+        pass
+    read_time = time.perf_counter() - start
+
+    return add_time, read_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-limit", type=int, default=20_000)
+    arguments = parser.parse_args()
+
+    print(f"{'notifications':>13} {'buffer':>8} {'implementation':>15} {'add s':>9} {'per add us':>11} {'read ms':>9}")
+    for size in arguments.sizes:
+        notifications = build_notifications(size)
+
+        for buffer_size in (100, size):
+            for name, manager_class in (("list", LegacyNotificationManager), ("ring", NotificationManager)):
+                if manager_class is LegacyNotificationManager and buffer_size > arguments.legacy_limit:
+                    print(f"{size:>13} {buffer_size:>8} {name:>15} {'skipped':>9}")
+                    continue
+
+                add_time, read_time = measure(manager_class, notifications, buffer_size)
+                print(
+                    f"{size:>13} {buffer_size:>8} {name:>15} {add_time:>9.3f}"
+                    f" {add_time / size * 1e6:>11.2f} {read_time * 1e3:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
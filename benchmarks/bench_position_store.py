@@ -0,0 +1,103 @@
+"""
+Memory and throughput comparison of the two Ticker position stores: the default
+dict-of-Position-objects layout, and the columnar array-backed layout.
+
+Run from the repository root:
+    python -m benchmarks.bench_position_store --sizes 1000 10000 100000
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from classes import Position, Ticker
+
+
+def build_records(count: int) -> list[tuple[float, float, bool]]:
+    """
+    Generate a reproducible list of (share_count, share_value, is_sell) records.
+    """
+    generator = random.Random(count)
+    return [
+        (float(generator.randint(1, 500)), generator.uniform(1, 500), generator.random() < 0.2)
+        for _ in range(count)
+    ]
+
+
+def fill_ticker(records: list[tuple[float, float, bool]], columnar: bool) -> Ticker:
+    """
+    Create a position for every record and store it on a new ticker, as buy/sell do.
+    """
+    ticker = Ticker("BENCH", columnar=columnar)
+    positions = ticker.positions
+    for share_count, share_value, is_sell in records:
+        position = Position(share_count=share_count, share_value=share_value, is_sell=is_sell)
+        positions[position.id] = position
+
+    return ticker
+
+
+def measure_store(records: list[tuple[float, float, bool]], columnar: bool) -> dict[str, float]:
+    """
+    Fill a ticker with positions built from the given records and measure the cost.
+
+    Arguments:
+        records: (share_count, share_value, is_sell) tuples to load into the ticker.
+        columnar: Whether the ticker should use the columnar store.
+
+    Returns:
+        Dictionary of timings in seconds and retained memory in bytes.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    ticker = fill_ticker(records, columnar=columnar)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in ticker.positions.records():
+        pass
+    records_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in ticker.positions.values():
+        pass
+    iterate_time = time.perf_counter() - start
+
+    # Memory is measured on a second, traced, run so tracing does not skew the timings.
+    del ticker
+    gc.collect()
+    tracemalloc.start()
+    ticker = fill_ticker(records, columnar=columnar)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "insert_s": insert_time,
+        "records_s": records_time,
+        "iterate_s": iterate_time,
+        "retained_bytes": retained,
+        "peak_bytes": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    arguments = parser.parse_args()
+
+    print(f"{'positions':>10} {'layout':>9} {'insert s':>10} {'records s':>10} {'iterate s':>10} {'retained MB':>12}")
+    for size in arguments.sizes:
+        records = build_records(size)
+        for layout, columnar in (("dict", False), ("columnar", True)):
+            result = measure_store(records, columnar=columnar)
+            print(
+                f"{size:>10} {layout:>9} {result['insert_s']:>10.4f} {result['records_s']:>10.4f}"
+                f" {result['iterate_s']:>10.4f} {result['retained_bytes'] / 1e6:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Throughput of the price feed pipeline: parsing quote lines, batching them, and
+revaluing a portfolio, for a portfolio of --tickers tickers receiving --ticks quotes.
+
+Run from the repository root:
+    python -m benchmarks.bench_pricefeed --ticks 1000000 --tickers 500
+"""
+
+import argparse
+import random
+import time
+
+from classes import Portfolio, Position
+from pricefeed import PriceFeed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=1_000_000)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    arguments = parser.parse_args()
+
+    generator = random.Random(0)
+    ticker_names = [f"T{index:04d}" for index in range(arguments.tickers)]
+
+    portfolio = Portfolio("Benchmark")
+    for ticker_name in ticker_names:
+        portfolio.buy_position(ticker_name, Position(share_count=100, share_value=generator.uniform(10, 100)))
+
+    lines = [
+        f"{generator.choice(ticker_names)} {generator.uniform(10, 100):.2f}\n" for _ in range(arguments.ticks)
+    ]
+
+    price_feed = PriceFeed(portfolio)
+    start = time.perf_counter()
+    price_feed.run(lines, batch_size=arguments.batch_size)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{arguments.ticks} ticks over {arguments.tickers} tickers in {elapsed:.2f} seconds"
+        f" ({arguments.ticks / elapsed:,.0f} ticks/s), {price_feed.prices_applied} revaluations."
+    )
+
+
+if __name__ == "__main__":
+    main()
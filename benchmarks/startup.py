@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark for one-shot runs, such as `python main.py buy AAPL 10 150` from a
+shell script, where interpreter start-up and imports dominate.
+
+Each command is run --runs times in a fresh interpreter, against a scratch data
+directory holding a small saved portfolio. The median wall time is reported beside that
+of a bare interpreter, and the run fails, exiting with status 1, if any median is over
+--budget seconds.
+
+Run from the repository root:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 50 --budget 0.08
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Median seconds allowed for a one-shot command, interpreter start-up included.
+STARTUP_BUDGET_SECONDS = 0.1
+
+COMMANDS = [
+    ["holdings"],
+    ["buy", "AAPL", "10", "150"],
+    ["sell", "AAPL", "1", "155"],
+]
+
+# Modules a one-shot run should never import.
+DEFERRED_MODULES = ["asyncio", "concurrent.futures", "event_loop", "multi_portfolio", "pricefeed", "cProfile"]
+
+
+def time_command(arguments: list[str], runs: int, environment: dict[str, str]) -> float:
+    """
+    Run a command in a fresh interpreter runs times.
+
+    Returns:
+        The median wall time, in seconds.
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], env=environment, stdout=subprocess.DEVNULL, check=False)
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations)
+
+
+def imported_modules(command: list[str], environment: dict[str, str]) -> set[str]:
+    """
+    Names of the modules imported by a one-shot run of command.
+    """
+    script = (
+        "import sys, main\n"
+        f"sys.argv = ['main.py', *{command!r}]\n"
+        "try:\n    main.main()\nexcept SystemExit:\n    pass\n"
+        "print(' '.join(sys.modules), file=sys.stderr)"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script], env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+
+    return set(completed.stderr.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="Runs of each command; the median is kept.")
+    parser.add_argument(
+        "--budget", type=float, default=STARTUP_BUDGET_SECONDS, help="Median seconds allowed per command."
+    )
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_directory:
+        environment = {**os.environ, "CLIP_DATA_DIR": data_directory}
+        for _ in range(100):
+            subprocess.run([sys.executable, "main.py", *COMMANDS[1]], env=environment, check=True)
+
+        interpreter_seconds = time_command(["-c", "pass"], arguments.runs, environment)
+        print(f"{'python -c pass':<34} {interpreter_seconds:>8.4f} s")
+
+        over_budget = []
+        for command in COMMANDS:
+            seconds = time_command(["main.py", *command], arguments.runs, environment)
+            label = " ".join(command)
+            print(f"{label:<34} {seconds:>8.4f} s  (+{seconds - interpreter_seconds:.4f} s over the interpreter)")
+            if seconds > arguments.budget:
+                over_budget.append(f"{label}: {seconds:.4f} s, budget {arguments.budget:.4f} s")
+
+            deferred = sorted(set(DEFERRED_MODULES) & imported_modules(command, environment))
+            if deferred:
+                over_budget.append(f"{label}: imports {', '.join(deferred)}")
+
+    for line in over_budget:
+        print(f"OVER BUDGET {line}")
+    if over_budget:
+        sys.exit(1)
+
+    print(f"Every command within {arguments.budget:.4f} s.")
+
+
+if __name__ == "__main__":
+    main()
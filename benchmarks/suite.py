@@ -0,0 +1,433 @@
+"""
+Benchmark suite for the hot paths: creating positions and notifications, notifications,
+ticker and portfolio updates, bulk trade import, export, historical valuation, display
+assembly and command parsing.
+
+Each benchmark is run at every size in --sizes. Timings are the best of --repeat runs,
+each on freshly built inputs from a fixed seed; memory is the peak traced by
+tracemalloc during a separate run. Building the inputs is not measured.
+
+Results can be saved as a JSON baseline, and a later run compared against it. The run
+fails, exiting with status 1, if any benchmark is slower or uses more memory than the
+baseline by more than --threshold. Timings shorter than --min-seconds are not compared,
+as they are mostly noise.
+
+Run from the repository root:
+    python -m benchmarks.suite --save baseline.json
+    python -m benchmarks.suite --baseline baseline.json --threshold 0.2
+    python -m benchmarks.suite --sizes 1000000 --only ticker.sell_position
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from typing import Callable, Optional
+
+from classes import Command, Portfolio, Position, Ticker
+from cli_utils import parse_command
+from export import export_portfolio
+from graphics import combine_segments, queue_notifications
+from notifications import Notification, NotificationManager, NotificationSource
+from trade_import import ImportSummary, find_columns, parse_chunk
+from valuation import value_portfolio
+
+
+# A benchmark builds its inputs for a given size, and returns the operation to measure.
+Benchmark = Callable[[int, random.Random], Callable[[], object]]
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str):
+    def register(setup: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def build_notifications(size: int, generator: random.Random) -> list[Notification]:
+    return [
+        Notification(
+            title=f"Notification {index}",
+            text="".join(generator.choices("abcdefghij ", k=generator.randint(10, 120))),
+            subtitle=f"Subtitle {index}" if generator.random() < 0.5 else None,
+            source=NotificationSource.TEST,
+        )
+        for index in range(size)
+    ]
+
+
+def build_positions(size: int, generator: random.Random, is_sell: bool = False) -> list[Position]:
+    return [
+        Position(share_count=generator.randint(1, 10), share_value=generator.uniform(1, 100), is_sell=is_sell)
+        for _ in range(size)
+    ]
+
+
+@benchmark("classes.Position")
+def bench_create_positions(size: int, generator: random.Random):
+    share_prices = [generator.uniform(1, 100) for _ in range(size)]
+
+    def run():
+        # Kept alive until the end, so peak memory covers every position.
+        return [Position(share_count=10, share_value=share_price) for share_price in share_prices]
+
+    return run
+
+
+@benchmark("classes.Position.create_many")
+def bench_create_many_positions(size: int, generator: random.Random):
+    share_prices = [generator.uniform(1, 100) for _ in range(size)]
+
+    return lambda: Position.create_many([10] * size, share_prices)
+
+
+@benchmark("notifications.Notification")
+def bench_create_notifications(size: int, generator: random.Random):
+    texts = ["".join(generator.choices("abcdefghij ", k=40)) for _ in range(size)]
+
+    def run():
+        return [Notification(title="Notification", text=text, source=NotificationSource.TEST) for text in texts]
+
+    return run
+
+
+@benchmark("notifications.add_notification")
+def bench_add_notification(size: int, generator: random.Random):
+    notifications = build_notifications(size, generator)
+    notification_manager = NotificationManager()
+    notification_manager.update_buffer_size(size)
+
+    def run():
+        for notification in notifications:
+            notification_manager.add_notification(notification)
+
+    return run
+
+
+@benchmark("notifications.get_notifications")
+def bench_get_notifications(size: int, generator: random.Random):
+    notification_manager = NotificationManager()
+    notification_manager.update_buffer_size(size)
+    for notification in build_notifications(size, generator):
+        notification_manager.add_notification(notification)
+
+    def run():
+        for _ in notification_manager.get_notifications(40):
+            pass
+        for _ in notification_manager.get_notifications(valid_only=True):
+            pass
+
+    return run
+
+
+@benchmark("notifications.get_notifications.source")
+def bench_get_notifications_by_source(size: int, generator: random.Random):
+    # A busy feed, with the occasional system alert to pick out.
+    notification_manager = NotificationManager()
+    notification_manager.update_buffer_size(size)
+    for notification in build_notifications(size, generator):
+        if generator.random() < 0.99:
+            notification.source = NotificationSource.FEED
+        notification_manager.add_notification(notification)
+
+    def run():
+        for _ in notification_manager.get_notifications(valid_only=True, source=NotificationSource.SYSTEM):
+            pass
+        notification_manager.get_notification_count(NotificationSource.FEED, valid_only=True)
+
+    return run
+
+
+@benchmark("ticker.add_position")
+def bench_ticker_add_position(size: int, generator: random.Random):
+    positions = build_positions(size, generator)
+    ticker = Ticker("BENCH")
+
+    def run():
+        for position in positions:
+            ticker.add_position(position)
+
+    return run
+
+
+@benchmark("ticker.sell_position")
+def bench_ticker_sell_position(size: int, generator: random.Random):
+    ticker = Ticker("BENCH")
+    for position in build_positions(size, generator):
+        ticker.add_position(position)
+
+    # Sell half the shares held, in sells a little smaller than the average buy.
+    sells = []
+    shares_to_sell = ticker.total_shares / 2
+    while shares_to_sell > 0:
+        sell = Position(share_count=min(generator.randint(1, 8), shares_to_sell), share_value=50.0, is_sell=True)
+        shares_to_sell -= sell.number_of_shares
+        sells.append(sell)
+
+    def run():
+        for sell in sells:
+            ticker.sell_position(sell)
+
+    return run
+
+
+@benchmark("ticker.remove_position")
+def bench_ticker_remove_position(size: int, generator: random.Random):
+    ticker = Ticker("BENCH")
+    position_ids = []
+    for position in build_positions(size, generator):
+        ticker.add_position(position)
+        position_ids.append(position.id)
+    generator.shuffle(position_ids)
+
+    def run():
+        for position_id in position_ids:
+            ticker.remove_position(position_id)
+
+    return run
+
+
+@benchmark("portfolio.buy_position")
+def bench_portfolio_buy_position(size: int, generator: random.Random):
+    ticker_names = [f"T{index:03d}" for index in range(100)]
+    orders = [(generator.choice(ticker_names), position) for position in build_positions(size, generator)]
+    portfolio = Portfolio("Benchmark")
+
+    def run():
+        for ticker_name, position in orders:
+            portfolio.buy_position(ticker_name, position)
+
+    return run
+
+
+@benchmark("portfolio.import_positions")
+def bench_portfolio_import_positions(size: int, generator: random.Random):
+    # The same trades as portfolio.buy_position, applied in bulk.
+    ticker_names = [f"T{index:03d}" for index in range(100)]
+    orders = [(generator.choice(ticker_names), position) for position in build_positions(size, generator)]
+    portfolio = Portfolio("Benchmark")
+
+    return lambda: portfolio.import_positions(orders)
+
+
+@benchmark("trade_import.parse_chunk")
+def bench_parse_chunk(size: int, generator: random.Random):
+    columns = find_columns(["Date", "Symbol", "Action", "Quantity", "Price"])
+    rows = [
+        [
+            f"2024-{generator.randint(1, 12):02d}-{generator.randint(1, 28):02d}",
+            f"T{generator.randrange(100):03d}",
+            "Buy",
+            str(generator.randint(1, 10)),
+            f"{generator.uniform(1, 100):.2f}",
+        ]
+        for _ in range(size)
+    ]
+
+    return lambda: parse_chunk(rows, columns, 2, ImportSummary())
+
+
+@benchmark("valuation.value_portfolio")
+def bench_value_portfolio(size: int, generator: random.Random):
+    # Ten tickers, each with size daily closes and size / 10 buys spread across them.
+    ticker_names = [f"T{index:03d}" for index in range(10)]
+    close_timestamps = array("d", (1_500_000_000.0 + day * 86_400 for day in range(size)))
+    histories = {
+        ticker_name: (close_timestamps, array("d", (generator.uniform(1, 100) for _ in range(size))))
+        for ticker_name in ticker_names
+    }
+    portfolio = Portfolio("Benchmark")
+    for position in build_positions(size, generator):
+        position.timestamp_ns = int(generator.choice(close_timestamps)) * 1_000_000_000
+        portfolio.buy_position(generator.choice(ticker_names), position)
+
+    return lambda: value_portfolio(portfolio, histories)
+
+
+@benchmark("export.positions")
+def bench_export_positions(size: int, generator: random.Random):
+    # Streamed to nowhere, so the peak memory is the export's own.
+    portfolio = Portfolio("Benchmark", columnar=True)
+    ticker_names = [f"T{index:03d}" for index in range(100)]
+    portfolio.import_positions(
+        [(generator.choice(ticker_names), position) for position in build_positions(size, generator)]
+    )
+
+    return lambda: export_portfolio(portfolio, "positions", "csv", os.devnull)
+
+
+@benchmark("graphics.queue_notifications")
+def bench_queue_notifications(size: int, generator: random.Random):
+    notifications = build_notifications(size, generator)
+
+    return lambda: queue_notifications(iter(notifications))
+
+
+@benchmark("graphics.queue_notifications.unbounded")
+def bench_queue_all_notifications(size: int, generator: random.Random):
+    notifications = build_notifications(size, generator)
+
+    return lambda: queue_notifications(notifications, max_lines=None)
+
+
+@benchmark("graphics.combine_segments")
+def bench_combine_segments(size: int, generator: random.Random):
+    # Distinct rows, so the row formatting cache does not hide the work.
+    panel_segment = [f"panel row {index}" for index in range(size)]
+    notification_segment = [f"notification row {index}" for index in range(size)]
+
+    return lambda: combine_segments(panel_segment, notification_segment)
+
+
+@benchmark("cli_utils.parse_command")
+def bench_parse_command(size: int, generator: random.Random):
+    # Mostly known commands, with some unknown ones that are not reported.
+    words = [command.value for command in Command] + ["unknown"]
+    raw_commands = [[generator.choice(words), "ABC", "10", "5.0"] for _ in range(size)]
+
+    def run():
+        for raw_command in raw_commands:
+            parse_command(raw_command, command_assist=False, report_unknown=False)
+
+    return run
+
+
+def measure(name: str, size: int, repeat: int = 3, seed: int = 0) -> dict[str, float]:
+    """
+    Time and trace one benchmark at one size.
+
+    Returns:
+        Dictionary of the best time in seconds, and the peak traced memory in bytes.
+    """
+    setup = BENCHMARKS[name]
+
+    best_seconds = float("inf")
+    for _ in range(repeat):
+        run = setup(size, random.Random(seed))
+        gc.collect()
+
+        start = time.perf_counter()
+        run()
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+
+    # Memory is measured on its own run, as tracing slows everything down.
+    run = setup(size, random.Random(seed))
+    gc.collect()
+    tracemalloc.start()
+    run()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"seconds": best_seconds, "peak_bytes": peak_bytes}
+
+
+def run_suite(
+    sizes: list[int], names: Optional[list[str]] = None, repeat: int = 3, report: Callable[[str], None] = print
+) -> dict[str, dict[str, float]]:
+    """
+    Measure every benchmark, or those named, at every size.
+
+    Returns:
+        Dictionary of 'name@size' to its measurements.
+    """
+    results = {}
+
+    for name in names or BENCHMARKS:
+        for size in sizes:
+            result = results[f"{name}@{size}"] = measure(name, size, repeat=repeat)
+            report(
+                f"{name:<34} {size:>9} {result['seconds']:>10.4f} s"
+                f" {result['seconds'] / size * 1e6:>9.3f} us/op {result['peak_bytes'] / 2**20:>9.2f} MiB"
+            )
+
+    return results
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+    min_seconds: float = 0.01,
+) -> list[str]:
+    """
+    Compare results against a baseline.
+
+    Arguments:
+        results: Measurements from this run.
+        baseline: Measurements from the baseline run. Benchmarks missing from either are
+            not compared.
+        threshold: Fraction by which a time or memory peak may exceed the baseline.
+        min_seconds: Optional time below which timings are too noisy to compare.
+
+    Returns:
+        A description of each regression found.
+    """
+    regressions = []
+
+    for key, result in results.items():
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+
+        seconds, expected_seconds = result["seconds"], expected["seconds"]
+        if max(seconds, expected_seconds) >= min_seconds and seconds > expected_seconds * (1 + threshold):
+            # A coarse timer can record a trivial baseline as 0 seconds.
+            regressions.append(
+                f"{key}: {seconds:.4f} s, baseline {expected_seconds:.4f} s"
+                f" ({seconds / max(expected_seconds, 1e-9) - 1:+.0%})"
+            )
+
+        if result["peak_bytes"] > expected["peak_bytes"] * (1 + threshold):
+            regressions.append(
+                f"{key}: peak {result['peak_bytes']} bytes, baseline {expected['peak_bytes']} bytes"
+                f" ({result['peak_bytes'] / max(expected['peak_bytes'], 1) - 1:+.0%})"
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run. Defaults to all.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark; the best is kept.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results to PATH as a JSON baseline.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compare the results to a saved baseline.")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed slowdown or memory growth over the baseline."
+    )
+    parser.add_argument(
+        "--min-seconds", type=float, default=0.01, help="Timings below this are too noisy to compare."
+    )
+    arguments = parser.parse_args()
+
+    results = run_suite(arguments.sizes, arguments.only, repeat=arguments.repeat)
+
+    if arguments.save:
+        with open(arguments.save, "w") as baseline_file:
+            json.dump({"python": platform.python_version(), "results": results}, baseline_file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+        regressions = find_regressions(results, baseline, arguments.threshold, arguments.min_seconds)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+        print(f"No regressions beyond {arguments.threshold:.0%} of the baseline.")
+
+
+if __name__ == "__main__":
+    main()
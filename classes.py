@@ -1,14 +1,40 @@
 import time
 import os
 import datetime
+import gc
+import threading
+from contextlib import ExitStack, contextmanager
+from array import array
 from enum import Enum
-from typing import Optional
+from itertools import repeat
+from operator import mul
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from clock import NANOSECONDS_PER_SECOND, from_ns, now_ns, to_ns, to_timestamp
+from fuzzy import FuzzyIndex
+from history import TradeHistory
+from instrumentation import Stats
+from lots import SHARE_EPSILON, LotBook, LotMatch, LotPolicy
+from timeline import TimeIndex
 
 
 class Command(Enum):
     BUY = "buy"
     SELL = "sell"
     QUIT = "quit"
+    HOLDINGS = "holdings"
+    TRADES = "trades"
+    PRICE = "price"
+    FEED = "feed"
+    STATS = "stats"
+    UNDO = "undo"
+    REDO = "redo"
+    VALUATION = "valuation"
+    HISTORY = "history"
+    IMPORT = "import"
+    EXPORT = "export"
+    POSITIONS = "positions"
+    RISK = "risk"
     JOEY = "JOEY"
 
 
@@ -26,6 +52,15 @@ class SystemConfig:
         main_loop_continue: Bool indicating whether main execution loop
             should be allowed to continue.
         start_time: time.time object represent program initialisation.
+        data_directory: Directory where CLIP keeps persisted state. Taken from the
+            CLIP_DATA_DIR environment variable, defaulting to ~/.clip.
+        transaction_log: The TransactionLog recording trades, if persistence is in use.
+        notification_manager: The NotificationManager for this execution, if any.
+        interactive: Bool indicating whether a user is at the prompt. When False,
+            commands should not print or ask for input.
+        stats: Stats instrumentation for this execution, disabled unless turned on.
+        risk_engine: The RiskEngine keeping risk figures between risk commands, made by
+            the first one.
     """
 
     def __init__(self):
@@ -34,6 +69,12 @@ class SystemConfig:
         """
         self.main_loop_continue = True
         self.start_time = time.time()
+        self.data_directory = os.environ.get("CLIP_DATA_DIR", os.path.join(os.path.expanduser("~"), ".clip"))
+        self.transaction_log = None
+        self.notification_manager = None
+        self.interactive = True
+        self.stats = Stats()
+        self.risk_engine = None
 
     def freeze(self):
         """
@@ -43,6 +84,79 @@ class SystemConfig:
         self.uptime = self.end_time - self.start_time
 
 
+# Width of the hexadecimal position identifier, used when ids are stored as integers.
+POSITION_ID_WIDTH = 16
+
+
+class PositionIdAllocator:
+    """Hands out unique, printable 64-bit position ids.
+
+    Ids are allocated in blocks of 4096. Each block takes a random 52-bit prefix from
+    os.urandom, so one system call covers a whole block, and ids from different sessions
+    or processes almost never collide. The low 12 bits count through the block, and
+    their hex digits are precomputed, so an id costs one string concatenation rather
+    than formatting a 64-bit integer.
+    """
+
+    block_bits = 12
+    _suffixes = [f"{index:03X}" for index in range(1 << block_bits)]
+
+    def __init__(self):
+        self._block: Iterator[str] = iter(())
+
+    def reset(self):
+        """
+        Discard the rest of the current block, so the next id starts a new one. Called
+        in forked children, which would otherwise repeat their parent's ids.
+        """
+        self._block = iter(())
+
+    def allocate(self) -> str:
+        position_id = next(self._block, None)
+
+        if position_id is None:
+            prefix = f"{int.from_bytes(os.urandom(7), 'big') >> 4:0{POSITION_ID_WIDTH - 3}X}"
+            self._block = map(prefix.__add__, self._suffixes)
+            position_id = next(self._block)
+
+        return position_id
+
+
+_gc_pause_lock = threading.Lock()
+_gc_pauses = 0
+_gc_was_enabled = False
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while allocating many objects. Each allocation
+    otherwise counts towards triggering a collection, and full collections revisit
+    every object already allocated, so bulk loads spend much of their time collecting
+    objects that are all still alive.
+    """
+    global _gc_pauses, _gc_was_enabled
+
+    # Counted across threads, so one thread's pause ending does not end another's.
+    with _gc_pause_lock:
+        if not _gc_pauses:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_pause_lock:
+            _gc_pauses -= 1
+            if not _gc_pauses and _gc_was_enabled:
+                gc.enable()
+
+
+position_ids = PositionIdAllocator()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=position_ids.reset)
+
+
 class Position:
     """Class representing a position, bought or sold.
 
@@ -50,21 +164,27 @@ class Position:
     either purcahsing a stock, or selling a stock. This is the atomic
     unit used by CLIP.
 
+    Positions use __slots__ rather than a per-instance __dict__, and derive value and
+    datetimes on demand, as a portfolio can hold millions of them.
+
     Attributes:
         id: Hexadecimal unique identifier string representing this position.
         value: Floating point dollar value of this position.
         number_of_shares: Floating point number of shares purchased/sold for this position.
         share_price: Floating point dollar value of each individual share.
+        timestamp_ns: Integer epoch nanoseconds when this position was sold/bought.
         position_start: Datetime representing when this position was sold/bought.
         is_sell: Boolean value denoting this as a sell position or not.
     """
 
+    __slots__ = ("id", "number_of_shares", "share_price", "is_sell", "timestamp_ns")
+
     def __init__(
         self,
         share_count: float,
         share_value: float,
         is_sell: bool = False,
-        position_start: datetime.datetime = datetime.datetime.now(),
+        position_start: Optional[datetime.datetime] = None,
     ):
         """
         Generate a new position record.
@@ -73,15 +193,28 @@ class Position:
             share_count: Number of shares sold/bought.
             share_value: Floating point value of each share.
             is_sell: Optional bool indicating whether this was a sell or not. Defaults False.
-            position_start: Optional datetime of the sell/buy. Default is datetime.now().
+            position_start: Optional datetime of the sell/buy. Default is now.
         """
-        self.id = str(os.urandom(5).hex()).upper()
-
-        self.value = share_count * share_value
+        self.id = position_ids.allocate()
         self.number_of_shares = share_count
         self.share_price = share_value
-        self.position_start = position_start
         self.is_sell = is_sell
+        self.timestamp_ns = now_ns() if position_start is None else to_ns(position_start)
+
+    @property
+    def value(self) -> float:
+        return self.number_of_shares * self.share_price
+
+    @property
+    def position_start(self) -> datetime.datetime:
+        return from_ns(self.timestamp_ns)
+
+    @property
+    def timestamp(self) -> float:
+        """
+        POSIX timestamp of the position, in seconds.
+        """
+        return self.timestamp_ns / NANOSECONDS_PER_SECOND
 
     def __str__(self):
         return (
@@ -97,6 +230,282 @@ class Position:
             f" x ${self.share_price:.2f} = ${self.value:.2f}. "
         )
 
+    @classmethod
+    def create_many(
+        cls,
+        share_counts: Iterable[float],
+        share_values: Iterable[float],
+        is_sell: bool = False,
+        position_start: Optional[datetime.datetime] = None,
+    ) -> list["Position"]:
+        """
+        Generate many positions at once, all made at the same moment. Faster than
+        creating each in turn, as the timestamp is taken once and the garbage collector
+        is paused while they are allocated.
+
+        Arguments:
+            share_counts: Number of shares of each position.
+            share_values: Floating point value of each share, for each position.
+            is_sell: Optional bool indicating whether these are sells. Defaults False.
+            position_start: Optional datetime of the sells/buys. Default is now.
+
+        Returns:
+            The new positions, in order.
+        """
+        timestamp_ns = now_ns() if position_start is None else to_ns(position_start)
+        allocate = position_ids.allocate
+        new_position = cls.__new__
+        positions = []
+
+        with paused_gc():
+            for share_count, share_value in zip(share_counts, share_values):
+                position = new_position(cls)
+                position.id = allocate()
+                position.number_of_shares = share_count
+                position.share_price = share_value
+                position.is_sell = is_sell
+                position.timestamp_ns = timestamp_ns
+                positions.append(position)
+
+        return positions
+
+    @classmethod
+    def from_record(
+        cls,
+        position_id: str,
+        share_count: float,
+        share_value: float,
+        is_sell: bool,
+        timestamp_ns: int,
+    ) -> "Position":
+        """
+        Rebuild a position from an existing record, keeping its identifier rather than
+        generating a new one.
+
+        Arguments:
+            position_id: Hexadecimal identifier string of the original position.
+            share_count: Number of shares sold/bought.
+            share_value: Floating point value of each share.
+            is_sell: Bool indicating whether this was a sell or not.
+            timestamp_ns: Integer epoch nanoseconds of the sell/buy.
+
+        Returns:
+            A Position carrying the given record.
+        """
+        position = cls.__new__(cls)
+        position.id = position_id
+        position.number_of_shares = share_count
+        position.share_price = share_value
+        position.is_sell = is_sell
+        position.timestamp_ns = timestamp_ns
+
+        return position
+
+
+# (position id, share count, share price, is sell, epoch nanoseconds)
+PositionRecord = tuple[str, float, float, bool, int]
+
+
+class PositionStore(dict):
+    """Default store of positions for a Ticker, keyed by position id.
+
+    A plain dictionary of Position objects. Each position keeps its own object, which is
+    simple and flexible, but costly in memory once a ticker holds many positions.
+    """
+
+    def add_many(self, positions: Iterable[Position]):
+        """
+        Store many new positions at once.
+        """
+        self.update((position.id, position) for position in positions)
+
+    def records(self) -> Iterator[PositionRecord]:
+        """
+        Yield each stored position as a PositionRecord, in the order stored.
+        """
+        for position in self.values():
+            yield (
+                position.id,
+                position.number_of_shares,
+                position.share_price,
+                position.is_sell,
+                position.timestamp_ns,
+            )
+
+
+class ColumnarPositionStore:
+    """Array-backed store of positions for a Ticker, keyed by position id.
+
+    Positions are held column-wise in typed arrays rather than as individual objects,
+    and are handed back as Position objects only when asked for, which keeps a ticker
+    with many positions smaller in memory.
+
+    Behaves like the dictionary used by PositionStore, so a Ticker can use either.
+
+    Attributes:
+        share_counts: Number of shares of each position.
+        share_prices: Share price of each position.
+        position_values: Total dollar value of each position.
+        timestamps: Integer epoch nanoseconds of each position.
+        sell_flags: 1 for sell positions, 0 for buy positions.
+        ids: Integer form of each position's hexadecimal identifier.
+    """
+
+    def __init__(self):
+        self.share_counts = array("d")
+        self.share_prices = array("d")
+        self.position_values = array("d")
+        self.timestamps = array("q")
+        self.sell_flags = array("b")
+        self.ids = array("Q")
+        # Integer id -> row in the columns.
+        self._rows: dict[int, int] = {}
+
+    def _columns(self) -> tuple[array, ...]:
+        return (
+            self.ids,
+            self.share_counts,
+            self.share_prices,
+            self.position_values,
+            self.timestamps,
+            self.sell_flags,
+        )
+
+    def _row_of(self, position_id: str) -> Optional[int]:
+        try:
+            return self._rows.get(int(position_id, 16))
+        except (TypeError, ValueError):
+            return None
+
+    def _view(self, row: int) -> Position:
+        return Position.from_record(
+            position_id=f"{self.ids[row]:0{POSITION_ID_WIDTH}X}",
+            share_count=self.share_counts[row],
+            share_value=self.share_prices[row],
+            is_sell=bool(self.sell_flags[row]),
+            timestamp_ns=self.timestamps[row],
+        )
+
+    def __setitem__(self, position_id: str, position: Position):
+        integer_id = int(position_id, 16)
+        row = self._rows.get(integer_id)
+
+        if row is None:
+            self._rows[integer_id] = len(self.ids)
+            self.ids.append(integer_id)
+            self.share_counts.append(position.number_of_shares)
+            self.share_prices.append(position.share_price)
+            self.position_values.append(position.value)
+            self.timestamps.append(position.timestamp_ns)
+            self.sell_flags.append(position.is_sell)
+        else:
+            self.share_counts[row] = position.number_of_shares
+            self.share_prices[row] = position.share_price
+            self.position_values[row] = position.value
+            self.timestamps[row] = position.timestamp_ns
+            self.sell_flags[row] = position.is_sell
+
+    def add_many(self, positions: Iterable[Position]):
+        """
+        Store many new positions at once, extending each column in one go. Positions must
+        not already be stored.
+        """
+        positions = list(positions)
+        first_row = len(self.ids)
+        new_ids = [int(position.id, 16) for position in positions]
+
+        self.ids.extend(new_ids)
+        self.share_counts.extend(position.number_of_shares for position in positions)
+        self.share_prices.extend(position.share_price for position in positions)
+        self.position_values.extend(position.value for position in positions)
+        self.timestamps.extend(position.timestamp_ns for position in positions)
+        self.sell_flags.extend(position.is_sell for position in positions)
+        self._rows.update(zip(new_ids, range(first_row, first_row + len(new_ids))))
+
+    def __getitem__(self, position_id: str) -> Position:
+        row = self._row_of(position_id)
+        if row is None:
+            raise KeyError(position_id)
+
+        return self._view(row)
+
+    def get(self, position_id: str, default: Optional[Position] = None) -> Optional[Position]:
+        row = self._row_of(position_id)
+
+        return default if row is None else self._view(row)
+
+    def pop(self, position_id: str) -> Position:
+        """
+        Remove and return a position. The last row is moved into the vacated slot, so
+        removal is constant time but does not preserve insertion order.
+        """
+        row = self._row_of(position_id)
+        if row is None:
+            raise KeyError(position_id)
+
+        departing = self._view(row)
+        last = len(self.ids) - 1
+
+        if row != last:
+            for column in self._columns():
+                column[row] = column[last]
+            self._rows[self.ids[row]] = row
+
+        for column in self._columns():
+            column.pop()
+        del self._rows[int(position_id, 16)]
+
+        return departing
+
+    def __contains__(self, position_id: str) -> bool:
+        return self._row_of(position_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> list[str]:
+        return [f"{integer_id:0{POSITION_ID_WIDTH}X}" for integer_id in self.ids]
+
+    def records(self) -> Iterator[PositionRecord]:
+        """
+        Yield each stored position as a PositionRecord, in the order stored, straight
+        from the columns without making a Position object for each.
+        """
+        id_format = f"0{POSITION_ID_WIDTH}X"
+        for integer_id, share_count, share_price, sell_flag, timestamp_ns in zip(
+            self.ids, self.share_counts, self.share_prices, self.sell_flags, self.timestamps
+        ):
+            yield format(integer_id, id_format), share_count, share_price, bool(sell_flag), timestamp_ns
+
+    def values(self) -> Iterator[Position]:
+        return (self._view(row) for row in range(len(self.ids)))
+
+    def items(self) -> Iterator[tuple[str, Position]]:
+        return ((position.id, position) for position in self.values())
+
+
+class TickerTotals(NamedTuple):
+    """Consistent snapshot of a ticker's aggregates, published whole after every change."""
+
+    shares: float
+    cost_basis: float
+    average_cost: float
+    realized_pnl: float
+    last_price: Optional[float]
+    market_value: float
+    market_pnl: float
+
+
+class PortfolioTotals(NamedTuple):
+    """Consistent snapshot of a portfolio's aggregates, published whole after every change."""
+
+    ticker_count: int
+    market_value: float
+    market_pnl: float
+
 
 class Ticker:
     """Class representing a given ticker identity.
@@ -107,59 +516,294 @@ class Ticker:
 
     Attributes:
         name: String name of the ticker.
+        positions: Store of every position for this ticker, keyed by position id. Either
+            a PositionStore, or a ColumnarPositionStore if the ticker is columnar.
+        lots: LotBook of open buy lots, which sells are matched against.
+        lot_matches: The lots each sell position was matched against, keyed by sell id.
+        timeline: TimeIndex of this ticker's positions, for queries over time.
+        total_shares: Number of shares currently held.
+        total_value: Dollar cost basis of the shares currently held.
+        avg_price: Average cost per share currently held.
+        last_price: Latest market price per share, or None if never priced.
+        market_value: Dollar value of the shares held at last_price.
+        market_pnl: Unrealized dollar profit or loss of the shares held at last_price.
+        totals: TickerTotals of the above, replaced whole after every change. Readers on
+            other threads should use it rather than the separate attributes, which may be
+            read part way through a change.
+        lock: Reentrant lock held by every change to the ticker. Changes made through the
+            Portfolio take it; code changing a ticker directly from several threads must
+            hold it.
 
     """
 
-    def __init__(self, ticker_name: str, description: Optional[str] = None):
+    def __init__(self, ticker_name: str, description: Optional[str] = None, columnar: bool = False):
         self.name = ticker_name
         self.description = description
-        self.positions: dict[str, Position] = {}
+        self.positions: PositionStore | ColumnarPositionStore = (
+            ColumnarPositionStore() if columnar else PositionStore()
+        )
+        self.lots = LotBook()
+        self.lot_matches: dict[str, list[LotMatch]] = {}
+        self.timeline = TimeIndex()
         # Start values.
         self.position_count = 0
         self.total_shares = 0.0
         self.total_value = 0.0
         self.sell_count = 0
         self.avg_price = 0.0
+        # Market values, set by mark().
+        self.last_price: Optional[float] = None
+        self.market_value = 0.0
+        self.market_pnl = 0.0
+        self.lock = threading.RLock()
+        self._publish()
 
-    def add_position(self, new_position: Position):
-        self.positions[new_position.id] = new_position
-        self.total_shares += new_position.number_of_shares
-        self.total_value += new_position.value
-        self.position_count += 1
-        self.avg_price = (
-            (self.avg_price + new_position.share_price) / 2
-            if self.position_count > 1
-            else new_position.share_price
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+        self._publish()
+
+    def _publish(self):
+        # One reference assignment, so readers see all of the old totals or all of the new.
+        # Made with tuple.__new__, as the generated constructor costs a Python call.
+        self.totals = tuple.__new__(
+            TickerTotals,
+            (
+                self.total_shares,
+                self.total_value,
+                self.avg_price,
+                self.lots.realized_pnl,
+                self.last_price,
+                self.market_value,
+                self.market_pnl,
+            ),
         )
 
+    def _update_totals(self):
+        self.total_shares = self.lots.open_shares
+        self.total_value = self.lots.open_cost
+        self.avg_price = self.lots.average_cost
+        self._publish()
+
+    @property
+    def realized_pnl(self) -> float:
+        """
+        Dollar profit or loss realized by sells of this ticker.
+        """
+        return self.lots.realized_pnl
+
+    def unrealized_pnl(self, market_price: float) -> float:
+        """
+        Dollar profit or loss on the shares held, were they sold at market_price.
+        """
+        return self.lots.unrealized_pnl(market_price)
+
+    def mark(self, market_price: Optional[float] = None) -> tuple[float, float]:
+        """
+        Revalue the shares held at a market price. Constant time, from the running totals.
+
+        Arguments:
+            market_price: Optional new market price. Defaults to last_price, to revalue
+                after the shares held change.
+
+        Returns:
+            Tuple of the change in market_value and the change in market_pnl.
+        """
+        with self.lock:
+            if market_price is not None:
+                self.last_price = market_price
+            if self.last_price is None:
+                return 0.0, 0.0
+
+            previous_value, previous_pnl = self.market_value, self.market_pnl
+            self.market_value = self.last_price * self.lots.open_shares
+            self.market_pnl = self.lots.unrealized_pnl(self.last_price)
+            self._publish()
+
+            return self.market_value - previous_value, self.market_pnl - previous_pnl
+
+    def add_position(self, new_position: Position):
+        with self.lock:
+            self.positions[new_position.id] = new_position
+            self.lots.add_lot(new_position.id, new_position.number_of_shares, new_position.share_price)
+            self.timeline.insert(
+                new_position.timestamp,
+                new_position.id,
+                self.name,
+                new_position.number_of_shares,
+                new_position.value,
+            )
+            self.position_count += 1
+            self._update_totals()
+
+    def add_positions(self, new_positions: list[Position]):
+        """
+        Add many buy positions at once, in order, leaving the ticker as add_position on
+        each would. The store, lots and timeline are each extended in bulk, and the totals
+        updated once.
+        """
+        with self.lock:
+            if not new_positions:
+                return
+
+            position_ids = [position.id for position in new_positions]
+            share_counts = [position.number_of_shares for position in new_positions]
+            share_prices = [position.share_price for position in new_positions]
+
+            self.positions.add_many(new_positions)
+            self.lots.add_lots(position_ids, share_counts, share_prices)
+            self.timeline.extend(
+                [position.timestamp for position in new_positions],
+                position_ids,
+                repeat(self.name, len(new_positions)),
+                share_counts,
+                map(mul, share_counts, share_prices),
+            )
+            self.position_count += len(new_positions)
+            self._update_totals()
+
+    def import_positions(self, new_positions: list[Position]) -> list[Position]:
+        """
+        Apply many buys and sells at once, in order, leaving the ticker as add_position
+        and sell_position on each would. Lots are matched trade by trade, but the store
+        and timeline are each extended once, and the totals updated once. Sells are
+        matched FIFO.
+
+        Returns:
+            The positions applied. Sells of shares not held are left out.
+        """
+        with self.lock:
+            if not any(position.is_sell for position in new_positions):
+                self.add_positions(new_positions)
+                return new_positions
+
+            lots = self.lots
+            applied = []
+            share_deltas = []
+            value_deltas = []
+
+            for position in new_positions:
+                if position.is_sell:
+                    try:
+                        matches = lots.match_sell(position.number_of_shares, position.share_price)
+                    except ValueError:
+                        continue
+                    self.lot_matches[position.id] = matches
+                    self.sell_count += 1
+                    share_deltas.append(-position.number_of_shares)
+                    value_deltas.append(-self.sold_cost(position.id))
+                else:
+                    lots.add_lot(position.id, position.number_of_shares, position.share_price)
+                    self.position_count += 1
+                    share_deltas.append(position.number_of_shares)
+                    value_deltas.append(position.value)
+                applied.append(position)
+
+            self.positions.add_many(applied)
+            self.timeline.extend(
+                [position.timestamp for position in applied],
+                [position.id for position in applied],
+                repeat(self.name, len(applied)),
+                share_deltas,
+                value_deltas,
+            )
+            self._update_totals()
+
+            return applied
+
     def get_position(self, position_id: str) -> Position:
         return self.positions.get(position_id, None)
 
     def remove_position(self, position_id: str) -> bool:
         # inverse of add_position(). not selling
+        # Only a buy whose shares have not been sold from can be removed.
+        with self.lock:
+            if not self.lots.remove_lot(position_id):
+                return False
 
-        # Read position so we can strip the info.
-        departing_position = self.get_position(position_id)
-        self.position_count -= 1
-        self.total_shares -= departing_position.number_of_shares
-        self.total_value -= departing_position.value
-        self.avg_price = (self.avg_price * 2) - departing_position.share_price
+            departing_position = self.positions.pop(position_id)
+            self.timeline.remove(departing_position.timestamp, position_id)
+            self.position_count -= 1
+            self._update_totals()
 
-        self.positions.pop(position_id)
+            return True
 
-        return True
+    def sell_position(
+        self, sell_position: Position, policy: LotPolicy = LotPolicy.FIFO, lot_id: Optional[str] = None
+    ) -> bool:
+        """
+        Sell shares, matching them against open lots to find their cost basis.
+
+        Arguments:
+            sell_position: The sell Position.
+            policy: Optional LotPolicy choosing which lots are sold. Defaults to FIFO.
+            lot_id: Id of the lot to sell from, required for LotPolicy.SPECIFIC.
 
-    def sell_position(self, sell_position: Position) -> bool:
-        self.sell_count += 1
-        self.total_shares -= sell_position.number_of_shares
-        self.total_value -= sell_position.value
+        Returns:
+            Whether the sell was made. False if the shares or specific lot are not held.
+        """
+        with self.lock:
+            try:
+                matches = self.lots.match_sell(
+                    sell_position.number_of_shares, sell_position.share_price, policy=policy, lot_id=lot_id
+                )
+            except ValueError:
+                return False
 
-        self.avg_price = self.total_value / self.total_shares
+            self.sell_count += 1
+            self.positions[sell_position.id] = sell_position
+            self.lot_matches[sell_position.id] = matches
+            self.timeline.insert(
+                sell_position.timestamp,
+                sell_position.id,
+                self.name,
+                -sell_position.number_of_shares,
+                -self.sold_cost(sell_position.id),
+            )
+            self._update_totals()
 
-        self.positions[sell_position.id] = sell_position
+            return True
+
+    def can_sell(
+        self, sell_position: Position, policy: LotPolicy = LotPolicy.FIFO, lot_id: Optional[str] = None
+    ) -> bool:
+        """
+        Whether sell_position() would succeed with these arguments. Nothing changes.
+        """
+        try:
+            self.lots.check_sell(sell_position.number_of_shares, policy=policy, lot_id=lot_id)
+        except ValueError:
+            return False
 
         return True
 
+    def sold_cost(self, sell_position_id: str) -> float:
+        """
+        Cost basis of the shares closed by a sell position.
+        """
+        return sum(shares * cost for _, shares, cost in self.lot_matches.get(sell_position_id, ()))
+
+    def holdings_at(self, moment: datetime.datetime) -> tuple[float, float]:
+        """
+        Shares held in this ticker and their cost basis at a moment in time.
+        """
+        with self.lock:
+            return self.timeline.holdings_at(to_timestamp(moment))
+
+    def recalculate_totals(self):
+        """
+        Recompute share, cost and average price totals from the open lots, rather than
+        relying on the running totals.
+        """
+        with self.lock:
+            self.lots.recalculate()
+            self._update_totals()
+
     def __str__(self):
         return (
             f"Ticker: {self.name}\n" f"{self.description}" + "\n"
@@ -169,6 +813,7 @@ class Ticker:
             f" - (Number of sold positions: {self.sell_count})\n"
             f" - Total value: ${self.total_value:.2f}\n"
             f" - Average price: ${self.avg_price:.2f}\n"
+            f" - Realized P&L: ${self.realized_pnl:.2f}\n"
         )
 
     def __repr__(self):
@@ -176,31 +821,336 @@ class Ticker:
 
 
 class Portfolio:
-    def __init__(self, name: str):
+    """Class representing a portfolio of tickers.
+
+    Changes may be made from several threads at once, such as a price feed, an import and
+    the command loop. Each change holds the lock of the ticker it changes, so changes to
+    different tickers run side by side, and takes the portfolio lock only briefly, to
+    adjust the portfolio's own state. A ticker lock is always taken before the portfolio
+    lock, never after.
+
+    Attributes:
+        name: String name of the portfolio.
+        tickers: Every ticker traded, keyed by upper case ticker name.
+        ticker_index: FuzzyIndex of ticker names, for typo correction.
+        timeline: TimeIndex of positions across every ticker. Its share sums mix
+            tickers, so only its cost basis sums are meaningful.
+        last_prices: Latest market price seen for each ticker, held or not.
+        market_value: Dollar value of every priced ticker at its last price.
+        market_pnl: Unrealized dollar profit or loss of every priced ticker at its last price.
+        totals: PortfolioTotals of the ticker count, market_value and market_pnl, replaced
+            whole after every change, for readers on other threads.
+        lock: Reentrant lock held while the portfolio's own state changes. Not saved with
+            the portfolio.
+        history: TradeHistory of trades made this session, for undo and redo. Not
+            saved with the portfolio.
+    """
+
+    def __init__(self, name: str, columnar: bool = False):
         self.name = name
         self.tickers: dict[str, Ticker] = {}
         self.ticker_count = 0
+        # Whether new tickers should store their positions in columnar form.
+        self.columnar = columnar
+        # Index of ticker names, for suggesting corrections to mistyped tickers.
+        self.ticker_index = FuzzyIndex()
+        self.timeline = TimeIndex()
+        self.last_prices: dict[str, float] = {}
+        self.market_value = 0.0
+        self.market_pnl = 0.0
+        self.lock = threading.RLock()
+        self._publish()
+        self.history = TradeHistory(self)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["history"]
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+        self._publish()
+        self.history = TradeHistory(self)
+
+    def _publish(self):
+        self.totals = tuple.__new__(PortfolioTotals, (self.ticker_count, self.market_value, self.market_pnl))
+
+    def _adjust_totals(self, value_change: float, pnl_change: float):
+        with self.lock:
+            self.market_value += value_change
+            self.market_pnl += pnl_change
+            self._publish()
+
+    def _mark_ticker(self, ticker: Ticker, market_price: Optional[float] = None):
+        # The caller holds the ticker's lock, so its change and the portfolio's match.
+        value_change, pnl_change = ticker.mark(market_price)
+        if value_change or pnl_change:
+            self._adjust_totals(value_change, pnl_change)
+
+    def _lock_ticker(self, ticker_name: str, create: bool = False) -> Optional[Ticker]:
+        """
+        A ticker with its lock acquired, for the caller to release. The ticker is added
+        first if create is set; otherwise None is returned, and no lock held, if it does
+        not exist.
+        """
+        ticker_uppercase = ticker_name.upper()
+        while True:
+            ticker = self.tickers.get(ticker_uppercase)
+            if ticker is None:
+                if not create:
+                    return None
+                self.add_ticker(ticker_uppercase)
+                continue
+
+            ticker.lock.acquire()
+            # Undo may have swapped in another copy while this waited for the lock.
+            if self.tickers.get(ticker_uppercase) is ticker:
+                return ticker
+            ticker.lock.release()
+
+    @contextmanager
+    def _holding_ticker(self, ticker_name: str, create: bool = False) -> Iterator[Optional[Ticker]]:
+        """
+        Hold the lock of a ticker while in the block, as _lock_ticker. Gives None if the
+        ticker does not exist.
+        """
+        ticker = self._lock_ticker(ticker_name, create)
+        try:
+            yield ticker
+        finally:
+            if ticker is not None:
+                ticker.lock.release()
+
+    @contextmanager
+    def frozen(self) -> Iterator["Portfolio"]:
+        """
+        Hold every ticker lock, in name order, and then the portfolio lock, so nothing
+        changes while the portfolio is read whole, as when it is saved.
+        """
+        while True:
+            with ExitStack() as stack:
+                tickers = sorted(self.tickers.items())
+                for _, ticker in tickers:
+                    stack.enter_context(ticker.lock)
+                stack.enter_context(self.lock)
+
+                # A ticker added or swapped in before the locks were all held would be missed.
+                if sorted(self.tickers.items()) == tickers:
+                    yield self
+                    return
+
+    def update_price(self, ticker_name: str, market_price: float):
+        """
+        Record a new market price for a ticker, revaluing only that ticker and adjusting
+        the portfolio totals by the change.
+        """
+        ticker_uppercase = ticker_name.upper()
+        while True:
+            this_ticker = self._lock_ticker(ticker_uppercase)
+            if this_ticker is None:
+                with self.lock:
+                    # Added since it was looked up, so must be marked under its lock.
+                    if ticker_uppercase in self.tickers:
+                        continue
+                    self.last_prices[ticker_uppercase] = market_price
+                return
+
+            try:
+                self.last_prices[ticker_uppercase] = market_price
+                self._mark_ticker(this_ticker, market_price)
+            finally:
+                this_ticker.lock.release()
+            return
 
     def buy_position(self, ticker_name: str, position: Position, description: Optional[str] = None):
-        self.add_ticker(ticker_name)
+        # Locked without _holding_ticker, as the context manager costs more than the rest of
+        # a small buy.
+        this_ticker = self._lock_ticker(ticker_name, create=True)
+        try:
+            this_ticker.add_position(new_position=position)
+            with self.lock:
+                self.timeline.insert(
+                    position.timestamp,
+                    position.id,
+                    this_ticker.name,
+                    position.number_of_shares,
+                    position.value,
+                )
+            self._mark_ticker(this_ticker, self.last_prices.get(this_ticker.name))
+        finally:
+            this_ticker.lock.release()
+
+    def sell_position(
+        self,
+        ticker_name: str,
+        position: Position,
+        policy: LotPolicy = LotPolicy.FIFO,
+        lot_id: Optional[str] = None,
+    ) -> bool:
+        with self._holding_ticker(ticker_name) as this_ticker:
+            if this_ticker is None:
+                return False
+            if not this_ticker.sell_position(sell_position=position, policy=policy, lot_id=lot_id):
+                return False
 
-        this_ticker = self.get_ticker(ticker_name)
-        this_ticker.add_position(new_position=position)
+            with self.lock:
+                self.timeline.insert(
+                    position.timestamp,
+                    position.id,
+                    this_ticker.name,
+                    -position.number_of_shares,
+                    -this_ticker.sold_cost(position.id),
+                )
+            self._mark_ticker(this_ticker)
 
-    def sell_position(self, ticker_name: str, position: Position):
-        this_ticker = self.get_ticker(ticker_name)
-        this_ticker.sell_position(sell_position=position)
+        return True
+
+    def import_positions(self, trades: Iterable[tuple[str, Position]]) -> list[tuple[str, Position]]:
+        """
+        Apply many trades at once, as a bulk import does. The trades are grouped by ticker,
+        and each ticker's applied in one pass with Ticker.import_positions. The portfolio
+        timeline is extended and its totals adjusted once, rather than after each trade.
+        The garbage collector is paused throughout.
+
+        Arguments:
+            trades: (ticker name, Position) of each trade, oldest first.
+
+        Returns:
+            The (upper case ticker name, Position) of each trade applied, in order. Sells
+            of shares not held are left out.
+        """
+        # Everything allocated here is still alive at the end, so collecting is wasted work.
+        with paused_gc():
+            trades = [(ticker_name.upper(), position) for ticker_name, position in trades]
+            ticker_trades: dict[str, list[Position]] = {}
+            for ticker_name, position in trades:
+                ticker_trades.setdefault(ticker_name, []).append(position)
+
+            applied_ids = set()
+            sold_costs = {}
+            value_change = pnl_change = 0.0
+            for ticker_name, positions in ticker_trades.items():
+                # Sells alone cannot open a ticker.
+                create = not all(position.is_sell for position in positions)
+                with self._holding_ticker(ticker_name, create=create) as this_ticker:
+                    if this_ticker is None:
+                        continue
+                    for position in this_ticker.import_positions(positions):
+                        applied_ids.add(position.id)
+                        if position.is_sell:
+                            sold_costs[position.id] = this_ticker.sold_cost(position.id)
+                    changes = this_ticker.mark(self.last_prices.get(ticker_name))
+                    value_change += changes[0]
+                    pnl_change += changes[1]
+
+            applied = [trade for trade in trades if trade[1].id in applied_ids]
+            with self.lock:
+                self.timeline.extend(
+                    [position.timestamp for _, position in applied],
+                    [position.id for _, position in applied],
+                    [ticker_name for ticker_name, _ in applied],
+                    [
+                        -position.number_of_shares if position.is_sell else position.number_of_shares
+                        for _, position in applied
+                    ],
+                    [
+                        -sold_costs[position.id] if position.is_sell else position.value
+                        for _, position in applied
+                    ],
+                )
+                self._adjust_totals(value_change, pnl_change)
+
+            return applied
+
+    def remove_position(self, ticker_name: str, position_id: str) -> bool:
+        """
+        Remove a buy position that has not been sold from, as though it never happened.
+
+        Returns:
+            Whether the position was removed.
+        """
+        with self._holding_ticker(ticker_name) as this_ticker:
+            departing_position = this_ticker.get_position(position_id) if this_ticker else None
+
+            if not departing_position or not this_ticker.remove_position(position_id):
+                return False
+
+            with self.lock:
+                self.timeline.remove(departing_position.timestamp, position_id)
+            self._mark_ticker(this_ticker)
+
+        return True
+
+    def holdings_at(self, moment: datetime.datetime) -> dict[str, tuple[float, float]]:
+        """
+        Shares held and their cost basis at a moment in time, for every ticker held then.
+
+        Returns:
+            Dictionary of ticker name to (shares, cost basis).
+        """
+        holdings = {}
+        # Copied, as another thread may add a ticker meanwhile.
+        for ticker_name, ticker in list(self.tickers.items()):
+            shares, value = ticker.holdings_at(moment)
+            if abs(shares) > SHARE_EPSILON:
+                holdings[ticker_name] = (shares, value)
+
+        return holdings
 
     def add_ticker(self, ticker_name: str, description: Optional[str] = None) -> bool:
         ticker_uppercase = ticker_name.upper()
 
-        if not self.get_ticker(ticker_uppercase):
-            self.ticker_count += 1
-            self.tickers[ticker_uppercase] = Ticker(ticker_name=ticker_uppercase, description=description)
-            return True
+        with self.lock:
+            if not self.get_ticker(ticker_uppercase):
+                self.ticker_count += 1
+                self.tickers[ticker_uppercase] = self.new_ticker(ticker_uppercase, description)
+                self.ticker_index.add(ticker_uppercase)
+                self._publish()
+                return True
 
         return False
 
+    def new_ticker(self, ticker_name: str, description: Optional[str] = None) -> Ticker:
+        """
+        Make an empty ticker laid out like this portfolio's, without adding it.
+        """
+        return Ticker(ticker_name=ticker_name.upper(), description=description, columnar=self.columnar)
+
+    def restore_ticker(self, ticker_name: str, ticker: Optional[Ticker]):
+        """
+        Replace a ticker with an earlier copy of itself, revalued at the latest price.
+        Used by undo.
+
+        Arguments:
+            ticker_name: Upper case name of the ticker.
+            ticker: The ticker to put in place, or None to remove the ticker entirely.
+        """
+        with self._holding_ticker(ticker_name) as departing_ticker:
+            if ticker is not None:
+                # Not yet shared with other threads, so safe to mark without its lock.
+                ticker.mark(self.last_prices.get(ticker_name))
+
+            with self.lock:
+                if departing_ticker is not None:
+                    self.market_value -= departing_ticker.market_value
+                    self.market_pnl -= departing_ticker.market_pnl
+
+                if ticker is None:
+                    if self.tickers.pop(ticker_name, None):
+                        self.ticker_count -= 1
+                        self.ticker_index.remove(ticker_name)
+                else:
+                    if departing_ticker is None:
+                        self.ticker_count += 1
+                        self.ticker_index.add(ticker_name)
+                    self.tickers[ticker_name] = ticker
+                    self.market_value += ticker.market_value
+                    self.market_pnl += ticker.market_pnl
+
+                self._publish()
+
     def get_ticker(self, ticker_name: str) -> Optional[Ticker]:
         ticker_uppercase = ticker_name.upper()
 
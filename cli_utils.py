@@ -1,29 +1,54 @@
-from classes import Command
-from typing import Optional
-import difflib
-from programs.utilities import quit_clip
-from programs.portfolio import buy, sell
+from classes import Command, Portfolio, SystemConfig
+from fuzzy import FuzzyIndex
+from notifications import Notification
+from typing import Iterable, Optional
+import importlib
+from collections.abc import Awaitable
+import time
 
 
 RawCommand = list[str]
 
 
+# Handler of each command, as "module:function".
+COMMAND_HANDLERS = {
+    Command.QUIT: "programs.utilities:quit_clip",
+    Command.BUY: "programs.portfolio:buy",
+    Command.SELL: "programs.portfolio:sell",
+    Command.HOLDINGS: "programs.queries:holdings",
+    Command.TRADES: "programs.queries:trades",
+    Command.PRICE: "programs.market:price",
+    Command.FEED: "programs.market:feed",
+    Command.STATS: "programs.diagnostics:stats",
+    Command.UNDO: "programs.portfolio:undo",
+    Command.REDO: "programs.portfolio:redo",
+    Command.VALUATION: "programs.queries:valuation",
+    Command.HISTORY: "programs.utilities:history",
+    Command.IMPORT: "programs.portfolio:import_trades",
+    Command.EXPORT: "programs.queries:export",
+    Command.POSITIONS: "programs.queries:positions",
+    Command.RISK: "programs.queries:risk",
+    Command.JOEY: "builtins:print",
+}
 
 
+class CommandMapping(dict):
+    """Command to handler mapping that imports each handler's module on first lookup.
 
-command_mapping = {
-    Command.QUIT: quit_clip,
-    Command.BUY: buy,
-    Command.SELL: sell,
-    Command.JOEY: print
-}
+    A one-shot run then only imports the module of the command it runs, rather than every
+    module under programs/ and what they import in turn.
+    """
+
+    def __missing__(self, command: Command):
+        module_name, _, function_name = COMMAND_HANDLERS[command].partition(":")
+        handler = self[command] = getattr(importlib.import_module(module_name), function_name)
+        return handler
 
-def get_closest_match(input_str: str, acceptable_strings: list[str]) -> str:
-    comparison_ratios = [(candidate_str, difflib.SequenceMatcher(None, input_str, candidate_str).ratio()) for candidate_str in acceptable_strings]
-    comparison_ratios.sort(reverse=True, key=lambda x: x[1])
 
-    return comparison_ratios[0]
+command_mapping = CommandMapping()
 
+# Index of known command names, for suggesting corrections to mistyped commands.
+command_index = FuzzyIndex(Command._value2member_map_.keys())
 
 def prompt_user_bool(prompt_text: str) -> bool:
     return input(f"{prompt_text} ").lower() == "yes"
@@ -42,9 +67,18 @@ def read_new_command(prompt: str = ">") -> RawCommand:
     return input(f"{prompt} ").split(" ")
 
 
-def parse_command(input_command: RawCommand, command_assist: bool = True) -> Optional[Command]:
+def parse_command(
+    input_command: RawCommand, command_assist: bool = True, report_unknown: bool = True
+) -> Optional[Command]:
     """
     Attempt to match against known commands.
+
+    Arguments:
+        input_command: The raw command, split into words.
+        command_assist: Optional bool, whether to offer the closest known command when
+            the input is not recognised. Defaults True.
+        report_unknown: Optional bool, whether to tell the user when a command is not
+            recognised. Defaults True.
     """
 
     root_command = input_command[0]
@@ -55,20 +89,152 @@ def parse_command(input_command: RawCommand, command_assist: bool = True) -> Opt
     except ValueError:
 
         if command_assist:
-            acceptable_commands = Command._value2member_map_.keys()
-
-            best_match = get_closest_match(root_command, acceptable_commands)[0]
+            closest_matches = command_index.closest(root_command)
 
-            if prompt_user_bool(f"Did you mean '{best_match}'?"):      
-                return Command(best_match)
+            if closest_matches and prompt_user_bool(f"Did you mean '{closest_matches[0][0]}'?"):
+                return Command(closest_matches[0][0])
             else:
                 tell_user_text(f"Could not match input '{root_command}' against known commands.")
-        else:
+        elif report_unknown:
             tell_user_text(f"Command '{root_command}' not currently supported.")
     
     return None
 
 
+def dispatch_command(system_config: SystemConfig, portfolio: Portfolio, new_command: RawCommand):
+    """
+    Parse and run a command typed at the prompt, noting recognised commands as
+    notifications.
+
+    Returns:
+        Whatever the command returned. Coroutine commands return an awaitable, which the
+        caller should await.
+    """
+    command = parse_command(new_command)
+
+    if command and system_config.notification_manager:
+        system_config.notification_manager.add_notification(
+            Notification(title="COMMAND RECOGNISED", subtitle=command.value, text=str(command))
+        )
+
+    stats = system_config.stats
+    # Noted up front, as the stats command itself can turn instrumentation on or off.
+    timed = stats.enabled
+    if timed:
+        if command is None:
+            stats.count("command.unrecognised")
+        start_ns = time.perf_counter_ns()
+
+    try:
+        result = command_mapping[command](system_config, portfolio, new_command[1:])
+    except Exception as e:
+        print(" - failed, command not supported", e)
+        return None
+
+    if timed:
+        if isinstance(result, Awaitable):
+            # Time coroutine commands until they finish, not just until they are created.
+            return stats.record_awaited(f"command.{command.value}", start_ns, result)
+        stats.record(f"command.{command.value}", start_ns)
+
+    return result
+
+
+class BatchSummary:
+    """
+    Tally of a batch run, reported once the command stream is exhausted.
+
+    Attributes:
+        lines_read: Number of non-blank, non-comment lines read.
+        succeeded: Number of commands that ran without failing.
+        failed: Number of recognised commands that returned False or raised.
+        unrecognised: Number of lines that did not match a known command.
+        command_counts: Number of times each recognised Command was run.
+        elapsed: Wall time of the batch, in seconds.
+    """
+
+    def __init__(self):
+        self.lines_read = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.unrecognised = 0
+        self.command_counts: dict[Command, int] = {}
+        self.elapsed = 0.0
+
+    def __str__(self):
+        rate = self.lines_read / self.elapsed if self.elapsed else 0.0
+        counts = ", ".join(f"{command.value} {count}" for command, count in self.command_counts.items())
+        return (
+            f"Batch complete - {self.lines_read} commands in {self.elapsed:.2f} seconds ({rate:.0f}/s).\n"
+            f" - Succeeded: {self.succeeded}\n"
+            f" - Failed: {self.failed}\n"
+            f" - Unrecognised: {self.unrecognised}\n"
+            f" - By command: {counts or 'none'}\n"
+        )
+
+
+def run_batch(command_lines: Iterable[str], system_config: SystemConfig, portfolio: Portfolio) -> BatchSummary:
+    """
+    Run a stream of commands, one per line, without rendering or prompting. Blank lines
+    and lines starting with '#' are skipped. Stops early if a command ends the main loop.
+
+    Arguments:
+        command_lines: Iterable of command lines, such as an open file or sys.stdin.
+        system_config: The SystemConfig passed to each command.
+        portfolio: The Portfolio passed to each command.
+
+    Returns:
+        A BatchSummary of the run.
+    """
+    summary = BatchSummary()
+    command_counts = summary.command_counts
+    stats = system_config.stats
+    start_time = time.perf_counter()
+
+    for line in command_lines:
+        new_command = line.split()
+        if not new_command or new_command[0].startswith("#"):
+            continue
+
+        summary.lines_read += 1
+        command = parse_command(new_command, command_assist=False, report_unknown=False)
+
+        if command is None:
+            summary.unrecognised += 1
+            continue
+
+        command_counts[command] = command_counts.get(command, 0) + 1
+        timed = stats.enabled
+        if timed:
+            start_ns = time.perf_counter_ns()
+
+        try:
+            result = command_mapping[command](system_config, portfolio, new_command[1:])
+            # Coroutine commands are run to completion, and fail if they raise meanwhile.
+            if isinstance(result, Awaitable):
+                # Imported here, so batches of plain commands start without asyncio.
+                import asyncio
+
+                result = asyncio.run(result)
+        except Exception:
+            result = False
+
+        if timed:
+            stats.record(f"command.{command.value}", start_ns)
+
+        if result is False:
+            summary.failed += 1
+        else:
+            summary.succeeded += 1
+
+        if not system_config.main_loop_continue:
+            break
+
+    summary.elapsed = time.perf_counter() - start_time
+
+    return summary
+
+
 
     
 
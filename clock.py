@@ -0,0 +1,47 @@
+import datetime
+import time
+
+
+# Timestamps are held as integer nanoseconds since the epoch, truncated to whole
+# microseconds so they convert to and from datetime without loss.
+NANOSECONDS_PER_SECOND = 1_000_000_000
+
+
+def now_ns() -> int:
+    """
+    The current time, as integer epoch nanoseconds.
+    """
+    return time.time_ns() // 1000 * 1000
+
+
+def to_ns(moment: datetime.datetime) -> int:
+    """
+    Convert a datetime, naive meaning local time, to integer epoch nanoseconds.
+    """
+    whole_seconds = round(moment.replace(microsecond=0).timestamp())
+
+    return whole_seconds * NANOSECONDS_PER_SECOND + moment.microsecond * 1000
+
+
+def from_ns(timestamp_ns: int) -> datetime.datetime:
+    """
+    Convert integer epoch nanoseconds to a naive local datetime.
+    """
+    whole_seconds, remainder_ns = divmod(timestamp_ns, NANOSECONDS_PER_SECOND)
+
+    return datetime.datetime.fromtimestamp(whole_seconds).replace(microsecond=remainder_ns // 1000)
+
+
+def delta_to_ns(delta: datetime.timedelta) -> int:
+    """
+    Convert a timedelta to integer nanoseconds.
+    """
+    return ((delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds) * 1000
+
+
+def to_timestamp(moment: datetime.datetime) -> float:
+    """
+    Convert a datetime to a POSIX timestamp in seconds, by way of to_ns, so it compares
+    exactly with timestamps derived from the same instant in nanoseconds.
+    """
+    return to_ns(moment) / NANOSECONDS_PER_SECOND
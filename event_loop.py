@@ -0,0 +1,188 @@
+import asyncio
+import inspect
+import sys
+import threading
+from typing import Optional
+
+from classes import Portfolio, SystemConfig
+from cli_utils import dispatch_command
+from graphics import FrameRenderer, draw_frame
+from pricefeed import PriceFeed, batch_quotes, open_quote_source, parse_quotes
+
+
+class AsyncClip:
+    """asyncio version of the interactive main loop.
+
+    Reading commands is one task among several, so work carries on while CLIP waits for
+    input: notifications expire, prices arrive from a quote feed and the portfolio is
+    snapshotted periodically. A render task redraws the display only when one of these
+    changes something.
+
+    Blocking work runs in worker threads: reading stdin and the quote feed, and each
+    command, so a command waiting on a confirmation does not hold up the other tasks.
+    The portfolio, transaction log, undo history and notification manager take their
+    own locks, so commands may change them while background tasks do. Command handlers
+    may be coroutines, and are awaited on the event loop.
+
+    Attributes:
+        system_config: The SystemConfig for this execution.
+        portfolio: The Portfolio commands act on.
+        renderer: FrameRenderer used to draw to a terminal, or None to print frames.
+        quote_source: Optional quotes file path or host:port to follow for prices.
+        expiry_interval: Seconds between notification expiry sweeps.
+        snapshot_interval: Seconds between portfolio snapshots.
+    """
+
+    def __init__(
+        self,
+        system_config: SystemConfig,
+        portfolio: Portfolio,
+        renderer: Optional[FrameRenderer] = None,
+        quote_source: Optional[str] = None,
+        expiry_interval: float = 0.5,
+        snapshot_interval: float = 60.0,
+    ):
+        self.system_config = system_config
+        self.portfolio = portfolio
+        self.renderer = renderer
+        self.quote_source = quote_source
+        self.expiry_interval = expiry_interval
+        self.snapshot_interval = snapshot_interval
+
+        self._state_changed: Optional[asyncio.Event] = None
+        # Tells worker threads to wind down once the loop ends.
+        self._stop_event = threading.Event()
+
+    def notify_state_changed(self):
+        """
+        Ask the render task to redraw the display.
+        """
+        self._state_changed.set()
+
+    def draw(self, preserve_cursor: bool = False):
+        """
+        Draw the panel and current notifications.
+
+        Arguments:
+            preserve_cursor: Optional bool, whether to leave the cursor where it is, so a
+                redraw does not disturb a command being typed.
+        """
+        notification_manager = self.system_config.notification_manager
+
+        # Held while drawing, as a command may add notifications on its worker thread.
+        with notification_manager.lock:
+            draw_frame(
+                notification_manager,
+                renderer=self.renderer,
+                stats=self.system_config.stats,
+                preserve_cursor=preserve_cursor,
+            )
+
+    async def read_line(self, prompt: str = ">") -> Optional[str]:
+        """
+        Prompt for and read a line from stdin without blocking the event loop.
+
+        Returns:
+            The line read, or None at the end of input.
+        """
+        print(f"{prompt} ", end="", flush=True)
+        line = await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+
+        return line or None
+
+    async def command_task(self):
+        """
+        Read and run commands until the user quits or input ends. Each command runs in a
+        worker thread, so its prompts, such as "Did you mean" confirmations, wait for input
+        without stopping the background tasks.
+        """
+        loop = asyncio.get_running_loop()
+
+        while self.system_config.main_loop_continue:
+            self.draw()
+
+            line = await self.read_line()
+            if line is None:
+                break
+
+            result = await loop.run_in_executor(
+                None, dispatch_command, self.system_config, self.portfolio, line.rstrip("\n").split(" ")
+            )
+            if inspect.isawaitable(result):
+                try:
+                    await result
+                except Exception as e:
+                    print(" - failed, command not supported", e)
+
+    async def expiry_task(self):
+        """
+        Expire due notifications, redrawing if any expired.
+        """
+        notification_manager = self.system_config.notification_manager
+
+        while True:
+            await asyncio.sleep(self.expiry_interval)
+            if notification_manager.expire_notifications():
+                self.notify_state_changed()
+
+    async def feed_task(self):
+        """
+        Follow the quote source, applying each batch of prices as it arrives. Reading and
+        parsing happen in a worker thread; prices are applied on the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        price_feed = PriceFeed(self.portfolio, self.system_config.notification_manager)
+        batches = batch_quotes(
+            parse_quotes(open_quote_source(self.quote_source, follow=True, stop_event=self._stop_event))
+        )
+
+        while True:
+            latest_prices = await loop.run_in_executor(None, next, batches, None)
+            if latest_prices is None:
+                return
+
+            if price_feed.apply(latest_prices):
+                self.notify_state_changed()
+
+    async def snapshot_task(self):
+        """
+        Periodically snapshot the portfolio, if anything has been traded since the last one.
+        """
+        transaction_log = self.system_config.transaction_log
+
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            if transaction_log.records_since_snapshot:
+                transaction_log.snapshot()
+
+    async def render_task(self):
+        """
+        Redraw the display whenever a background task changes something.
+        """
+        while True:
+            await self._state_changed.wait()
+            self._state_changed.clear()
+
+            # Without a terminal renderer, redrawing would print whole frames over the prompt.
+            if self.renderer:
+                self.draw(preserve_cursor=True)
+
+    async def run(self):
+        """
+        Run until the user quits, then stop the background tasks.
+        """
+        self._state_changed = asyncio.Event()
+
+        background_tasks = [asyncio.create_task(self.expiry_task()), asyncio.create_task(self.render_task())]
+        if self.quote_source:
+            background_tasks.append(asyncio.create_task(self.feed_task()))
+        if self.system_config.transaction_log:
+            background_tasks.append(asyncio.create_task(self.snapshot_task()))
+
+        try:
+            await self.command_task()
+        finally:
+            self._stop_event.set()
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
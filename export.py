@@ -0,0 +1,349 @@
+import csv
+import json
+import struct
+from functools import lru_cache
+from itertools import count
+from typing import Callable, Iterable, Iterator, Optional
+
+from classes import Portfolio
+from clock import from_ns
+
+
+# Binary exports start with this, followed by the code of the report they hold.
+EXPORT_HEADER = b"CLIPEXP1"
+
+EXPORT_FORMATS = ("csv", "jsonl", "binary")
+
+# (ticker, position id, is sell, share count, share price, epoch nanoseconds)
+POSITION_RECORD = struct.Struct("<16sQ?ddq")
+# (ticker, positions, sells, shares, cost basis, average cost, realized P&L, last price
+#  or NaN, market value, unrealized P&L)
+TICKER_RECORD = struct.Struct("<16sqqddddddd")
+# (portfolio name, tickers, cost basis, realized P&L, market value, unrealized P&L)
+PORTFOLIO_RECORD = struct.Struct("<64sqdddd")
+
+# Rows that are written to the output in one go.
+WRITE_BATCH_SIZE = 4096
+
+
+def position_rows(portfolio: Portfolio, ticker_names: Optional[Iterable[str]] = None) -> Iterator[tuple]:
+    """
+    Yield (ticker, position id, is sell, share count, share price, epoch nanoseconds) for
+    every position of the named tickers, or of every ticker, one ticker at a time. Each
+    ticker's lock is held while its positions are yielded, so trades on it wait.
+    """
+    if ticker_names is None:
+        tickers = list(portfolio.tickers.values())
+    else:
+        tickers = filter(None, map(portfolio.get_ticker, ticker_names))
+
+    for ticker in tickers:
+        name = ticker.name
+        with ticker.lock:
+            for position_id, share_count, share_price, is_sell, timestamp_ns in ticker.positions.records():
+                yield name, position_id, is_sell, share_count, share_price, timestamp_ns
+
+
+def ticker_rows(portfolio: Portfolio) -> Iterator[tuple]:
+    """
+    Yield (ticker, positions, sells, shares, cost basis, average cost, realized P&L, last
+    price, market value, unrealized P&L) for every ticker.
+    """
+    for ticker in list(portfolio.tickers.values()):
+        # Counts and totals together, from between two trades.
+        with ticker.lock:
+            row = (ticker.name, ticker.position_count, ticker.sell_count, *ticker.totals)
+        yield row
+
+
+def portfolio_rows(portfolio: Portfolio) -> Iterator[tuple]:
+    """
+    Yield the single row (portfolio name, tickers, cost basis, realized P&L, market value,
+    unrealized P&L) of the portfolio as a whole.
+    """
+    ticker_totals = [ticker.totals for ticker in list(portfolio.tickers.values())]
+    totals = portfolio.totals
+    yield (
+        portfolio.name,
+        totals.ticker_count,
+        sum(ticker.cost_basis for ticker in ticker_totals),
+        sum(ticker.realized_pnl for ticker in ticker_totals),
+        totals.market_value,
+        totals.market_pnl,
+    )
+
+
+@lru_cache(maxsize=1 << 12)
+def iso_time(timestamp_ns: int) -> str:
+    """
+    ISO format local time of epoch nanoseconds. Cached, as imported trades share the
+    timestamps of their trade dates.
+    """
+    return from_ns(timestamp_ns).isoformat()
+
+
+def position_text_row(row: tuple) -> tuple:
+    ticker_name, position_id, is_sell, share_count, share_price, timestamp_ns = row
+    return (
+        ticker_name,
+        position_id,
+        "sell" if is_sell else "buy",
+        share_count,
+        share_price,
+        share_count * share_price,
+        iso_time(timestamp_ns),
+    )
+
+
+def position_binary_row(row: tuple) -> tuple:
+    ticker_name, position_id, *rest = row
+    return (ticker_name.encode(), int(position_id, 16), *rest)
+
+
+def ticker_binary_row(row: tuple) -> tuple:
+    ticker_name, *counts_and_totals = row
+    if counts_and_totals[6] is None:
+        # Never priced.
+        counts_and_totals[6] = float("nan")
+    return (ticker_name.encode(), *counts_and_totals)
+
+
+def portfolio_binary_row(row: tuple) -> tuple:
+    # Names longer than the record allows are cut short by the packing.
+    return (row[0].encode(), *row[1:])
+
+
+class Report:
+    """A kind of export: its fields, how its rows are made, and how they are written.
+
+    Attributes:
+        code: Byte identifying the report in binary exports.
+        fields: Name of each field of a text row.
+        rows: Function of the portfolio, yielding its rows.
+        text_row: Optional function turning a row into a text row, for CSV and JSON
+            lines. Rows are written as they are without one.
+        record: Struct each row is packed with in binary exports.
+        binary_row: Function turning a row into the values packed into record.
+    """
+
+    __slots__ = ("code", "fields", "rows", "text_row", "record", "binary_row")
+
+    def __init__(
+        self,
+        code: int,
+        fields: tuple[str, ...],
+        rows: Callable[[Portfolio], Iterator[tuple]],
+        text_row: Optional[Callable[[tuple], tuple]],
+        record: struct.Struct,
+        binary_row: Callable[[tuple], tuple],
+    ):
+        self.code = code
+        self.fields = fields
+        self.rows = rows
+        self.text_row = text_row
+        self.record = record
+        self.binary_row = binary_row
+
+
+REPORTS = {
+    "portfolio": Report(
+        0,
+        ("portfolio", "tickers", "cost_basis", "realized_pnl", "market_value", "unrealized_pnl"),
+        portfolio_rows,
+        None,
+        PORTFOLIO_RECORD,
+        portfolio_binary_row,
+    ),
+    "tickers": Report(
+        1,
+        (
+            "ticker",
+            "positions",
+            "sells",
+            "shares",
+            "cost_basis",
+            "average_cost",
+            "realized_pnl",
+            "last_price",
+            "market_value",
+            "unrealized_pnl",
+        ),
+        ticker_rows,
+        None,
+        TICKER_RECORD,
+        ticker_binary_row,
+    ),
+    "positions": Report(
+        2,
+        ("ticker", "id", "side", "shares", "price", "value", "time"),
+        position_rows,
+        position_text_row,
+        POSITION_RECORD,
+        position_binary_row,
+    ),
+}
+
+
+def batched(rows: Iterable, size: int = WRITE_BATCH_SIZE) -> Iterator[list]:
+    """
+    Yield rows in lists of up to size, so memory is bounded by one batch.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _LineBuffer:
+    """Write target for csv.writer, handing back what was written since the last take()."""
+
+    __slots__ = ("parts",)
+
+    def __init__(self):
+        self.parts: list[str] = []
+
+    def write(self, text: str):
+        self.parts.append(text)
+
+    def take(self) -> str:
+        text = "".join(self.parts)
+        self.parts.clear()
+        return text
+
+
+def csv_chunks(report: Report, rows: Iterable[tuple]) -> Iterator[str]:
+    """
+    Yield a CSV export of rows, header first, a batch of lines at a time.
+    """
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(report.fields)
+    if report.text_row:
+        rows = map(report.text_row, rows)
+
+    yield buffer.take()
+    for batch in batched(rows):
+        writer.writerows(batch)
+        yield buffer.take()
+
+
+def jsonl_chunks(report: Report, rows: Iterable[tuple]) -> Iterator[str]:
+    """
+    Yield a JSON lines export of rows, one object per row, a batch of lines at a time.
+    """
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    fields = report.fields
+    if report.text_row:
+        rows = map(report.text_row, rows)
+
+    for batch in batched(rows):
+        yield "".join([encode(dict(zip(fields, row))) + "\n" for row in batch])
+
+
+def binary_chunks(report: Report, rows: Iterable[tuple]) -> Iterator[bytes]:
+    """
+    Yield a binary export of rows: EXPORT_HEADER and the report code, then one fixed size
+    record per row, a batch of records at a time.
+    """
+    yield EXPORT_HEADER + bytes([report.code])
+
+    pack = report.record.pack
+    binary_row = report.binary_row
+    for batch in batched(rows):
+        yield b"".join([pack(*binary_row(row)) for row in batch])
+
+
+EXPORT_WRITERS = {"csv": csv_chunks, "jsonl": jsonl_chunks, "binary": binary_chunks}
+
+
+def _find_report(report_name: str, export_format: str) -> Report:
+    if report_name not in REPORTS:
+        raise ValueError(f"unknown report '{report_name}', expected one of {', '.join(REPORTS)}")
+    if export_format not in EXPORT_WRITERS:
+        raise ValueError(f"unknown format '{export_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+    return REPORTS[report_name]
+
+
+def export_chunks(portfolio: Portfolio, report_name: str, export_format: str, **options) -> Iterator:
+    """
+    Yield an export of a portfolio a batch at a time, as text, or bytes for binary.
+
+    Arguments:
+        portfolio: The Portfolio to export.
+        report_name: Name of a report in REPORTS: portfolio, tickers or positions.
+        export_format: One of EXPORT_FORMATS.
+        options: Passed on to the report's row function, such as ticker_names for
+            positions.
+
+    Raises:
+        ValueError: If the report or format is unknown.
+    """
+    report = _find_report(report_name, export_format)
+
+    return EXPORT_WRITERS[export_format](report, report.rows(portfolio, **options))
+
+
+def export_portfolio(portfolio: Portfolio, report_name: str, export_format: str, path: str, **options) -> int:
+    """
+    Write an export of a portfolio to a file, streaming it a batch of rows at a time, so
+    memory does not grow with the number of positions.
+
+    Arguments:
+        portfolio: The Portfolio to export.
+        report_name: Name of a report in REPORTS: portfolio, tickers or positions.
+        export_format: One of EXPORT_FORMATS.
+        path: Path of the file to write. Replaced if it exists.
+        options: Passed on to the report's row function.
+
+    Returns:
+        Number of rows written.
+
+    Raises:
+        ValueError: If the report or format is unknown.
+    """
+    report = _find_report(report_name, export_format)
+    row_count = count()
+    # zip stops at the end of the rows before drawing from row_count again, so its next
+    # value is the number of rows.
+    rows = (row for row, _ in zip(report.rows(portfolio, **options), row_count))
+
+    binary = export_format == "binary"
+    with open(path, "wb" if binary else "w", newline=None if binary else "") as export_file:
+        export_file.writelines(EXPORT_WRITERS[export_format](report, rows))
+
+    return next(row_count)
+
+
+def read_binary_export(path: str) -> tuple[str, Iterator[tuple]]:
+    """
+    Read a binary export back, a batch of records at a time.
+
+    Returns:
+        The report name, and an iterator over its records as unpacked tuples. Text fields
+        are bytes, padded with NUL.
+
+    Raises:
+        ValueError: If the file is not a binary export.
+    """
+    with open(path, "rb") as export_file:
+        header = export_file.read(len(EXPORT_HEADER) + 1)
+
+    codes = {report.code: name for name, report in REPORTS.items()}
+    if len(header) <= len(EXPORT_HEADER) or not header.startswith(EXPORT_HEADER) or header[-1] not in codes:
+        raise ValueError(f"'{path}' is not a binary export")
+
+    report_name = codes[header[-1]]
+    record = REPORTS[report_name].record
+
+    def records() -> Iterator[tuple]:
+        with open(path, "rb") as export_file:
+            export_file.seek(len(header))
+            while batch := export_file.read(record.size * WRITE_BATCH_SIZE):
+                yield from record.iter_unpack(batch)
+
+    return report_name, records()
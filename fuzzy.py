@@ -0,0 +1,110 @@
+from collections import Counter
+from heapq import nsmallest
+from typing import Iterable
+
+
+class FuzzyIndex:
+    """N-gram inverted index over a set of strings, used to suggest corrections for typos.
+
+    Each string is broken into overlapping n-grams (with start and end markers), and each
+    n-gram maps to the strings containing it. A query only visits strings sharing at least
+    one n-gram with it, and scores them by the Dice coefficient of their n-gram sets, so
+    lookups stay fast as the number of strings grows. Matching ignores case.
+
+    Attributes:
+        gram_size: Length of the n-grams strings are broken into.
+    """
+
+    def __init__(self, candidates: Iterable[str] = (), gram_size: int = 2):
+        """
+        Build an index, optionally over some initial candidate strings.
+
+        Arguments:
+            candidates: Optional iterable of strings to index.
+            gram_size: Optional length of n-gram to index by. Defaults to 2, which suits
+                short strings such as commands and ticker symbols.
+        """
+        self.gram_size = gram_size
+        # n-gram -> candidates containing it.
+        self._postings: dict[str, set[str]] = {}
+        # candidate -> its set of n-grams.
+        self._grams: dict[str, frozenset[str]] = {}
+
+        for candidate in candidates:
+            self.add(candidate)
+
+    def _split(self, text: str) -> frozenset[str]:
+        padded = f"^{text.casefold()}$"
+        return frozenset(padded[i : i + self.gram_size] for i in range(max(len(padded) - self.gram_size + 1, 1)))
+
+    def add(self, candidate: str) -> bool:
+        """
+        Add a string to the index.
+
+        Returns:
+            Whether the string was added, False if it was already indexed.
+        """
+        if candidate in self._grams:
+            return False
+
+        grams = self._split(candidate)
+        self._grams[candidate] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(candidate)
+
+        return True
+
+    def remove(self, candidate: str) -> bool:
+        """
+        Remove a string from the index.
+
+        Returns:
+            Whether the string was removed, False if it was not indexed.
+        """
+        grams = self._grams.pop(candidate, None)
+        if grams is None:
+            return False
+
+        for gram in grams:
+            posting = self._postings[gram]
+            posting.discard(candidate)
+            if not posting:
+                del self._postings[gram]
+
+        return True
+
+    def closest(self, query: str, k: int = 1) -> list[tuple[str, float]]:
+        """
+        Find the indexed strings most similar to query.
+
+        Arguments:
+            query: The string to match, such as a mistyped command.
+            k: Optional number of matches to return. Defaults to 1.
+
+        Returns:
+            Up to k (string, score) tuples, best first. Scores run from 0 to 1. Strings
+            sharing no n-grams with the query are never returned.
+        """
+        query_grams = self._split(query)
+
+        shared_counts = Counter()
+        for gram in query_grams:
+            posting = self._postings.get(gram)
+            if posting:
+                shared_counts.update(posting)
+
+        query_size = len(query_grams)
+        grams = self._grams
+        scored = (
+            (candidate, 2 * shared / (query_size + len(grams[candidate])))
+            for candidate, shared in shared_counts.items()
+        )
+
+        # Ties are broken alphabetically, so suggestions are stable.
+        return nsmallest(k, scored, key=lambda match: (-match[1], match[0]))
+
+    def __contains__(self, candidate: str) -> bool:
+        return candidate in self._grams
+
+    def __len__(self) -> int:
+        return len(self._grams)
@@ -1,5 +1,12 @@
+import functools
+import shutil
+import sys
+import time
+from typing import Iterable, Optional, TextIO
+
 from classes import SystemConfig
-from notifications import Notification
+from instrumentation import Stats
+from notifications import Notification, NotificationManager, NotificationSource
 
 version_number = "0.0.0"
 
@@ -11,6 +18,26 @@ total_height = 50
 
 empty_notification = Notification("", "", "")
 
+# ANSI escape sequences used by the FrameRenderer.
+CLEAR_SCREEN = "\x1b[2J"
+CLEAR_TO_END_OF_LINE = "\x1b[K"
+CLEAR_TO_END_OF_SCREEN = "\x1b[J"
+RESET_SCROLL_REGION = "\x1b[r"
+SAVE_CURSOR = "\x1b7"
+RESTORE_CURSOR = "\x1b8"
+
+
+def move_cursor(row: int, column: int = 1) -> str:
+    return f"\x1b[{row};{column}H"
+
+
+@functools.lru_cache(maxsize=1024)
+def format_row(panel_line: str, notification_line: str) -> str:
+    """
+    Pad and border a single display row. Cached, as most rows repeat between frames.
+    """
+    return "|" + panel_line.ljust(panel_width - 1) + "|" + notification_line.ljust(notif_width - 1) + "|"
+
 
 def combine_segments(panel_segment: list[str], notification_segment: list[str]) -> list[str]:
     # DEBUG CODE
@@ -18,38 +45,181 @@ def combine_segments(panel_segment: list[str], notification_segment: list[str])
         notification_segment.append(" ")
 
     output_segment = [
-        "|" + str(panel_line).ljust(panel_width - 1) + "|" + notification_line.ljust(notif_width - 1) + "|"
+        format_row(str(panel_line), notification_line)
         for panel_line, notification_line in zip(panel_segment, notification_segment)
     ]
 
     return output_segment
 
 
-def display_segments(input_display):
+class FrameRenderer:
+    """Draws frames to the terminal, rewriting only the rows that changed.
+
+    The previous frame is kept, and each new frame is compared to it line by line.
+    Changed rows are redrawn in place using cursor positioning, and the whole update is
+    sent in a single write. Rows beneath the frame are made a scrolling region, so
+    command output and the prompt scroll there without disturbing the frame.
+
+    Attributes:
+        output_stream: Terminal stream to draw to.
+        previous_frame: Rows of the last frame drawn, top to bottom.
+    """
+
+    def __init__(self, output_stream: Optional[TextIO] = None):
+        self.output_stream = output_stream or sys.stdout
+        self.previous_frame: list[str] = []
+
+    def invalidate(self):
+        """
+        Forget the previous frame, so the next render repaints the whole screen.
+        """
+        self.previous_frame = []
+
+    def render(self, input_display: list[str], preserve_cursor: bool = False) -> int:
+        """
+        Draw a frame, given as combined segments in the order display_segments takes them.
+
+        Arguments:
+            input_display: The display rows, bottom row first.
+            preserve_cursor: Optional bool, whether to put the cursor back where it was and
+                leave the area beneath the frame alone, so a redraw does not disturb a user
+                part way through typing a command. Ignored when the whole screen is redrawn.
+
+        Returns:
+            The number of rows that were redrawn.
+        """
+        frame = input_display[::-1]
+        frame.append("-" * total_width)
+
+        output_buffer = []
+        previous_frame = self.previous_frame
+
+        if len(previous_frame) != len(frame):
+            # First frame, or the frame changed shape - start from a clean screen.
+            previous_frame = []
+            preserve_cursor = False
+            output_buffer.append(RESET_SCROLL_REGION + CLEAR_SCREEN)
+
+            terminal_height = shutil.get_terminal_size(fallback=(total_width, total_height)).lines
+            if terminal_height > len(frame) + 1:
+                output_buffer.append(f"\x1b[{len(frame) + 1};{terminal_height}r")
+
+        changed_rows = 0
+        for row_number, line in enumerate(frame):
+            if row_number < len(previous_frame) and previous_frame[row_number] == line:
+                continue
+
+            output_buffer.append(move_cursor(row_number + 1) + line + CLEAR_TO_END_OF_LINE)
+            changed_rows += 1
+
+        if preserve_cursor:
+            if not changed_rows:
+                return 0
+            output_buffer.insert(0, SAVE_CURSOR)
+            output_buffer.append(RESTORE_CURSOR)
+        else:
+            # Clear the previous command's output, and leave the cursor ready for the prompt.
+            output_buffer.append(move_cursor(len(frame) + 1) + CLEAR_TO_END_OF_SCREEN)
+
+        self.output_stream.write("".join(output_buffer))
+        self.output_stream.flush()
+        self.previous_frame = frame
+
+        return changed_rows
+
+    def close(self):
+        """
+        Restore normal terminal scrolling, leaving the last frame on screen.
+        """
+        self.output_stream.write(RESET_SCROLL_REGION + move_cursor(len(self.previous_frame) + 1))
+        self.output_stream.flush()
+
+
+def display_segments(input_display, renderer: Optional[FrameRenderer] = None):
+    """
+    Display the combined segments. If a renderer is given, only rows changed since its
+    last frame are drawn. Otherwise every row is printed.
+    """
+    if renderer:
+        renderer.render(input_display)
+        return
+
     for i in input_display[::-1]:
         print(i)
     print("-" * total_width)
 
 
+def draw_frame(
+    notification_manager: NotificationManager,
+    renderer: Optional[FrameRenderer] = None,
+    stats: Optional[Stats] = None,
+    preserve_cursor: bool = False,
+    source: Optional[NotificationSource] = None,
+):
+    """
+    Draw the panel alongside the valid notifications.
+
+    Arguments:
+        notification_manager: The NotificationManager to show notifications from.
+        renderer: Optional FrameRenderer to draw changed rows with. Otherwise every row
+            is printed.
+        stats: Optional Stats to record frame and notification queuing times, and
+            notification buffer sizes, to when enabled.
+        preserve_cursor: Optional bool, passed to the renderer to leave the cursor where
+            it is.
+        source: Optional NotificationSource to show notifications from only, such as
+            SYSTEM alerts without feed updates.
+    """
+    timed = stats is not None and stats.enabled
+    if timed:
+        frame_start_ns = time.perf_counter_ns()
+
+    notification_segment = queue_notifications(
+        notification_manager.get_notifications(valid_only=True, source=source)
+    )
+
+    if timed:
+        stats.record("render.queue_notifications", frame_start_ns)
+        stats.gauge("notifications.buffered", notification_manager.get_total_notification_count())
+        stats.gauge("notifications.valid", notification_manager.get_valid_notification_count())
+
+    input_display = combine_segments(generate_panel(), notification_segment)
+    if renderer:
+        renderer.render(input_display, preserve_cursor=preserve_cursor)
+    else:
+        display_segments(input_display=input_display)
+
+    if timed:
+        stats.record("render.frame", frame_start_ns)
+
+
 def generate_panel():
     return [" " for _ in range(segment_height)]
 
 
-def queue_notifications(new_notifications: list[Notification]):
-    output_text = []
+def queue_notifications(new_notifications: Iterable[Notification], max_lines: Optional[int] = segment_height):
+    """
+    Lay out notifications as display rows, bottom row first, as combine_segments takes
+    them. Each notification is its title, optional subtitle and wrapped text, with a
+    blank row above.
 
-    for notification in new_notifications:
-        # First, calculate text wrapping.
-        notif_text = notification.text
-        chunks, chunk_size = len(notif_text), len(notif_text) // (notif_width - 1)
+    Notifications are taken from new_notifications only until max_lines rows are
+    filled, so passing a lazy iterable means notifications that would not be seen are
+    never visited.
 
-        if chunk_size == 0:
-            chunk_size = len(notif_text)
+    Arguments:
+        new_notifications: Notifications to show, most recent (bottom) first.
+        max_lines: Optional number of rows to fill. Defaults to segment_height; None
+            lays out every notification.
 
-        split_text = [notif_text[i : i + chunk_size] for i in range(0, chunks, chunk_size)]
+    Returns:
+        List of at most max_lines rows.
+    """
+    output_text = []
 
-        for text in split_text:
-            output_text.append(text)
+    for notification in new_notifications:
+        # Rows run bottom to top, so the wrapped text goes in reversed.
+        output_text.extend(reversed(notification.wrap_text(notif_width - 1)))
 
         if notification.subtitle:
             output_text.append(notification.subtitle)
@@ -58,6 +228,10 @@ def queue_notifications(new_notifications: list[Notification]):
 
         output_text.append(" ")
 
+        if max_lines is not None and len(output_text) >= max_lines:
+            del output_text[max_lines:]
+            break
+
     return output_text
 
 
@@ -69,4 +243,7 @@ def display_welcome():
 
 
 def display_goodbye(system_config: SystemConfig):
+    if not system_config.stats.is_empty():
+        print(system_config.stats.report())
+
     print(f"exiting program - uptime {system_config.uptime:.1f} seconds.")
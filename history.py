@@ -0,0 +1,288 @@
+import pickle
+import threading
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Optional
+
+from lots import LotPolicy
+
+if TYPE_CHECKING:
+    from classes import Portfolio, Position, Ticker
+
+
+OPERATION_BUY = "buy"
+OPERATION_SELL = "sell"
+
+# A ticker with n positions is checkpointed at most every n // CHECKPOINT_SIZE_DIVISOR of
+# its events, keeping checkpoint cost amortized constant per event.
+CHECKPOINT_SIZE_DIVISOR = 8
+
+
+class TradeEvent:
+    """A buy or sell made through a TradeHistory.
+
+    Attributes:
+        operation: OPERATION_BUY or OPERATION_SELL.
+        ticker_name: Upper case name of the ticker traded.
+        position: The Position bought or sold.
+        policy: LotPolicy a sell was matched with.
+        lot_id: Id of the lot a specific lot sell was matched against.
+    """
+
+    __slots__ = ("operation", "ticker_name", "position", "policy", "lot_id")
+
+    def __init__(
+        self,
+        operation: str,
+        ticker_name: str,
+        position: "Position",
+        policy: LotPolicy = LotPolicy.FIFO,
+        lot_id: Optional[str] = None,
+    ):
+        self.operation = operation
+        self.ticker_name = ticker_name
+        self.position = position
+        self.policy = policy
+        self.lot_id = lot_id
+
+    def __str__(self):
+        position = self.position
+        return f"{self.operation} {position.number_of_shares} {self.ticker_name} @ ${position.share_price:.2f}"
+
+
+class TradeHistory:
+    """Undoable history of the trades made against a portfolio.
+
+    Every trade is kept as an event. Before a ticker's first event, and every
+    checkpoint_interval events of that ticker after (more for large tickers), the ticker
+    is pickled as a checkpoint. Undo restores the ticker from its latest checkpoint before the undone
+    event and replays that ticker's events since, so it costs O(events since the
+    checkpoint). Replaying the same events in the same order repeats the same float
+    arithmetic, so cost basis and P&L come back bit for bit, where subtracting the
+    undone trade would drift.
+
+    Undone events stay available to redo until a new trade is made.
+
+    Attributes:
+        portfolio: The Portfolio traded against.
+        events: Every event made, applied or undone, oldest first.
+        cursor: Number of events applied; events from cursor on are undone.
+        checkpoint_interval: Least number of events of a ticker between checkpoints.
+        enabled: Whether trades are recorded. Batch runs turn this off, as nothing will
+            be undone and checkpoints cost time.
+        lock: Reentrant lock held by each trade, undo and redo, so events are recorded in
+            the order they are applied.
+    """
+
+    def __init__(self, portfolio: "Portfolio", checkpoint_interval: int = 32):
+        self.portfolio = portfolio
+        self.events: list[TradeEvent] = []
+        self.cursor = 0
+        self.checkpoint_interval = checkpoint_interval
+        self.enabled = True
+        self.lock = threading.RLock()
+
+        # Ticker name -> indices of its events in events.
+        self._ticker_events: dict[str, list[int]] = {}
+        # Ticker name -> (event index, pickled ticker before that event, or None if it
+        # did not exist yet).
+        self._checkpoints: dict[str, list[tuple[int, Optional[bytes]]]] = {}
+
+    def clear(self):
+        """
+        Forget every event, so nothing can be undone or redone. Called after changes made
+        outside the history, such as a bulk import, which replaying from the checkpoints
+        would lose.
+        """
+        with self.lock:
+            self.events.clear()
+            self.cursor = 0
+            self._ticker_events.clear()
+            self._checkpoints.clear()
+
+    def can_undo(self) -> bool:
+        return self.cursor > 0
+
+    def can_redo(self) -> bool:
+        return self.cursor < len(self.events)
+
+    def _prepare(self, ticker_name: str):
+        """
+        Discard undone events, and checkpoint the ticker if it is due, ahead of a new
+        event on it.
+        """
+        if self.can_redo():
+            self._truncate()
+
+        ticker_events = self._ticker_events.setdefault(ticker_name, [])
+        checkpoints = self._checkpoints.setdefault(ticker_name, [])
+
+        ticker = self.portfolio.tickers.get(ticker_name)
+        if checkpoints:
+            events_since = len(ticker_events) - self._events_before(ticker_name, checkpoints[-1][0])
+            # Pickling costs O(positions), so big tickers checkpoint proportionally less often.
+            # Undo already pays O(positions) to unpickle, so the longer replay is of that order.
+            interval = self.checkpoint_interval
+            if ticker:
+                interval = max(interval, len(ticker.positions) // CHECKPOINT_SIZE_DIVISOR)
+            if events_since < interval:
+                return
+
+        state = None
+        if ticker:
+            # Imported here, as classes imports this module.
+            from classes import paused_gc
+
+            with ticker.lock, paused_gc():
+                state = pickle.dumps(ticker, protocol=pickle.HIGHEST_PROTOCOL)
+        checkpoints.append((len(self.events), state))
+
+    def _events_before(self, ticker_name: str, event_index: int) -> int:
+        """
+        Number of the ticker's events made before events[event_index].
+        """
+        return bisect_left(self._ticker_events[ticker_name], event_index)
+
+    def _truncate(self):
+        """
+        Forget undone events, along with checkpoints taken after them.
+        """
+        cursor = self.cursor
+        for event in self.events[cursor:]:
+            ticker_name = event.ticker_name
+            ticker_events = self._ticker_events[ticker_name]
+            del ticker_events[bisect_left(ticker_events, cursor) :]
+
+            checkpoints = self._checkpoints[ticker_name]
+            while checkpoints and checkpoints[-1][0] > cursor:
+                checkpoints.pop()
+
+        del self.events[cursor:]
+
+    def _append(self, event: TradeEvent):
+        self._ticker_events[event.ticker_name].append(len(self.events))
+        self.events.append(event)
+        self.cursor += 1
+
+    def buy(self, ticker_name: str, position: "Position"):
+        """
+        Buy position through the portfolio, recording it for undo.
+        """
+        ticker_uppercase = ticker_name.upper()
+        with self.lock:
+            if self.enabled:
+                self._prepare(ticker_uppercase)
+
+            self.portfolio.buy_position(ticker_uppercase, position)
+
+            if self.enabled:
+                self._append(TradeEvent(OPERATION_BUY, ticker_uppercase, position))
+
+    def sell(
+        self,
+        ticker_name: str,
+        position: "Position",
+        policy: LotPolicy = LotPolicy.FIFO,
+        lot_id: Optional[str] = None,
+    ) -> bool:
+        """
+        Sell position through the portfolio, recording it for undo if it succeeds.
+
+        Returns:
+            Whether the sell succeeded.
+        """
+        ticker_uppercase = ticker_name.upper()
+        with self.lock:
+            ticker = self.portfolio.tickers.get(ticker_uppercase)
+            if ticker is None:
+                return False
+
+            with ticker.lock:
+                if self.enabled:
+                    # Checked first, as preparing discards the undone events, and a sell that
+                    # fails must leave them to redo.
+                    if not ticker.can_sell(position, policy=policy, lot_id=lot_id):
+                        return False
+                    self._prepare(ticker_uppercase)
+
+                if not self.portfolio.sell_position(ticker_uppercase, position, policy=policy, lot_id=lot_id):
+                    return False
+
+            if self.enabled:
+                self._append(TradeEvent(OPERATION_SELL, ticker_uppercase, position, policy, lot_id))
+
+        return True
+
+    def undo(self) -> Optional[TradeEvent]:
+        """
+        Reverse the most recent applied event.
+
+        Returns:
+            The event undone, or None if there is nothing to undo.
+        """
+        with self.lock:
+            if not self.can_undo():
+                return None
+
+            event_index = self.cursor - 1
+            event = self.events[event_index]
+            ticker_name = event.ticker_name
+
+            self.portfolio.restore_ticker(ticker_name, self._rebuild_ticker(ticker_name, event_index))
+            with self.portfolio.lock:
+                self.portfolio.timeline.remove(event.position.timestamp, event.position.id)
+            self.cursor = event_index
+
+        return event
+
+    def _rebuild_ticker(self, ticker_name: str, event_index: int) -> Optional["Ticker"]:
+        """
+        The ticker as it was before events[event_index], from the latest checkpoint at or
+        before that event, with the ticker's events since replayed.
+        """
+        checkpoints = self._checkpoints[ticker_name]
+        checkpoint_index, state = checkpoints[bisect_left(checkpoints, event_index + 1, key=lambda c: c[0]) - 1]
+        ticker = None
+        if state:
+            # Imported here, as classes imports this module.
+            from classes import paused_gc
+
+            # Unpickling allocates every position at once, which would set off the collector.
+            with paused_gc():
+                ticker = pickle.loads(state)
+
+        ticker_events = self._ticker_events[ticker_name]
+        first = bisect_left(ticker_events, checkpoint_index)
+        last = bisect_left(ticker_events, event_index)
+
+        for replayed_index in ticker_events[first:last]:
+            replayed = self.events[replayed_index]
+            if replayed.operation == OPERATION_BUY:
+                if ticker is None:
+                    ticker = self.portfolio.new_ticker(ticker_name)
+                ticker.add_position(replayed.position)
+            else:
+                ticker.sell_position(replayed.position, policy=replayed.policy, lot_id=replayed.lot_id)
+
+        return ticker
+
+    def redo(self) -> Optional[TradeEvent]:
+        """
+        Reapply the earliest undone event.
+
+        Returns:
+            The event redone, or None if there is nothing to redo.
+        """
+        with self.lock:
+            if not self.can_redo():
+                return None
+
+            event = self.events[self.cursor]
+            if event.operation == OPERATION_BUY:
+                self.portfolio.buy_position(event.ticker_name, event.position)
+            else:
+                self.portfolio.sell_position(
+                    event.ticker_name, event.position, policy=event.policy, lot_id=event.lot_id
+                )
+            self.cursor += 1
+
+        return event
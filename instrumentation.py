@@ -0,0 +1,149 @@
+import time
+from typing import Awaitable, Optional
+
+
+class LatencyHistogram:
+    """Histogram of durations in power of two nanosecond buckets.
+
+    Recording is an integer bit_length and a list increment, cheap enough to run on every
+    command and frame. Percentiles are accurate to within a factor of two, which is
+    plenty to see which commands are slow and by roughly how much.
+
+    Attributes:
+        buckets: Count of durations d with d.bit_length() == index, in nanoseconds.
+        count: Number of durations recorded.
+        total_ns: Sum of all durations, in nanoseconds.
+        max_ns: Longest duration recorded, in nanoseconds.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns: int):
+        self.buckets[min(duration_ns.bit_length(), 63)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    def percentile(self, fraction: float) -> int:
+        """
+        Upper bound, in nanoseconds, of the bucket holding the given fraction of durations.
+        """
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return min(1 << index, self.max_ns)
+
+        return self.max_ns
+
+    def __str__(self):
+        return (
+            f"{self.count:>8} calls  mean {self.mean_ns / 1e6:>9.3f} ms  p50 {self.percentile(0.5) / 1e6:>9.3f} ms"
+            f"  p99 {self.percentile(0.99) / 1e6:>9.3f} ms  max {self.max_ns / 1e6:>9.3f} ms"
+        )
+
+
+class Stats:
+    """Runtime instrumentation: latency histograms, counters and gauges.
+
+    Call sites check enabled before taking any timestamps, so instrumentation costs a
+    single attribute lookup when it is off.
+
+    Attributes:
+        enabled: Whether measurements are being recorded.
+        latencies: LatencyHistogram for each timed operation, such as 'command.buy' or
+            'render'.
+        counters: Count of each counted event.
+        gauges: (last, maximum) of each sampled level, such as a buffer size.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.latencies: dict[str, LatencyHistogram] = {}
+        self.counters: dict[str, int] = {}
+        self.gauges: dict[str, tuple[int, int]] = {}
+
+    def record(self, name: str, start_ns: int):
+        """
+        Record the time since start_ns, taken from time.perf_counter_ns(), against name.
+        """
+        histogram = self.latencies.get(name)
+        if histogram is None:
+            histogram = self.latencies[name] = LatencyHistogram()
+
+        histogram.record(time.perf_counter_ns() - start_ns)
+
+    async def record_awaited(self, name: str, start_ns: int, awaitable: Awaitable):
+        """
+        Await awaitable, then record the time since start_ns against name.
+        """
+        try:
+            return await awaitable
+        finally:
+            self.record(name, start_ns)
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name: str, level: int):
+        _, maximum = self.gauges.get(name, (level, level))
+        self.gauges[name] = (level, max(level, maximum))
+
+    def reset(self):
+        self.latencies.clear()
+        self.counters.clear()
+        self.gauges.clear()
+
+    def is_empty(self) -> bool:
+        return not (self.latencies or self.counters or self.gauges)
+
+    def report(self) -> str:
+        lines = ["Latencies:"]
+        lines.extend(f" - {name:<28}{self.latencies[name]}" for name in sorted(self.latencies))
+        lines.append("Counters:")
+        lines.extend(f" - {name:<28}{self.counters[name]:>8}" for name in sorted(self.counters))
+        lines.append("Gauges:")
+        lines.extend(
+            f" - {name:<28}{last:>8} now, {maximum} max" for name, (last, maximum) in sorted(self.gauges.items())
+        )
+
+        return "\n".join(lines)
+
+
+def profile_call(function, *args, top: int = 20, output_path: Optional[str] = None):
+    """
+    Run function under cProfile, and summarise where the time went.
+
+    Arguments:
+        function: The function to profile, called with args.
+        top: Optional number of functions to list, by cumulative time.
+        output_path: Optional path to also save the raw profile to, for snakeviz or pstats.
+
+    Returns:
+        Tuple of the function's result and the summary text.
+    """
+    # Imported here, so startup does not pay for the profiler unless it is used.
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args)
+
+    if output_path:
+        profiler.dump_stats(output_path)
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    return result, summary.getvalue()
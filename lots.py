@@ -0,0 +1,269 @@
+import heapq
+from collections import deque
+from enum import Enum
+from typing import Iterable, Optional
+
+
+# Share counts at or below this are treated as zero, to absorb float error.
+SHARE_EPSILON = 1e-9
+
+
+class LotPolicy(Enum):
+    """
+    How a sell chooses which open buy lots it closes.
+    """
+
+    FIFO = "fifo"
+    LIFO = "lifo"
+    HIGHEST_COST = "hifo"
+    SPECIFIC = "specific"
+
+
+class Lot:
+    """An open buy lot: shares bought together at one price, some of which may be sold.
+
+    Attributes:
+        lot_id: Identifier of the buy position that opened this lot.
+        share_price: Dollar price paid per share.
+        original_shares: Number of shares bought.
+        remaining_shares: Number of shares not yet matched against a sell.
+        closed: Whether the lot is fully sold or removed.
+    """
+
+    def __init__(self, lot_id: str, share_count: float, share_price: float):
+        self.lot_id = lot_id
+        self.share_price = share_price
+        self.original_shares = share_count
+        self.remaining_shares = share_count
+        self.closed = False
+
+    def __repr__(self):
+        return f"Lot {self.lot_id} -> {self.remaining_shares}/{self.original_shares} @ ${self.share_price:.2f}"
+
+
+# add_lots rebuilds the cost heap, rather than pushing onto it, once it adds at least
+# 1 / HEAPIFY_RATIO as many lots as the heap holds.
+HEAPIFY_RATIO = 8
+
+
+# (lot id, number of shares matched, cost per share of the lot)
+LotMatch = tuple[str, float, float]
+
+
+class LotBook:
+    """Open buy lots for a ticker, matched against sells to give cost basis and P&L.
+
+    Lots are kept in arrival order in a deque, so FIFO sells take from the left and LIFO
+    sells from the right, and in a max-heap by price for highest-cost sells. Specific lot
+    sells look the lot up by id. Closed lots are skipped when reached rather than removed
+    from the middle of these structures, so each sell costs O(log n) amortised.
+
+    Open shares, open cost and realized P&L are kept as running totals as lots open and
+    close, so unrealized P&L at a given price is O(1).
+
+    Attributes:
+        lots: Open lots, keyed by lot id.
+        open_shares: Number of shares across all open lots.
+        open_cost: Dollar cost basis of all open shares.
+        realized_pnl: Dollar profit or loss realized by sells so far.
+    """
+
+    def __init__(self):
+        self.lots: dict[str, Lot] = {}
+        self.open_shares = 0.0
+        self.open_cost = 0.0
+        self.realized_pnl = 0.0
+
+        self._arrival_order: deque[Lot] = deque()
+        # (-share_price, arrival, lot), so the most expensive lot is at the top.
+        self._cost_heap: list[tuple[float, int, Lot]] = []
+        # Number of lots ever opened, breaking price ties on the heap. A plain int rather
+        # than itertools.count, as the book is pickled and count objects will not be.
+        self._arrivals = 0
+
+    @property
+    def average_cost(self) -> float:
+        """
+        Share-weighted average cost of the open shares.
+        """
+        return self.open_cost / self.open_shares if self.open_shares > SHARE_EPSILON else 0.0
+
+    def add_lot(self, lot_id: str, share_count: float, share_price: float) -> Lot:
+        """
+        Open a new lot.
+
+        Arguments:
+            lot_id: Identifier of the buy position opening the lot.
+            share_count: Number of shares bought.
+            share_price: Dollar price paid per share.
+
+        Returns:
+            The new Lot.
+        """
+        lot = Lot(lot_id, share_count, share_price)
+
+        self.lots[lot_id] = lot
+        self._arrival_order.append(lot)
+        heapq.heappush(self._cost_heap, (-share_price, self._arrivals, lot))
+        self._arrivals += 1
+
+        self.open_shares += share_count
+        self.open_cost += share_count * share_price
+
+        return lot
+
+    def add_lots(self, lot_ids: Iterable[str], share_counts: Iterable[float], share_prices: Iterable[float]):
+        """
+        Open many lots at once, in order, given column-wise. The running totals are
+        summed in the same order as separate add_lot calls would, so they come out the
+        same, and the cost heap is rebuilt once rather than pushed to per lot.
+        """
+        new_lots = list(map(Lot, lot_ids, share_counts, share_prices))
+
+        self.lots.update((lot.lot_id, lot) for lot in new_lots)
+        self._arrival_order.extend(new_lots)
+        arrivals = range(self._arrivals, self._arrivals + len(new_lots))
+        self._arrivals += len(new_lots)
+        heap_entries = [(-lot.share_price, arrival, lot) for arrival, lot in zip(arrivals, new_lots)]
+        if len(heap_entries) * HEAPIFY_RATIO < len(self._cost_heap):
+            # A few lots onto a big heap: pushing is cheaper than rebuilding.
+            for entry in heap_entries:
+                heapq.heappush(self._cost_heap, entry)
+        else:
+            self._cost_heap.extend(heap_entries)
+            heapq.heapify(self._cost_heap)
+
+        self.open_shares = sum((lot.original_shares for lot in new_lots), self.open_shares)
+        self.open_cost = sum((lot.original_shares * lot.share_price for lot in new_lots), self.open_cost)
+
+    def remove_lot(self, lot_id: str) -> bool:
+        """
+        Remove a lot that no sell has touched, as though it was never bought.
+
+        Returns:
+            Whether the lot was removed. False if it does not exist or is partly sold.
+        """
+        lot = self.lots.get(lot_id)
+        if lot is None or lot.remaining_shares != lot.original_shares:
+            return False
+
+        self._close(lot)
+        self.open_shares -= lot.original_shares
+        self.open_cost -= lot.original_shares * lot.share_price
+        self._compact()
+
+        return True
+
+    def _close(self, lot: Lot):
+        lot.closed = True
+        del self.lots[lot.lot_id]
+
+    def _next_lot(self, policy: LotPolicy) -> Lot:
+        """
+        Return the next open lot to sell from under policy, discarding closed lots found
+        on the way.
+        """
+        if policy is LotPolicy.FIFO:
+            while self._arrival_order[0].closed:
+                self._arrival_order.popleft()
+            return self._arrival_order[0]
+
+        if policy is LotPolicy.LIFO:
+            while self._arrival_order[-1].closed:
+                self._arrival_order.pop()
+            return self._arrival_order[-1]
+
+        while self._cost_heap[0][2].closed:
+            heapq.heappop(self._cost_heap)
+        return self._cost_heap[0][2]
+
+    def check_sell(
+        self, share_count: float, policy: LotPolicy = LotPolicy.FIFO, lot_id: Optional[str] = None
+    ):
+        """
+        Check that a sell can be matched in full, without changing anything.
+
+        Raises:
+            ValueError: If not enough shares are held, or the specific lot cannot cover the sell.
+        """
+        if policy is LotPolicy.SPECIFIC:
+            lot = self.lots.get(lot_id)
+            if lot is None:
+                raise ValueError(f"No open lot '{lot_id}'.")
+            if share_count > lot.remaining_shares + SHARE_EPSILON:
+                raise ValueError(f"Lot '{lot_id}' only holds {lot.remaining_shares} shares.")
+        elif share_count > self.open_shares + SHARE_EPSILON:
+            raise ValueError(f"Only {self.open_shares} shares held.")
+
+    def match_sell(
+        self, share_count: float, share_price: float, policy: LotPolicy = LotPolicy.FIFO, lot_id: Optional[str] = None
+    ) -> list[LotMatch]:
+        """
+        Match a sell against open lots, closing shares from them according to policy.
+        Nothing changes if the sell cannot be matched in full.
+
+        Arguments:
+            share_count: Number of shares sold.
+            share_price: Dollar price received per share.
+            policy: Optional LotPolicy choosing which lots are sold. Defaults to FIFO.
+            lot_id: Id of the lot to sell from, required for LotPolicy.SPECIFIC.
+
+        Returns:
+            The (lot id, shares, cost per share) matches making up the sell.
+
+        Raises:
+            ValueError: If not enough shares are held, or the specific lot cannot cover the sell.
+        """
+        self.check_sell(share_count, policy=policy, lot_id=lot_id)
+
+        matches = []
+        shares_left = share_count
+
+        while shares_left > SHARE_EPSILON:
+            lot = self.lots[lot_id] if policy is LotPolicy.SPECIFIC else self._next_lot(policy)
+            matched_shares = min(shares_left, lot.remaining_shares)
+
+            lot.remaining_shares -= matched_shares
+            if lot.remaining_shares <= SHARE_EPSILON:
+                self._close(lot)
+
+            shares_left -= matched_shares
+            self.open_shares -= matched_shares
+            self.open_cost -= matched_shares * lot.share_price
+            self.realized_pnl += matched_shares * (share_price - lot.share_price)
+            matches.append((lot.lot_id, matched_shares, lot.share_price))
+
+        if not self.lots:
+            # Clear float residue once everything is sold.
+            self.open_shares = 0.0
+            self.open_cost = 0.0
+
+        self._compact()
+
+        return matches
+
+    def _compact(self):
+        """
+        Drop closed lots from the arrival deque and cost heap once they make up most of
+        them, so specific lot sells and removals cannot grow them without bound.
+        """
+        if len(self._arrival_order) <= 2 * len(self.lots) + 32:
+            return
+
+        self._arrival_order = deque(lot for lot in self._arrival_order if not lot.closed)
+        self._cost_heap = [entry for entry in self._cost_heap if not entry[2].closed]
+        heapq.heapify(self._cost_heap)
+
+    def unrealized_pnl(self, market_price: float) -> float:
+        """
+        Dollar profit or loss on the open shares, were they sold at market_price.
+        """
+        return market_price * self.open_shares - self.open_cost
+
+    def recalculate(self):
+        """
+        Recompute open shares and open cost from the open lots, discarding any drift in
+        the running totals.
+        """
+        self.open_shares = sum(lot.remaining_shares for lot in self.lots.values())
+        self.open_cost = sum(lot.remaining_shares * lot.share_price for lot in self.lots.values())
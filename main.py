@@ -1,46 +1,188 @@
-from cli_utils import parse_command, read_new_command, command_mapping
-from graphics import (
-    display_welcome,
-    display_goodbye,
-    display_segments,
-    combine_segments,
-    generate_panel,
-    queue_notifications,
-)
+import argparse
+import os
+import sys
+from collections.abc import Awaitable
+
+from cli_utils import dispatch_command, read_new_command, run_batch
+from graphics import display_welcome, display_goodbye, draw_frame, FrameRenderer
 from classes import SystemConfig, Portfolio
-from notifications import Notification, NotificationSource, NotificationManager
+from notification_log import NOTIFICATION_LOG_DIRECTORY, NotificationLog
+from notifications import NotificationManager
+from persistence import TransactionLog
+
+# asyncio, the event loop, the price feed and the process pool are imported where they are
+# used, so one-shot and batch runs start without them.
+
+
+def run_interactive(system_config: SystemConfig, portfolio: Portfolio):
+    """
+    Main execution loop - draw the display, then read and run one command at a time.
+    """
+    notification_manager = system_config.notification_manager
+
+    # Redraw only changed rows on a terminal; fall back to printing every row otherwise.
+    renderer = FrameRenderer() if sys.stdout.isatty() else None
+
+    while system_config.main_loop_continue:
+        notification_manager.expire_notifications()
+        draw_frame(notification_manager, renderer=renderer, stats=system_config.stats)
+
+        new_command = read_new_command()
+        result = dispatch_command(system_config, portfolio, new_command)
 
-main_loop_continue = True
+        # Coroutine commands are run to completion.
+        if isinstance(result, Awaitable):
+            import asyncio
 
+            try:
+                asyncio.run(result)
+            except Exception as e:
+                print(" - failed, command not supported", e)
 
-# Welcome graphics on startup.
-display_welcome()
+    if renderer:
+        renderer.close()
 
-# Initilising system.
-system_config = SystemConfig()
-portfolio = Portfolio("Jack Woodman")
-notification_manager = NotificationManager()
 
-while system_config.main_loop_continue:
-    input_display = combine_segments(
-        generate_panel(), queue_notifications(notification_manager.get_notifications())
+def run_one_shot(system_config: SystemConfig, portfolio: Portfolio, new_command: list[str]) -> int:
+    """
+    Run a single command given on the command line, as a batch of one.
+
+    Returns:
+        Exit status - 0 if the command succeeded, 1 if it failed, 2 if it was not recognised.
+    """
+    summary = run_batch([" ".join(new_command)], system_config, portfolio)
+
+    if summary.unrecognised:
+        print(f"Command '{new_command[0]}' not currently supported.", file=sys.stderr)
+        return 2
+
+    return 1 if summary.failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLIP - command line interface portfolio.")
+    parser.add_argument(
+        "command",
+        nargs=argparse.REMAINDER,
+        metavar="COMMAND",
+        help="Run this one command against the saved portfolio, then exit, e.g. 'buy AAPL 10 150'. "
+        "The exit status is 0 if it succeeded, 1 if it failed and 2 if it was not recognised.",
+    )
+    parser.add_argument(
+        "--batch",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help="Run commands from FILE, one per line, without the interactive display. "
+        "Reads from stdin if FILE is '-' or omitted.",
     )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Run the interactive loop on asyncio, expiring notifications and applying prices "
+        "in the background while waiting for commands.",
+    )
+    parser.add_argument(
+        "--feed",
+        metavar="SOURCE",
+        help="With --async, follow prices from a quotes file or host:port quote server. "
+        "With --rollup, value holdings at the prices it holds.",
+    )
+    parser.add_argument(
+        "--rollup",
+        action="store_true",
+        help="Print per-ticker totals across every portfolio in the data directory, then exit.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="Number of worker processes for --rollup. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Keep the positions of tickers created in this run in columnar arrays, which take "
+        "less memory once a ticker holds many positions. Existing tickers keep their layout.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Record command latencies, render times and buffer sizes from startup. "
+        "See them with the 'stats' command, or on exit.",
+    )
+    arguments = parser.parse_args()
+
+    if arguments.rollup:
+        from multi_portfolio import MultiPortfolioManager
+        from pricefeed import batch_quotes, open_quote_source, parse_quotes
+
+        prices = {}
+        if arguments.feed:
+            for latest_prices in batch_quotes(parse_quotes(open_quote_source(arguments.feed))):
+                prices.update(latest_prices)
+
+        manager = MultiPortfolioManager(SystemConfig().data_directory, workers=arguments.workers)
+        print(manager.aggregate(prices))
+        return
+
+    # Initilising system.
+    system_config = SystemConfig()
+    system_config.interactive = arguments.batch is None and not arguments.command
+    system_config.notification_manager = NotificationManager(
+        spill_log=NotificationLog(os.path.join(system_config.data_directory, NOTIFICATION_LOG_DIRECTORY))
+    )
+    system_config.stats.enabled = arguments.stats
+
+    transaction_log = TransactionLog(system_config.data_directory, "Jack Woodman")
+    portfolio = transaction_log.load(columnar=arguments.columnar)
+    system_config.transaction_log = transaction_log
 
-    display_segments(input_display=input_display)
+    if arguments.command:
+        # No banners, and no snapshot on exit unless one falls due, as a one-shot run is
+        # typically one of very many from a script.
+        transaction_log.auto_flush = False
+        portfolio.history.enabled = False
+        status = run_one_shot(system_config, portfolio, arguments.command)
+        transaction_log.close(snapshot=False)
+        system_config.notification_manager.close()
+        if not system_config.stats.is_empty():
+            print(system_config.stats.report())
+        sys.exit(status)
 
-    new_command = read_new_command()
-    command = parse_command(new_command)
+    if system_config.interactive:
+        # Welcome graphics on startup.
+        display_welcome()
+        if arguments.use_async:
+            import asyncio
+            from event_loop import AsyncClip
 
-    if command:
-        notification_manager.add_notification(
-            Notification(title="COMMAND RECOGNISED", subtitle=command.value, text=str(command))
-        )
+            renderer = FrameRenderer() if sys.stdout.isatty() else None
+            asyncio.run(AsyncClip(system_config, portfolio, renderer=renderer, quote_source=arguments.feed).run())
+            if renderer:
+                renderer.close()
+        else:
+            run_interactive(system_config, portfolio)
+    else:
+        # Flush and snapshot once at the end, rather than per command.
+        transaction_log.auto_flush = False
+        transaction_log.snapshot_interval = None
+        # Nothing is undone in a batch run, so skip keeping the history and its checkpoints.
+        portfolio.history.enabled = False
+        if arguments.batch == "-":
+            summary = run_batch(sys.stdin, system_config, portfolio)
+        else:
+            with open(arguments.batch) as command_file:
+                summary = run_batch(command_file, system_config, portfolio)
+        print(summary)
 
-    try:
-        command_mapping[command](system_config, portfolio, new_command[1:])
-    except Exception as e:
-        print(" - failed, command not supported", e)
+    transaction_log.close()
+    # Keep what is still in the notification column, so the history is complete.
+    system_config.notification_manager.close()
+    system_config.freeze()
+    display_goodbye(system_config)
 
 
-system_config.freeze()
-display_goodbye(system_config)
+if __name__ == "__main__":
+    main()
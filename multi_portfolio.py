@@ -0,0 +1,217 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from typing import Iterable, Optional
+
+from classes import Portfolio
+from persistence import TransactionLog
+
+
+class TickerRollup:
+    """Totals for one ticker, summed across portfolios.
+
+    Attributes:
+        shares: Number of open shares held.
+        cost: Dollar cost basis of the open shares.
+        exposure: Dollar market value of the open shares, at cost where never priced.
+        unrealized_pnl: Unrealized dollar profit or loss of the priced shares.
+        realized_pnl: Dollar profit or loss realized by sells.
+        holders: Number of portfolios holding open shares.
+    """
+
+    def __init__(self):
+        self.shares = 0.0
+        self.cost = 0.0
+        self.exposure = 0.0
+        self.unrealized_pnl = 0.0
+        self.realized_pnl = 0.0
+        self.holders = 0
+
+    def merge(self, other: "TickerRollup"):
+        self.shares += other.shares
+        self.cost += other.cost
+        self.exposure += other.exposure
+        self.unrealized_pnl += other.unrealized_pnl
+        self.realized_pnl += other.realized_pnl
+        self.holders += other.holders
+
+    def __repr__(self):
+        return (
+            f"{self.shares} shares, cost ${self.cost:.2f}, exposure ${self.exposure:.2f}, "
+            f"P&L ${self.unrealized_pnl:.2f} unrealized / ${self.realized_pnl:.2f} realized"
+        )
+
+
+class Rollup:
+    """Per-ticker totals across any number of portfolios.
+
+    Rollups of separate groups of portfolios merge into the rollup of all of them, so
+    groups can be summed independently, in separate processes, and then reduced.
+
+    Attributes:
+        tickers: TickerRollup for each ticker name.
+        portfolio_count: Number of portfolios included.
+    """
+
+    def __init__(self):
+        self.tickers: dict[str, TickerRollup] = {}
+        self.portfolio_count = 0
+
+    def add_portfolio(self, portfolio: Portfolio):
+        """
+        Add a portfolio's holdings to the totals.
+        """
+        # Each ticker's published totals, so a portfolio still being traded adds up.
+        for ticker_name, ticker in list(portfolio.tickers.items()):
+            ticker_rollup = self.tickers.get(ticker_name)
+            if ticker_rollup is None:
+                ticker_rollup = self.tickers[ticker_name] = TickerRollup()
+
+            totals = ticker.totals
+            open_shares, open_cost = totals.shares, totals.cost_basis
+            ticker_rollup.shares += open_shares
+            ticker_rollup.cost += open_cost
+            ticker_rollup.realized_pnl += totals.realized_pnl
+            if totals.last_price is None:
+                ticker_rollup.exposure += open_cost
+            else:
+                ticker_rollup.exposure += totals.market_value
+                ticker_rollup.unrealized_pnl += totals.market_pnl
+            if open_shares:
+                ticker_rollup.holders += 1
+
+        self.portfolio_count += 1
+
+    def merge(self, other: "Rollup") -> "Rollup":
+        """
+        Add another rollup's totals to this one.
+
+        Returns:
+            This rollup, so merges can be chained or reduced.
+        """
+        for ticker_name, other_ticker in other.tickers.items():
+            ticker_rollup = self.tickers.get(ticker_name)
+            if ticker_rollup is None:
+                self.tickers[ticker_name] = other_ticker
+            else:
+                ticker_rollup.merge(other_ticker)
+
+        self.portfolio_count += other.portfolio_count
+
+        return self
+
+    @property
+    def exposure(self) -> float:
+        return sum(ticker_rollup.exposure for ticker_rollup in self.tickers.values())
+
+    @property
+    def unrealized_pnl(self) -> float:
+        return sum(ticker_rollup.unrealized_pnl for ticker_rollup in self.tickers.values())
+
+    @property
+    def realized_pnl(self) -> float:
+        return sum(ticker_rollup.realized_pnl for ticker_rollup in self.tickers.values())
+
+    def __str__(self):
+        lines = [f"{self.portfolio_count} portfolios, {len(self.tickers)} tickers."]
+        for ticker_name in sorted(self.tickers, key=lambda name: -self.tickers[name].exposure):
+            lines.append(f"{ticker_name:<8} {self.tickers[ticker_name]!r}")
+        lines.append(
+            f"Total exposure ${self.exposure:.2f}, P&L ${self.unrealized_pnl:.2f} unrealized / "
+            f"${self.realized_pnl:.2f} realized."
+        )
+
+        return "\n".join(lines)
+
+
+def rollup_portfolios(
+    data_directory: str, portfolio_names: Iterable[str], prices: Optional[dict[str, float]] = None
+) -> Rollup:
+    """
+    Load portfolios one at a time and sum them into a rollup. Run in each pool worker, so
+    only the small rollup crosses back to the parent, not the portfolios.
+
+    Arguments:
+        data_directory: Directory holding the portfolios' logs and snapshots.
+        portfolio_names: Names of the portfolios to load.
+        prices: Optional dictionary of upper case ticker name to market price, applied
+            before summing.
+    """
+    rollup = Rollup()
+
+    for portfolio_name in portfolio_names:
+        portfolio = TransactionLog(data_directory, portfolio_name, snapshot_interval=None).load(read_only=True)
+        for ticker_name, price in (prices or {}).items():
+            portfolio.update_price(ticker_name, price)
+        rollup.add_portfolio(portfolio)
+
+    return rollup
+
+
+class MultiPortfolioManager:
+    """Aggregates every portfolio saved in a data directory, in parallel.
+
+    Portfolio names are split into shards, each shard is loaded and rolled up by a worker
+    process, and the shard rollups are reduced into one. There are several shards per
+    worker, so a few large portfolios do not leave the other workers idle.
+
+    Attributes:
+        data_directory: Directory holding the portfolios' logs and snapshots.
+        portfolio_names: Names of the portfolios found there.
+        workers: Number of worker processes. Defaults to the number of CPUs.
+    """
+
+    # Shards per worker.
+    shards_per_worker = 4
+
+    def __init__(self, data_directory: str, workers: Optional[int] = None):
+        self.data_directory = data_directory
+        self.workers = workers or os.cpu_count() or 1
+        self.portfolio_names = self.find_portfolios()
+
+    def find_portfolios(self) -> list[str]:
+        """
+        Names of the portfolios with a log or snapshot in the data directory. Names are
+        recovered from file names, so come back in the lower case form files are named by.
+        """
+        if not os.path.isdir(self.data_directory):
+            return []
+
+        return sorted(
+            {
+                stem
+                for stem, extension in map(os.path.splitext, os.listdir(self.data_directory))
+                if extension in (".log", ".snapshot")
+            }
+        )
+
+    def shards(self) -> list[list[str]]:
+        """
+        Split the portfolio names into roughly equal shards.
+        """
+        shard_count = min(len(self.portfolio_names), self.workers * self.shards_per_worker) or 1
+
+        return [self.portfolio_names[index::shard_count] for index in range(shard_count)]
+
+    def aggregate(self, prices: Optional[dict[str, float]] = None) -> Rollup:
+        """
+        Roll up every portfolio, sharded across the worker processes.
+
+        Arguments:
+            prices: Optional dictionary of upper case ticker name to market price, applied
+                to every portfolio before summing.
+
+        Returns:
+            The Rollup of all portfolios.
+        """
+        shards = self.shards()
+
+        if self.workers == 1 or len(shards) == 1:
+            shard_rollups = (rollup_portfolios(self.data_directory, shard, prices) for shard in shards)
+            return reduce(Rollup.merge, shard_rollups, Rollup())
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            shard_rollups = executor.map(
+                rollup_portfolios, [self.data_directory] * len(shards), shards, [prices] * len(shards)
+            )
+            return reduce(Rollup.merge, shard_rollups, Rollup())
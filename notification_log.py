@@ -0,0 +1,308 @@
+import gzip
+import json
+import os
+import re
+from itertools import islice
+from typing import Iterator, Optional
+
+from notifications import Notification, NotificationSource
+
+
+# The log lives here under the data directory.
+NOTIFICATION_LOG_DIRECTORY = "notifications"
+
+# Segment files are numbered in the order they were written.
+SEGMENT_NAME = "segment-{:06d}.jsonl.gz"
+SEGMENT_PATTERN = re.compile(r"segment-(\d{6})\.jsonl\.gz")
+INDEX_NAME = "index.json"
+
+
+def notification_record(notification: Notification) -> dict:
+    return {
+        "title": notification.title,
+        "text": notification.text,
+        "subtitle": notification.subtitle,
+        "source": notification.source.value,
+        "valid": notification.valid,
+        "created_ns": notification.created_ns,
+        "expires_ns": notification.expires_ns,
+        "invalidated_ns": notification.invalidated_ns,
+    }
+
+
+def notification_from_record(record: dict) -> Notification:
+    notification = Notification(
+        title=record["title"],
+        text=record["text"],
+        subtitle=record["subtitle"],
+        source=NotificationSource(record["source"]),
+    )
+    notification.valid = record["valid"]
+    notification.created_ns = record["created_ns"]
+    notification.expires_ns = record["expires_ns"]
+    notification.invalidated_ns = record["invalidated_ns"]
+
+    return notification
+
+
+class SegmentEntry:
+    """Index entry summarising one segment, so searches can skip segments that cannot
+    match without decompressing them.
+
+    Attributes:
+        name: File name of the segment.
+        count: Number of notifications in the segment.
+        first_ns: Earliest creation time in the segment, in epoch nanoseconds.
+        last_ns: Latest creation time in the segment, in epoch nanoseconds.
+        sources: Number of notifications from each NotificationSource value.
+    """
+
+    __slots__ = ("name", "count", "first_ns", "last_ns", "sources")
+
+    def __init__(
+        self,
+        name: str,
+        count: int = 0,
+        first_ns: int = 0,
+        last_ns: int = 0,
+        sources: Optional[dict[str, int]] = None,
+    ):
+        self.name = name
+        self.count = count
+        self.first_ns = first_ns
+        self.last_ns = last_ns
+        self.sources: dict[str, int] = sources or {}
+
+    def add(self, record: dict):
+        created_ns = record["created_ns"]
+        if not self.count or created_ns < self.first_ns:
+            self.first_ns = created_ns
+        if not self.count or created_ns > self.last_ns:
+            self.last_ns = created_ns
+        self.count += 1
+        self.sources[record["source"]] = self.sources.get(record["source"], 0) + 1
+
+    def may_match(self, source: Optional[str], since_ns: Optional[int], until_ns: Optional[int]) -> bool:
+        return (
+            (source is None or source in self.sources)
+            and (since_ns is None or self.last_ns >= since_ns)
+            and (until_ns is None or self.first_ns <= until_ns)
+        )
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class NotificationLog:
+    """Compressed, segmented on-disk log of notifications that left the in-memory buffer.
+
+    Notifications are written as JSON lines to gzip segment files of at most
+    segment_size notifications each. A small JSON index records, for every segment, its
+    size, creation time range and count of each source. Searches read the index first and
+    decompress only the segments that could match, one at a time, so memory stays bounded
+    by one segment however long the log grows.
+
+    Nothing is created on disk until the first notification is written. close() marks the
+    index closed, and a log opened on a closed index trusts its counts without reading any
+    segment; otherwise the last segment is recounted, as a run may have ended mid-write.
+
+    Attributes:
+        directory: Directory holding the segments and index.
+        segment_size: Number of notifications per segment.
+        segments: SegmentEntry of every segment, oldest first, including the one being
+            written.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 10_000):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segments: list[SegmentEntry] = []
+        self._segment_file = None
+        # Whether the last segment ends cleanly, so more can be appended to it.
+        self._last_segment_whole = False
+        # Whether the index on disk is marked closed.
+        self._index_closed = False
+
+        self._read_index()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def __len__(self) -> int:
+        return sum(segment.count for segment in self.segments)
+
+    def _read_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as index_file:
+                index = json.load(index_file)
+            self.segments = [SegmentEntry(**entry) for entry in index["segments"]]
+
+            if index.get("closed"):
+                # Every segment was finished and counted by close().
+                self._last_segment_whole = self._index_closed = True
+                return
+
+        if not os.path.isdir(self.directory):
+            return
+
+        # Recount the last indexed segment, and index any written after it, in case the
+        # previous run ended without closing the log.
+        indexed = {segment.name for segment in self.segments[:-1]}
+        del self.segments[-1:]
+        for name in sorted(os.listdir(self.directory)):
+            if SEGMENT_PATTERN.fullmatch(name) and name not in indexed:
+                segment = SegmentEntry(name)
+                try:
+                    for record in self._read_segment(name, tolerate_damage=False):
+                        segment.add(record)
+                    self._last_segment_whole = True
+                except (EOFError, gzip.BadGzipFile):
+                    self._last_segment_whole = False
+                self.segments.append(segment)
+
+    def _write_index(self, closed: bool = False):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f"{self.index_path}.tmp"
+        with open(temporary_path, "w") as index_file:
+            index = {"segments": [segment.as_dict() for segment in self.segments], "closed": closed}
+            json.dump(index, index_file)
+        os.replace(temporary_path, self.index_path)
+        self._index_closed = closed
+
+    def _start_segment(self):
+        if self.segments and self._last_segment_whole and self.segments[-1].count < self.segment_size:
+            # Carry on the last segment as a new gzip member, rather than leave a small
+            # segment behind every run.
+            path = os.path.join(self.directory, self.segments[-1].name)
+            self._segment_file = gzip.open(path, "at", encoding="utf-8")
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            last_number = 0
+            if self.segments:
+                last_number = int(SEGMENT_PATTERN.fullmatch(self.segments[-1].name).group(1))
+            segment = SegmentEntry(SEGMENT_NAME.format(last_number + 1))
+            self.segments.append(segment)
+            self._segment_file = gzip.open(os.path.join(self.directory, segment.name), "wt", encoding="utf-8")
+
+        # No longer closed, so a run that ends without close() has this segment recounted.
+        self._write_index()
+
+    def _finish_segment(self, closed: bool = False):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+            self._last_segment_whole = True
+            self._write_index(closed)
+
+    def append(self, notification: Notification):
+        """
+        Write a notification to the current segment, starting a new segment when it is full.
+        """
+        if self._segment_file is None or self.segments[-1].count >= self.segment_size:
+            self._finish_segment()
+            self._start_segment()
+
+        record = notification_record(notification)
+        self._segment_file.write(json.dumps(record, separators=(",", ":")))
+        self._segment_file.write("\n")
+        self.segments[-1].add(record)
+
+    def flush(self):
+        """
+        Make everything written so far readable, without ending the current segment.
+        """
+        if self._segment_file is not None:
+            self._segment_file.flush()
+            self._write_index()
+
+    def close(self):
+        """
+        Finish the current segment and save the index, marked closed.
+        """
+        if self._segment_file is not None:
+            self._finish_segment(closed=True)
+        elif self.segments and not self._index_closed:
+            # Recounted on opening, so the counts can be trusted from now on.
+            self._write_index(closed=True)
+
+    def _read_segment(self, name: str, tolerate_damage: bool = True) -> Iterator[dict]:
+        """
+        Yield the records of a segment, oldest first. A segment cut short by a crash, or
+        still being written, yields the records that are whole, then stops or, unless
+        tolerate_damage is set, raises EOFError.
+        """
+        try:
+            with gzip.open(os.path.join(self.directory, name), "rt", encoding="utf-8") as segment_file:
+                for line in segment_file:
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile):
+            if not tolerate_damage:
+                raise
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        source: Optional[NotificationSource] = None,
+        since_ns: Optional[int] = None,
+        until_ns: Optional[int] = None,
+    ) -> Iterator[Notification]:
+        """
+        Yield logged notifications matching every filter given, newest first. Segments the
+        index rules out are not read.
+
+        Arguments:
+            text: Optional text to find, case insensitive, in the title, subtitle or text.
+            source: Optional NotificationSource the notification must come from.
+            since_ns: Optional earliest creation time, in epoch nanoseconds.
+            until_ns: Optional latest creation time, in epoch nanoseconds.
+        """
+        self.flush()
+        source_value = source.value if source else None
+        needle = text.lower() if text else None
+
+        for segment in reversed(self.segments):
+            if not segment.may_match(source_value, since_ns, until_ns):
+                continue
+
+            for record in reversed(list(self._read_segment(segment.name))):
+                if source_value is not None and record["source"] != source_value:
+                    continue
+                if since_ns is not None and record["created_ns"] < since_ns:
+                    continue
+                if until_ns is not None and record["created_ns"] > until_ns:
+                    continue
+                if needle is not None and not any(
+                    needle in field.lower()
+                    for field in (record["title"], record["subtitle"], record["text"])
+                    if field
+                ):
+                    continue
+                yield notification_from_record(record)
+
+    def page(self, page_number: int, page_size: int = 20, **filters) -> list[Notification]:
+        """
+        One page of search results, newest first, counting pages from 1. Without filters,
+        whole segments before the page are skipped using their counts in the index.
+        """
+        skip = (page_number - 1) * page_size
+
+        if any(value is not None for value in filters.values()):
+            return list(islice(self.search(**filters), skip, skip + page_size))
+
+        self.flush()
+        notifications = []
+        for segment in reversed(self.segments):
+            if skip >= segment.count:
+                skip -= segment.count
+                continue
+
+            records = list(self._read_segment(segment.name))[::-1]
+            wanted = page_size - len(notifications)
+            notifications.extend(map(notification_from_record, records[skip : skip + wanted]))
+            skip = 0
+            if len(notifications) == page_size:
+                break
+
+        return notifications
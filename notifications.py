@@ -1,15 +1,58 @@
-from typing import Optional
+from typing import TYPE_CHECKING, Iterable, Optional
 from datetime import datetime, timedelta
 from enum import Enum
-import bisect
+from collections import deque
+from itertools import count, islice
+import heapq
+import threading
+
+from clock import delta_to_ns, from_ns, now_ns, to_ns
+
+if TYPE_CHECKING:
+    from notification_log import NotificationLog
 
 
 class NotificationSource(Enum):
     TEST = "test"
     SYSTEM = "system"
+    FEED = "feed"
+
+    # Members are singletons, so hashing by identity agrees with equality, and skips the
+    # Python level name hash Enum uses. The manager's indexes hash a source per update.
+    __hash__ = object.__hash__
 
 
 class Notification:
+    """A message shown alongside the panel, until it expires or is invalidated.
+
+    Notifications use __slots__, and hold their times as integer epoch nanoseconds, with
+    datetime views derived on demand.
+
+    Attributes:
+        title: Heading line.
+        text: Body text.
+        subtitle: Optional line between the title and text.
+        source: NotificationSource the notification came from.
+        valid: Whether the notification is still worth showing.
+        created_ns: Integer epoch nanoseconds when the notification was made.
+        expires_ns: Integer epoch nanoseconds when it expires, or None if it never does.
+        invalidated_ns: Integer epoch nanoseconds when it was invalidated, if it has been.
+        manager: The NotificationManager currently holding this notification, if any.
+    """
+
+    __slots__ = (
+        "_wrapped_text",
+        "title",
+        "text",
+        "subtitle",
+        "source",
+        "valid",
+        "created_ns",
+        "expires_ns",
+        "invalidated_ns",
+        "manager",
+    )
+
     def __init__(
         self,
         title: str,
@@ -21,12 +64,34 @@ class Notification:
         self.title = title
         self.text = text
         self.subtitle = subtitle
-        self.notification_time = datetime.now()
-        self.expiration_delta: timedelta = expiration_delta
-        self.invalidation_time: datetime = None
         self.source = source
         self.valid = True
-        self.text_length = len(text)
+        self.created_ns = now_ns()
+        self.expires_ns: Optional[int] = (
+            self.created_ns + delta_to_ns(expiration_delta) if expiration_delta is not None else None
+        )
+        self.invalidated_ns: Optional[int] = None
+        self.manager: Optional["NotificationManager"] = None
+        # (width, lines) of the last wrap_text call.
+        self._wrapped_text: Optional[tuple[int, tuple[str, ...]]] = None
+
+    @property
+    def notification_time(self) -> datetime:
+        return from_ns(self.created_ns)
+
+    @property
+    def expiration_time(self) -> Optional[datetime]:
+        return from_ns(self.expires_ns) if self.expires_ns is not None else None
+
+    @property
+    def expiration_delta(self) -> Optional[timedelta]:
+        if self.expires_ns is None:
+            return None
+        return timedelta(microseconds=(self.expires_ns - self.created_ns) // 1000)
+
+    @property
+    def invalidation_time(self) -> Optional[datetime]:
+        return from_ns(self.invalidated_ns) if self.invalidated_ns is not None else None
 
     def check_expired(self) -> bool:
         """
@@ -37,7 +102,7 @@ class Notification:
             A bool indicating whether notification expired or not.
         """
 
-        if self.notification_time + self.expiration_delta >= datetime.now():
+        if self.expires_ns is not None and self.expires_ns <= now_ns():
             self.invalidate()
             return True
 
@@ -45,10 +110,35 @@ class Notification:
 
     def invalidate(self):
         """
-        Mark this notification as invalid; no longer useful.
+        Mark this notification as invalid; no longer useful. Lets the holding
+        NotificationManager know, so its valid count stays correct.
         """
+        if not self.valid:
+            return
+
         self.valid = False
-        self.invalidation_time = datetime.now()
+        self.invalidated_ns = now_ns()
+
+        if self.manager:
+            self.manager.on_notification_invalidated(self)
+
+    def wrap_text(self, width: int) -> tuple[str, ...]:
+        """
+        Split the text into lines of at most width characters. The result is cached, as
+        the same notification is drawn on every frame until it leaves the buffer.
+
+        Returns:
+            The lines, in reading order. Empty if there is no text.
+        """
+        wrapped_text = self._wrapped_text
+        if wrapped_text is not None and wrapped_text[0] == width:
+            return wrapped_text[1]
+
+        text = self.text
+        lines = tuple(text[start : start + width] for start in range(0, len(text), width))
+        self._wrapped_text = (width, lines)
+
+        return lines
 
     def get_number_of_lines(self) -> int:
         """
@@ -69,11 +159,110 @@ class Notification:
 
 
 class NotificationManager:
+    """
+    Fixed capacity store of notifications, most recent first.
+
+    Notifications are kept in a ring buffer (a deque with a maximum length). Adding a
+    notification puts it at the front, and once the buffer is full the oldest
+    notification falls off the back, both in constant time. Order of arrival is the
+    order of recency, so the buffer never needs sorting.
+
+    Notifications with an expiration_delta are also scheduled on a min-heap keyed by
+    expiration time. expire_notifications() pops only the notifications that are due,
+    rather than checking every notification in the buffer.
+
+    With a spill_log, every notification leaving the buffer is written to it rather than
+    dropped, and close() writes out those still buffered.
+
+    Secondary indexes of the buffered notifications by source, and of the valid ones
+    overall and by source, are kept up to date as notifications are added, invalidated
+    and evicted. They are insertion ordered dicts used as ordered sets, so each update
+    is O(1), every count is a len(), and a filtered view is a lazy reversed walk over
+    just the matching notifications. Recency order is the order notifications were
+    added, which need not be the order they were made in: a notification made on one
+    thread may be added after a newer one from another. A time filter therefore checks
+    every notification it walks, rather than stopping at the first older one.
+
+    Changes hold lock, so notifications may be added from threads other than the one
+    drawing them. get_notifications() is lazy; hold lock while iterating its result if
+    another thread may add notifications meanwhile.
+    """
+
     buffer_max_size = 100
-    notification_buffer: list[Notification] = []
+    notification_buffer: deque[Notification] = deque(maxlen=buffer_max_size)
 
-    def __init__(self):
-        self.notification_buffer = []
+    def __init__(self, spill_log: Optional["NotificationLog"] = None):
+        """
+        Arguments:
+            spill_log: Optional NotificationLog to keep notifications that leave the buffer.
+        """
+        self.spill_log = spill_log
+        self.lock = threading.RLock()
+        self.notification_buffer = deque(maxlen=self.buffer_max_size)
+        # False once append_notification has placed something out of recency order.
+        self._in_recency_order = True
+        # (expires_ns, tie-breaker, notification) for every expiring notification.
+        self._expiry_heap: list[tuple[int, int, Notification]] = []
+        self._expiry_sequence = count()
+        # Ordered sets, oldest first: the valid notifications, and for each source, every
+        # notification and the valid ones.
+        self._valid: dict[Notification, None] = {}
+        self._source_indexes: dict[NotificationSource, tuple[dict, dict]] = {
+            source: ({}, {}) for source in NotificationSource
+        }
+
+    def _track(self, new_notification: Notification):
+        """
+        Start tracking a notification that has just entered the buffer.
+        """
+        new_notification.manager = self
+        self._index(new_notification)
+
+        if new_notification.expires_ns is not None:
+            heapq.heappush(
+                self._expiry_heap,
+                (new_notification.expires_ns, next(self._expiry_sequence), new_notification),
+            )
+
+            # Evicted and invalidated notifications stay on the heap until due; compact if they pile up.
+            if len(self._expiry_heap) > 2 * self.buffer_max_size:
+                self._expiry_heap = [
+                    entry for entry in self._expiry_heap if entry[2].manager is self and entry[2].valid
+                ]
+                heapq.heapify(self._expiry_heap)
+
+    def _index(self, notification: Notification):
+        """
+        Enter a notification into the secondary indexes, as the newest.
+        """
+        every_index, valid_index = self._source_indexes[notification.source]
+        every_index[notification] = None
+        if notification.valid:
+            self._valid[notification] = None
+            valid_index[notification] = None
+
+    def _untrack(self, departing_notification: Notification):
+        """
+        Stop tracking a notification that has just left the buffer.
+        """
+        departing_notification.manager = None
+
+        every_index, valid_index = self._source_indexes[departing_notification.source]
+        del every_index[departing_notification]
+        if departing_notification.valid:
+            del self._valid[departing_notification]
+            del valid_index[departing_notification]
+
+        if self.spill_log is not None:
+            self.spill_log.append(departing_notification)
+
+    def on_notification_invalidated(self, notification: Notification):
+        """
+        Called by a held notification when it is invalidated.
+        """
+        with self.lock:
+            del self._valid[notification]
+            del self._source_indexes[notification.source][1][notification]
 
     def is_full(self) -> bool:
         """
@@ -87,7 +276,7 @@ class NotificationManager:
 
     def append_notification(self, new_notification: Notification) -> bool:
         """
-        Append a new notification to the record. Will not sort or maintain order.
+        Append a new notification to the back of the record. Will not sort or maintain order.
         Will not insert and replace if the array is full.
 
         Args:
@@ -97,18 +286,21 @@ class NotificationManager:
             Whether the appendation was successful or not.
 
         """
-        if not self.is_full():
-            self.notification_buffer.append(new_notification)
-            return True
-        else:
-            return False
+        with self.lock:
+            if not self.is_full():
+                self.notification_buffer.append(new_notification)
+                self._track(new_notification)
+                self._in_recency_order = False
+                return True
+            else:
+                return False
 
     def add_notification(self, new_notification: Notification, cull_records: bool = True) -> int:
         """
-        Add a new notification at the start of the record, indicating recency. Uses an insertion method so that if
-        multiple notifications are added at the same time in close succession, order is preserved.
+        Add a new notification at the start of the record, indicating recency. If the buffer
+        is full, the oldest notification is dropped to make room. Both are constant time.
 
-        If cull_records is set to False, will not 'cull' the notifications, but this shouldn't be needed.
+        cull_records is kept for compatibility; the buffer length is always enforced.
 
         Arguments:
             new_notification: The Notification object representing new record to be inserted.
@@ -119,36 +311,85 @@ class NotificationManager:
             The integer length of the records after insertions.
         """
 
-        bisect.insort(self.notification_buffer, new_notification, key=lambda x: x.notification_time)
-        self.notification_buffer.reverse()
+        with self.lock:
+            if self.is_full():
+                self._untrack(self.notification_buffer[-1])
 
-        if cull_records:
-            self.cull_notifications()
+            self.notification_buffer.appendleft(new_notification)
+            self._track(new_notification)
 
-        return len(self.notification_buffer)
+            return len(self.notification_buffer)
+
+    def expire_notifications(self, now: Optional[datetime] = None) -> int:
+        """
+        Invalidate every notification whose expiration time has passed. Only notifications
+        that are due are visited, so this is cheap enough to call on every render.
+
+        Expired notifications at the old end of the buffer are evicted straight away.
+        Any others are evicted once they reach the end of the buffer.
+
+        Arguments:
+            now: Optional datetime to expire against. Defaults to now.
+
+        Returns:
+            The number of notifications that expired.
+        """
+        with self.lock:
+            now_timestamp_ns = now_ns() if now is None else to_ns(now)
+            expiry_heap = self._expiry_heap
+            expired_count = 0
+
+            while expiry_heap and expiry_heap[0][0] <= now_timestamp_ns:
+                _, _, notification = heapq.heappop(expiry_heap)
+
+                # Skip notifications already evicted or invalidated.
+                if notification.manager is self and notification.valid:
+                    notification.invalidate()
+                    expired_count += 1
+
+            notification_buffer = self.notification_buffer
+            while notification_buffer and not notification_buffer[-1].valid:
+                self._untrack(notification_buffer.pop())
+
+            return expired_count
 
     def cull_notifications(self) -> int:
         """
         Shorten the notification buffer to the maximum buffer limit. Returns the length
-        of the notification buffer after shortening.
+        of the notification buffer after shortening. The ring buffer enforces its limit
+        on every insert, so there is nothing left to remove.
         """
-        self.notification_buffer = self.notification_buffer[: self.buffer_max_size]
-
         return len(self.notification_buffer)
 
     def sort_notifications(self):
         """
-        Sort notifications by the property notification_time. Used to maintain
-        order by notification_time, but by nature sorting order should be assured
-        by the bisect insertion method.
+        Sort notifications by the property notification_time, most recent first. Only
+        needed if append_notification has been used, as add_notification keeps order.
         """
-        self.notification_buffer.sort(key=lambda notification: notification.notification_time)
+        with self.lock:
+            if self._in_recency_order:
+                return
+
+            self.notification_buffer = deque(
+                sorted(
+                    self.notification_buffer, key=lambda notification: notification.created_ns, reverse=True
+                ),
+                maxlen=self.buffer_max_size,
+            )
+            self._in_recency_order = True
+
+            # Re-enter every notification, oldest first, so the indexes share the new order.
+            self._valid.clear()
+            for every_index, valid_index in self._source_indexes.values():
+                every_index.clear()
+                valid_index.clear()
+            for notification in reversed(self.notification_buffer):
+                self._index(notification)
 
     def get_most_recent_notification(self, re_sort: bool = True) -> Notification:
         """
         Returns the most recent notification. Will perform the sorting operation to ensure correctness,
-        unless re_sort is set to False. This should only be done if you need speed, but
-        know for a fact a sorting operation has been called since the last update.
+        unless re_sort is set to False. Sorting only does any work if append_notification has been used.
 
         Arguments:
             re_sort: Boolean defaulting to True, triggering a sort of the notification buffer.
@@ -161,34 +402,79 @@ class NotificationManager:
 
         return self.notification_buffer[0]
 
-    def get_notifications(self, number_of_notifications: Optional[int] = None) -> list[Notification]:
+    def get_notifications(
+        self,
+        number_of_notifications: Optional[int] = None,
+        valid_only: bool = False,
+        source: Optional[NotificationSource] = None,
+        since: Optional[datetime] = None,
+    ) -> Iterable[Notification]:
         """
         Return notifications from the notification manager. If number_of_notifications is specified, that many
         notifications, ordered by recency, will be returned. If not, all notifications will be returned,
         ordered by recency.
 
+        Filters are served from the secondary indexes, so only matching notifications are
+        visited. Nothing is copied; iterate the result before adding more notifications.
+
         Arguments:
             number_of_notifications: An optional integer representing how many notifications
                 should be returned.
+            valid_only: Optional bool, whether to skip notifications that are no longer valid.
+            source: Optional NotificationSource to return notifications from only.
+            since: Optional datetime; only notifications created at or after it are returned.
 
         Returns:
-            A list of notifications, at most all notifications.`
+            An iterable of notifications, at most all notifications.
         """
-        return (
-            self.notification_buffer[:number_of_notifications]
-            if number_of_notifications
-            else self.notification_buffer
-        )
+        if source is not None or valid_only or since is not None:
+            # The indexes follow arrival order, which matches recency once sorted.
+            self.sort_notifications()
+
+        if source is None and not valid_only:
+            notifications = self.notification_buffer
+        else:
+            if source is None:
+                index = self._valid
+            else:
+                index = self._source_indexes[source][valid_only]
+            notifications = reversed(index)
+
+        if since is not None:
+            since_ns = to_ns(since)
+            notifications = (
+                notification for notification in notifications if notification.created_ns >= since_ns
+            )
+
+        return islice(notifications, number_of_notifications) if number_of_notifications else notifications
+
+    def get_notification_count(self, source: Optional[NotificationSource] = None, valid_only: bool = False) -> int:
+        """
+        Return the number of buffered notifications, optionally only valid ones or those from
+        one source. Constant time, from the indexes.
+        """
+        if source is None:
+            return len(self._valid) if valid_only else len(self.notification_buffer)
+
+        return len(self._source_indexes[source][valid_only])
 
     def update_buffer_size(self, new_buffer_size: int):
         """
         Override the current buffer maximum. Probably don't use this. Will not bring back any notifications
-        discarded by a buffer overrun.
+        discarded by a buffer overrun. Shrinking the buffer keeps the most recent notifications.
 
         Arguments:
             new_buffer_size: An integer representing the maximum number of notifications to store.
         """
-        self.buffer_max_size = new_buffer_size
+        with self.lock:
+            self.buffer_max_size = new_buffer_size
+
+            for departing_notification in islice(self.notification_buffer, new_buffer_size, None):
+                self._untrack(departing_notification)
+
+            self.notification_buffer = deque(
+                islice(self.notification_buffer, new_buffer_size), maxlen=new_buffer_size
+            )
 
     def get_total_notification_count(self) -> int:
         """
@@ -199,16 +485,30 @@ class NotificationManager:
 
     def get_valid_notification_count(self) -> int:
         """
-        Calculate and return the number of notifications tracked by the NotificationManager
-        currently reporting as 'valid'.
+        Return the number of notifications tracked by the NotificationManager currently
+        reporting as 'valid'. Maintained as notifications come, go and are invalidated.
         """
-        return [notification.valid for notification in self.notification_buffer]
+        return len(self._valid)
 
     def cleanup_buffer(self):
         """
-        Caretaking method to sort buffer and enforce size restrction. Will likely have
-        logic in the future for forwarding/saving oversize notifications hopefully!
+        Caretaking method to sort buffer and enforce size restrction. Oversize
+        notifications are saved to the spill log, if there is one, as they leave.
 
         """
         self.cull_notifications()
         self.sort_notifications()
+
+    def close(self):
+        """
+        Write every notification still buffered to the spill log, oldest first, and close
+        it. Does nothing without a spill log.
+        """
+        with self.lock:
+            if self.spill_log is None:
+                return
+
+            self.sort_notifications()
+            while self.notification_buffer:
+                self._untrack(self.notification_buffer.pop())
+            self.spill_log.close()
@@ -0,0 +1,355 @@
+import mmap
+import os
+import pickle
+import struct
+import threading
+from typing import Iterable, Optional
+
+from classes import POSITION_ID_WIDTH, Portfolio, Position, paused_gc
+from lots import LotPolicy
+
+
+# Log file layout: an 8 byte header, followed by fixed size transaction records. The
+# header also tags snapshots, so files from an older layout are refused, not misread.
+LOG_HEADER = b"CLIPLOG3"
+
+# Longest ticker name, in bytes, that a record can hold.
+MAX_TICKER_BYTES = 16
+
+# (operation, position id, share count, share price, epoch nanoseconds, ticker name,
+#  lot policy, specific lot id)
+TRANSACTION_RECORD = struct.Struct("<BQddq16sBQ")
+
+OPERATION_BUY = 1
+OPERATION_SELL = 2
+# Undo and redo records carry the id and ticker of the trade they cancel or restore.
+OPERATION_UNDO = 3
+OPERATION_REDO = 4
+
+# Lot policies by their code in the log, and back.
+LOT_POLICY_CODES = {policy: code for code, policy in enumerate(LotPolicy)}
+LOT_POLICIES = list(LotPolicy)
+
+
+class TransactionLog:
+    """Append-only binary log of every buy and sell made against a portfolio.
+
+    Each transaction is written as a fixed size record to a log file. Every
+    snapshot_interval transactions, the whole portfolio is pickled to a snapshot file,
+    along with the log offset it covers. Loading reads the latest snapshot and replays
+    only the records written after it, so start-up cost does not grow with history.
+
+    Attributes:
+        portfolio: The Portfolio being recorded, available after load().
+        log_path: Path of the transaction log file.
+        snapshot_path: Path of the portfolio snapshot file.
+        snapshot_interval: Number of transactions to record between snapshots, or None to
+            only snapshot on close(). Batch runs use None, as snapshot cost grows with the
+            portfolio.
+        auto_flush: Whether each record is flushed to disk as it is written. Batch runs
+            turn this off, and rely on snapshot() and close() to flush.
+        lock: Reentrant lock held while writing records or a snapshot, so threads
+            recording at once do not interleave.
+    """
+
+    def __init__(self, data_directory: str, portfolio_name: str, snapshot_interval: Optional[int] = 1000):
+        """
+        Prepare a transaction log for the given portfolio. Nothing is read until load().
+
+        Arguments:
+            data_directory: Directory holding log and snapshot files. Created if missing.
+            portfolio_name: Name of the portfolio, used to name its files.
+            snapshot_interval: Optional number of transactions between snapshots. None
+                disables periodic snapshots.
+        """
+        os.makedirs(data_directory, exist_ok=True)
+
+        file_stem = "".join(char if char.isalnum() else "_" for char in portfolio_name.lower())
+        self.portfolio_name = portfolio_name
+        self.log_path = os.path.join(data_directory, f"{file_stem}.log")
+        self.snapshot_path = os.path.join(data_directory, f"{file_stem}.snapshot")
+        self.snapshot_interval = snapshot_interval
+        self.auto_flush = True
+        self.lock = threading.RLock()
+
+        self.portfolio: Optional[Portfolio] = None
+        self.records_since_snapshot = 0
+        self._log_file = None
+
+    def load(self, columnar: bool = False, read_only: bool = False) -> Portfolio:
+        """
+        Restore the portfolio from the latest snapshot and the log written since, then
+        open the log for appending.
+
+        Arguments:
+            columnar: Optional bool, whether new tickers, including those the log replays
+                into a restored portfolio, should use columnar stores. Tickers restored from
+                the snapshot keep their store.
+            read_only: Optional bool, whether to leave the log closed. Nothing can then be
+                recorded, and close() writes no snapshot.
+
+        Returns:
+            The restored Portfolio, or a new empty one if nothing has been saved.
+        """
+        portfolio, offset = self._read_snapshot()
+        if portfolio is None:
+            portfolio = Portfolio(self.portfolio_name, columnar=columnar)
+        elif columnar:
+            portfolio.columnar = True
+
+        self.portfolio = portfolio
+        self.records_since_snapshot = self._replay(offset)
+        if not read_only:
+            self._open_log()
+
+        return portfolio
+
+    def _read_snapshot(self) -> tuple[Optional[Portfolio], int]:
+        if not os.path.exists(self.snapshot_path):
+            return None, len(LOG_HEADER)
+
+        with open(self.snapshot_path, "rb") as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+
+        if snapshot.get("format") != LOG_HEADER:
+            raise ValueError(f"Snapshot '{self.snapshot_path}' was written in an older format.")
+
+        return snapshot["portfolio"], snapshot["log_offset"]
+
+    def _replay(self, offset: int) -> int:
+        """
+        Apply every whole record after offset to the portfolio. A partially written
+        record at the end of the log, left by a crash, is ignored and later truncated.
+
+        Returns:
+            The number of records replayed.
+        """
+        if not os.path.exists(self.log_path):
+            return 0
+
+        log_size = os.path.getsize(self.log_path)
+        record_count = (log_size - offset) // TRANSACTION_RECORD.size
+        if record_count <= 0:
+            return 0
+
+        end = offset + record_count * TRANSACTION_RECORD.size
+
+        with open(self.log_path, "rb") as log_file:
+            if log_file.read(len(LOG_HEADER)) != LOG_HEADER:
+                raise ValueError(f"Transaction log '{self.log_path}' was written in an older format.")
+
+            with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_log:
+                with memoryview(mapped_log) as log_view, log_view[offset:end] as tail, paused_gc():
+                    cancelled_ids = self._cancelled_ids(tail)
+
+                    for record in TRANSACTION_RECORD.iter_unpack(tail):
+                        if record[0] <= OPERATION_SELL and record[1] not in cancelled_ids:
+                            self._apply(*record)
+
+        return record_count
+
+    @staticmethod
+    def _cancelled_ids(tail: memoryview) -> set[int]:
+        """
+        Ids of the trades in the log tail that were undone and not redone, so replay can
+        skip them. Undo records follow the trade they cancel, hence this separate pass;
+        it is skipped unless the tail holds undo or redo records at all.
+
+        Trades are snapshotted straight after an undo or redo, so the trades they name
+        are in the tail, unless a crash came between the record and the snapshot.
+        """
+        operations = bytes(tail[:: TRANSACTION_RECORD.size])
+        if OPERATION_UNDO not in operations and OPERATION_REDO not in operations:
+            return set()
+
+        cancelled_ids = set()
+        for record in TRANSACTION_RECORD.iter_unpack(tail):
+            if record[0] == OPERATION_UNDO:
+                cancelled_ids.add(record[1])
+            elif record[0] == OPERATION_REDO:
+                cancelled_ids.discard(record[1])
+
+        return cancelled_ids
+
+    def _apply(
+        self,
+        operation: int,
+        position_id: int,
+        share_count: float,
+        share_value: float,
+        timestamp_ns: int,
+        ticker: bytes,
+        policy_code: int,
+        lot_id: int,
+    ):
+        position = Position.from_record(
+            position_id=f"{position_id:0{POSITION_ID_WIDTH}X}",
+            share_count=share_count,
+            share_value=share_value,
+            is_sell=operation == OPERATION_SELL,
+            timestamp_ns=timestamp_ns,
+        )
+        ticker_name = ticker.rstrip(b"\0").decode()
+
+        if operation == OPERATION_BUY:
+            self.portfolio.buy_position(ticker_name=ticker_name, position=position)
+        else:
+            policy = LOT_POLICIES[policy_code]
+            self.portfolio.sell_position(
+                ticker_name=ticker_name,
+                position=position,
+                policy=policy,
+                lot_id=f"{lot_id:0{POSITION_ID_WIDTH}X}" if policy is LotPolicy.SPECIFIC else None,
+            )
+
+    def _open_log(self):
+        self._log_file = open(self.log_path, "ab")
+
+        if self._log_file.tell() == 0:
+            self._log_file.write(LOG_HEADER)
+        else:
+            # Drop any torn record, so new records stay aligned.
+            whole_records = (self._log_file.tell() - len(LOG_HEADER)) // TRANSACTION_RECORD.size
+            self._log_file.truncate(len(LOG_HEADER) + whole_records * TRANSACTION_RECORD.size)
+            self._log_file.seek(0, os.SEEK_END)
+
+        self._log_file.flush()
+
+    @staticmethod
+    def _pack(
+        operation: int,
+        ticker_name: str,
+        position: Position,
+        policy: LotPolicy = LotPolicy.FIFO,
+        lot_id: Optional[str] = None,
+    ) -> bytes:
+        encoded_ticker = ticker_name.upper().encode()
+        if len(encoded_ticker) > MAX_TICKER_BYTES:
+            raise ValueError(f"Ticker name '{ticker_name}' is too long to be logged.")
+
+        return TRANSACTION_RECORD.pack(
+            operation,
+            int(position.id, 16),
+            position.number_of_shares,
+            position.share_price,
+            position.timestamp_ns,
+            encoded_ticker,
+            LOT_POLICY_CODES[policy],
+            int(lot_id, 16) if lot_id else 0,
+        )
+
+    def _record(
+        self,
+        operation: int,
+        ticker_name: str,
+        position: Position,
+        policy: LotPolicy = LotPolicy.FIFO,
+        lot_id: Optional[str] = None,
+    ):
+        record = self._pack(operation, ticker_name, position, policy, lot_id)
+        with self.lock:
+            self._log_file.write(record)
+            if self.auto_flush:
+                self._log_file.flush()
+
+            self.records_since_snapshot += 1
+            if self.snapshot_interval and self.records_since_snapshot >= self.snapshot_interval:
+                self.snapshot()
+
+    def record_buy(self, ticker_name: str, position: Position):
+        """
+        Append a buy of position under ticker_name to the log.
+        """
+        self._record(OPERATION_BUY, ticker_name, position)
+
+    def record_sell(
+        self,
+        ticker_name: str,
+        position: Position,
+        policy: LotPolicy = LotPolicy.FIFO,
+        lot_id: Optional[str] = None,
+    ):
+        """
+        Append a sell of position under ticker_name to the log, with the lot selection it
+        was matched by.
+        """
+        self._record(OPERATION_SELL, ticker_name, position, policy, lot_id)
+
+    def record_trades(self, trades: Iterable[tuple[str, Position]]):
+        """
+        Append many buys and sells to the log in one write, as after a bulk import. Sells
+        are logged as matched FIFO. No periodic snapshot is taken part way through; the
+        caller should snapshot() once the import is done.
+
+        Arguments:
+            trades: (ticker name, Position) of each trade, in the order applied.
+        """
+        records = [
+            self._pack(OPERATION_SELL if position.is_sell else OPERATION_BUY, ticker_name, position)
+            for ticker_name, position in trades
+        ]
+        with self.lock:
+            self._log_file.write(b"".join(records))
+            if self.auto_flush:
+                self._log_file.flush()
+
+            self.records_since_snapshot += len(records)
+
+    def record_undo(self, ticker_name: str, position: Position):
+        """
+        Append an undo of the trade of position to the log, and snapshot, so the undone
+        trade is not replayed on the next load.
+        """
+        self._record(OPERATION_UNDO, ticker_name, position)
+        self.snapshot()
+
+    def record_redo(self, ticker_name: str, position: Position):
+        """
+        Append a redo of the trade of position to the log, and snapshot.
+        """
+        self._record(OPERATION_REDO, ticker_name, position)
+        self.snapshot()
+
+    def snapshot(self):
+        """
+        Write the whole portfolio to the snapshot file, noting how much of the log it
+        covers. The snapshot is written to a temporary file and moved into place, so a
+        crash part way through leaves the previous snapshot intact.
+
+        The portfolio is frozen while it is pickled, so trades on other threads wait.
+        """
+        temporary_path = f"{self.snapshot_path}.tmp"
+        with self.lock, self.portfolio.frozen():
+            self._log_file.flush()
+            snapshot = {
+                "format": LOG_HEADER,
+                "portfolio": self.portfolio,
+                "log_offset": self._log_file.tell(),
+            }
+
+            # Reducing each object allocates, which would set off the collector over and over.
+            with open(temporary_path, "wb") as snapshot_file, paused_gc():
+                pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(temporary_path, self.snapshot_path)
+
+            self.records_since_snapshot = 0
+
+    def close(self, snapshot: bool = True):
+        """
+        Snapshot the portfolio if anything has changed, and close the log.
+
+        Arguments:
+            snapshot: Optional bool, whether to snapshot. Without one, the next load()
+                replays the records since the last snapshot, which is cheaper for a
+                short run than snapshotting a large portfolio.
+        """
+        if self._log_file is None:
+            return
+
+        if snapshot and self.records_since_snapshot:
+            self.snapshot()
+
+        self._log_file.close()
+        self._log_file = None
@@ -0,0 +1,241 @@
+import os
+import socket
+import threading
+from datetime import timedelta
+from typing import Iterable, Iterator, Optional
+
+from classes import Portfolio
+from notifications import Notification, NotificationManager, NotificationSource
+
+
+# Quote line sources yield this when no more lines are available for now, so
+# downstream stages can act on what they have rather than wait.
+IDLE = None
+
+# (ticker name, price)
+Quote = tuple[str, float]
+
+
+def read_quote_file(
+    path: str,
+    follow: bool = False,
+    poll_interval: float = 0.25,
+    stop_event: Optional[threading.Event] = None,
+) -> Iterator[Optional[str]]:
+    """
+    Yield lines from a local quotes file. With follow set, keep reading new lines as they
+    are appended, like tail -f, yielding IDLE whenever the end of the file is reached.
+
+    Arguments:
+        path: Path of the quotes file.
+        follow: Optional bool, whether to wait for more lines at the end of the file.
+        poll_interval: Optional seconds to wait between checks for new lines.
+        stop_event: Optional threading.Event which, once set, stops a followed file at
+            its next idle point.
+    """
+    stop_event = stop_event or threading.Event()
+
+    with open(path) as quote_file:
+        while True:
+            lines = quote_file.readlines(1 << 16)
+            if lines:
+                yield from lines
+                continue
+
+            if not follow or stop_event.is_set():
+                return
+
+            yield IDLE
+            stop_event.wait(poll_interval)
+
+
+def read_quote_socket(
+    host: str,
+    port: int,
+    follow: bool = False,
+    timeout: float = 0.25,
+    stop_event: Optional[threading.Event] = None,
+) -> Iterator[Optional[str]]:
+    """
+    Yield lines from a TCP quote server. Without follow set, stop once no data arrives
+    within timeout seconds, having read every quote sent so far. With follow set, yield
+    IDLE then and keep reading.
+
+    Either way, stops when the server closes the connection, or at the next idle point
+    once stop_event is set.
+
+    Arguments:
+        host: Host name or address of the quote server.
+        port: Port of the quote server.
+        follow: Optional bool, whether to wait for more quotes once the server goes quiet.
+        timeout: Optional seconds without data after which the server counts as idle.
+        stop_event: Optional threading.Event which, once set, stops at the next idle
+            point.
+    """
+    stop_event = stop_event or threading.Event()
+
+    with socket.create_connection((host, port)) as connection:
+        connection.settimeout(timeout)
+        pending = b""
+
+        while not stop_event.is_set():
+            try:
+                data = connection.recv(1 << 16)
+            except socket.timeout:
+                if not follow:
+                    return
+                yield IDLE
+                continue
+
+            if not data:
+                return
+
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line.decode()
+
+
+def parse_quotes(lines: Iterable[Optional[str]]) -> Iterator[Optional[Quote]]:
+    """
+    Parse quote lines of the form 'TICKER PRICE' or 'TICKER,PRICE'. Malformed lines are
+    skipped, and IDLE is passed through.
+    """
+    for line in lines:
+        if line is IDLE:
+            yield IDLE
+            continue
+
+        fields = line.replace(",", " ").split()
+        if len(fields) < 2:
+            continue
+
+        try:
+            yield fields[0].upper(), float(fields[1])
+        except ValueError:
+            continue
+
+
+def batch_quotes(quotes: Iterable[Optional[Quote]], batch_size: int = 10_000) -> Iterator[dict[str, float]]:
+    """
+    Group quotes into batches of the latest price per ticker. A batch ends after
+    batch_size quotes, when the source goes idle, or when it runs out. Only the last
+    price of each ticker in a batch matters, so busy tickers are revalued once per batch
+    rather than once per tick.
+    """
+    latest_prices: dict[str, float] = {}
+    quote_count = 0
+
+    for quote in quotes:
+        if quote is not IDLE:
+            ticker_name, price = quote
+            latest_prices[ticker_name] = price
+            quote_count += 1
+
+            if quote_count < batch_size:
+                continue
+
+        if latest_prices:
+            yield latest_prices
+            latest_prices = {}
+        quote_count = 0
+
+    if latest_prices:
+        yield latest_prices
+
+
+class PriceFeed:
+    """Applies batches of market prices to a portfolio and reports the changes.
+
+    Only tickers with a new price are revalued, and portfolio totals are adjusted by the
+    change in those tickers, so the cost of a batch depends on how many tickers moved,
+    not on the size of the portfolio.
+
+    Attributes:
+        portfolio: The Portfolio to revalue.
+        notification_manager: Optional NotificationManager to report each batch to.
+        prices_applied: Number of prices applied so far, after batching.
+    """
+
+    # How long price notifications stay valid.
+    notification_lifetime = timedelta(seconds=30)
+
+    def __init__(self, portfolio: Portfolio, notification_manager: Optional[NotificationManager] = None):
+        self.portfolio = portfolio
+        self.notification_manager = notification_manager
+        self.prices_applied = 0
+
+    def apply(self, latest_prices: dict[str, float]) -> int:
+        """
+        Apply a batch of prices.
+
+        Arguments:
+            latest_prices: Dictionary of upper case ticker name to new price.
+
+        Returns:
+            The number of held tickers whose price changed.
+        """
+        portfolio = self.portfolio
+        last_prices = portfolio.last_prices
+        held_changes = []
+
+        for ticker_name, price in latest_prices.items():
+            previous_price = last_prices.get(ticker_name)
+            if price == previous_price:
+                continue
+
+            portfolio.update_price(ticker_name, price)
+            if ticker_name in portfolio.tickers:
+                held_changes.append((ticker_name, previous_price, price))
+
+        self.prices_applied += len(latest_prices)
+
+        if held_changes and self.notification_manager:
+            self.notification_manager.add_notification(self._summarise(held_changes))
+
+        return len(held_changes)
+
+    def _summarise(self, held_changes: list[tuple[str, Optional[float], float]]) -> Notification:
+        moves = ", ".join(
+            f"{ticker_name} {price:.2f}"
+            + (f" ({(price - previous_price) / previous_price:+.1%})" if previous_price else "")
+            for ticker_name, previous_price, price in held_changes[:3]
+        )
+        if len(held_changes) > 3:
+            moves += f" and {len(held_changes) - 3} more"
+        totals = self.portfolio.totals
+
+        return Notification(
+            title="PRICES UPDATED",
+            subtitle=f"value ${totals.market_value:.2f}, P&L ${totals.market_pnl:.2f}",
+            text=moves,
+            source=NotificationSource.FEED,
+            expiration_delta=self.notification_lifetime,
+        )
+
+    def run(self, lines: Iterable[Optional[str]], batch_size: int = 10_000) -> int:
+        """
+        Consume a source of quote lines until it is exhausted.
+
+        Returns:
+            The number of prices applied, after batching.
+        """
+        start_count = self.prices_applied
+        for latest_prices in batch_quotes(parse_quotes(lines), batch_size=batch_size):
+            self.apply(latest_prices)
+
+        return self.prices_applied - start_count
+
+
+def open_quote_source(
+    source: str, follow: bool = False, stop_event: Optional[threading.Event] = None
+) -> Iterator[Optional[str]]:
+    """
+    Open a quote source, given either as a file path or as host:port of a quote server.
+    Without follow set, the source ends once every quote available now has been read.
+    """
+    host, _, port = source.rpartition(":")
+    if host and port.isdigit() and not os.path.exists(source):
+        return read_quote_socket(host, int(port), follow=follow, stop_event=stop_event)
+
+    return read_quote_file(source, follow=follow, stop_event=stop_event)
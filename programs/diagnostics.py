@@ -0,0 +1,55 @@
+import os
+
+from classes import CommandArgs, Portfolio, SystemConfig
+from cli_utils import command_mapping, parse_command
+from instrumentation import profile_call
+
+
+def stats(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    stats expects arguments in the form:
+    [on | off | reset | profile COMMAND [ARGUMENTS...]]
+
+    with no arguments, prints the latency, counter and gauge readings so far. profile
+    runs one command under cProfile, prints the slowest calls and saves the full profile
+    to the data directory.
+    """
+    instrumentation = system_config.stats
+
+    if not command_arguments:
+        if instrumentation.is_empty():
+            print("No readings yet." + ("" if instrumentation.enabled else " Turn instrumentation on with 'stats on'."))
+        else:
+            print(instrumentation.report())
+        return True
+
+    action = command_arguments[0].lower()
+
+    if action in ("on", "off"):
+        instrumentation.enabled = action == "on"
+        print(f"Instrumentation {action}.")
+        return True
+
+    if action == "reset":
+        instrumentation.reset()
+        print("Instrumentation readings cleared.")
+        return True
+
+    if action == "profile" and len(command_arguments) > 1:
+        profiled_command = command_arguments[1:]
+        command = parse_command(profiled_command, command_assist=False)
+        if command is None:
+            return False
+
+        os.makedirs(system_config.data_directory, exist_ok=True)
+        output_path = os.path.join(system_config.data_directory, f"profile_{command.value}.prof")
+        result, summary = profile_call(
+            command_mapping[command], system_config, portfolio, profiled_command[1:], output_path=output_path
+        )
+
+        print(summary)
+        print(f"Full profile saved to {output_path}")
+        return result
+
+    print("stats expects no arguments, or one of: on, off, reset, profile COMMAND [ARGUMENTS...]")
+    return False
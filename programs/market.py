@@ -0,0 +1,54 @@
+from classes import CommandArgs, Portfolio, SystemConfig
+from pricefeed import PriceFeed, open_quote_source
+
+
+def price(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    price expects arguments in the form:
+    ticker, current price per share
+    """
+    if len(command_arguments) != 2:
+        return False
+
+    ticker, market_price = command_arguments
+
+    try:
+        PriceFeed(portfolio, system_config.notification_manager).apply({ticker.upper(): float(market_price)})
+    except ValueError:
+        if system_config.interactive:
+            print("price cli arg type wrong")
+        return False
+
+    if system_config.interactive:
+        totals = portfolio.totals
+        print(f"Portfolio value ${totals.market_value:.2f}, unrealized P&L ${totals.market_pnl:.2f}")
+
+    return True
+
+
+def feed(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    feed expects arguments in the form:
+    quotes file path, or host:port of a quote server
+
+    reads every quote currently available and applies them to the portfolio.
+    """
+    if len(command_arguments) != 1:
+        return False
+
+    try:
+        price_feed = PriceFeed(portfolio, system_config.notification_manager)
+        prices_applied = price_feed.run(open_quote_source(command_arguments[0]))
+    except OSError as e:
+        if system_config.interactive:
+            print(f"could not read quotes - {e}")
+        return False
+
+    if system_config.interactive:
+        totals = portfolio.totals
+        print(
+            f"Applied {prices_applied} prices. Portfolio value ${totals.market_value:.2f},"
+            f" unrealized P&L ${totals.market_pnl:.2f}"
+        )
+
+    return True
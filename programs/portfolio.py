@@ -1,6 +1,56 @@
-from classes import CommandArgs, Portfolio, Position, SystemConfig
+from classes import CommandArgs, Portfolio, Position, SystemConfig, Ticker
+from cli_utils import prompt_user_bool
+from lots import LotPolicy
+from persistence import MAX_TICKER_BYTES
+from typing import Optional
 
-def buy(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+# Minimum similarity for a held ticker to be offered as a correction.
+TICKER_SUGGESTION_THRESHOLD = 0.5
+
+
+def resolve_ticker(system_config: SystemConfig, portfolio: Portfolio, ticker: str) -> Optional[str]:
+    """
+    Work out which held ticker the user meant. A held ticker is returned as is. Otherwise,
+    when interactive, the closest held ticker is offered as a correction.
+
+    Returns:
+        The held ticker name to use, or None if ticker is not held and no correction
+        was accepted.
+    """
+    if portfolio.get_ticker(ticker):
+        return ticker
+
+    if not system_config.interactive:
+        return None
+
+    closest_matches = portfolio.ticker_index.closest(ticker)
+    if closest_matches and closest_matches[0][1] >= TICKER_SUGGESTION_THRESHOLD:
+        suggested_ticker = closest_matches[0][0]
+        if prompt_user_bool(f"Did you mean '{suggested_ticker}'?"):
+            return suggested_ticker
+
+    return None
+
+
+def trade_summary(ticker: Ticker, position: Position) -> str:
+    """
+    One line describing a trade just made and where it leaves the ticker. Constant time,
+    from the running totals, however many positions the ticker holds.
+    """
+    shares_at_price = f"{position.number_of_shares} {ticker.name} @ ${position.share_price:.2f}"
+    if position.is_sell:
+        realized = position.value - ticker.sold_cost(position.id)
+        trade = f"Sold {shares_at_price}, realized ${realized:.2f}."
+    else:
+        trade = f"Bought {shares_at_price}."
+
+    return (
+        f"{trade} Now {ticker.total_shares} shares, cost basis ${ticker.total_value:.2f}"
+        f" (avg ${ticker.avg_price:.2f})."
+    )
+
+
+def buy(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
     """
     note to self
     buy expects arguments in the form:
@@ -16,6 +66,15 @@ def buy(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
     
     ticker, share_count, share_cost = command_arguments
 
+    # Checked before trading, as a trade the log cannot record would be lost on restart.
+    if len(ticker.encode()) > MAX_TICKER_BYTES:
+        if system_config.interactive:
+            print(f"ticker '{ticker}' is longer than {MAX_TICKER_BYTES} bytes")
+        return False
+
+    # A ticker not yet held is a new ticker, unless it looks like a typo of a held one.
+    ticker = resolve_ticker(system_config, portfolio, ticker) or ticker
+
     # Check argument types are as expected.
     try:
         # Generate position.
@@ -25,37 +84,56 @@ def buy(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
         )
 
     except ValueError:
-        print("buy cli arg type wrong")
+        if system_config.interactive:
+            print("buy cli arg type wrong")
         return False
     
     # Add position to portfolio
-    portfolio.buy_position(
+    portfolio.history.buy(
         ticker_name=ticker,
         position=new_position
     )
 
-    print(portfolio)
-    print(portfolio.tickers.values())
-    for it in portfolio.get_ticker(ticker).positions.values():
-        print(it)
-        print(repr(it))
+    if system_config.transaction_log:
+        system_config.transaction_log.record_buy(ticker, new_position)
+
+    if system_config.interactive:
+        print(trade_summary(portfolio.get_ticker(ticker), new_position))
+
+    return True
 
 
-def sell(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+def sell(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
     """
     note to self
     sell expects arguments in the form:
-    ticker, number of shares, current price
-    
+    ticker, number of shares, current price, [fifo | lifo | hifo | lot id]
+
+    the optional last argument picks which lots are sold, defaulting to fifo.
     """
 
     # error handling will be spruced up later
-    print(list(portfolio.tickers.values())[0])
     # Not enough / too many args
-    if len(command_arguments) != 3:
+    if len(command_arguments) not in (3, 4):
         return False  
     
-    ticker, share_count, share_cost = command_arguments
+    ticker, share_count, share_cost = command_arguments[:3]
+
+    # Lot selection - either a policy name, or the id of a specific lot.
+    policy, lot_id = LotPolicy.FIFO, None
+    if len(command_arguments) == 4:
+        try:
+            policy = LotPolicy(command_arguments[3].lower())
+        except ValueError:
+            policy, lot_id = LotPolicy.SPECIFIC, command_arguments[3].upper()
+
+    # Can only sell a held ticker.
+    held_ticker = resolve_ticker(system_config, portfolio, ticker)
+    if not held_ticker:
+        if system_config.interactive:
+            print(f"no position held in '{ticker}'")
+        return False
+    ticker = held_ticker
 
     # Check argument types are as expected.
     try:
@@ -67,19 +145,124 @@ def sell(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
         )
 
     except ValueError:
-        print("buy cli arg type wrong")
+        if system_config.interactive:
+            print("buy cli arg type wrong")
         return False
     
     # Add position to portfolio
-    portfolio.sell_position(
+    sold = portfolio.history.sell(
         ticker_name=ticker,
-        position=new_position
+        position=new_position,
+        policy=policy,
+        lot_id=lot_id
     )
 
-    print(portfolio)
-    print(portfolio.tickers.values())
-    for it in portfolio.get_ticker(ticker).positions.values():
-        print(it)
-        print(repr(it))
-    print(list(portfolio.tickers.values())[0])
+    if not sold:
+        if system_config.interactive:
+            print(f"not enough shares held in '{ticker}' to sell {share_count}")
+        return False
+
+    if system_config.transaction_log:
+        system_config.transaction_log.record_sell(ticker, new_position, policy, lot_id)
+
+    if system_config.interactive:
+        print(trade_summary(portfolio.get_ticker(ticker), new_position))
+
+    return True
+
+
+
+def undo(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    undo expects no arguments.
+
+    reverses the most recent buy or sell made this session, restoring the ticker exactly
+    as it was before it.
+    """
+    if command_arguments:
+        return False
+
+    event = portfolio.history.undo()
+    if event is None:
+        if system_config.interactive:
+            print("Nothing to undo.")
+        return False
+
+    if system_config.transaction_log:
+        system_config.transaction_log.record_undo(event.ticker_name, event.position)
+
+    if system_config.interactive:
+        print(f"Undone: {event}")
+
+    return True
+
+
+def redo(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    redo expects no arguments.
+
+    reapplies the most recently undone buy or sell, until a new trade is made.
+    """
+    if command_arguments:
+        return False
+
+    event = portfolio.history.redo()
+    if event is None:
+        if system_config.interactive:
+            print("Nothing to redo.")
+        return False
+
+    if system_config.transaction_log:
+        system_config.transaction_log.record_redo(event.ticker_name, event.position)
+
+    if system_config.interactive:
+        print(f"Redone: {event}")
+
+    return True
+
+
+def import_trades(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    import expects arguments in the form:
+    path to a brokerage trade history csv, [rows per chunk]
+
+    bulk loads every trade in the file, oldest first. sells are matched fifo. clears undo.
+    """
+    if len(command_arguments) not in (1, 2):
+        return False
+
+    # Imported here, so one-shot buys and sells do not load the CSV reader.
+    from trade_import import DEFAULT_CHUNK_SIZE, import_trades as import_trade_file
+
+    chunk_size = DEFAULT_CHUNK_SIZE
+    if len(command_arguments) == 2:
+        try:
+            chunk_size = int(command_arguments[1])
+        except ValueError:
+            chunk_size = 0
+        if chunk_size <= 0:
+            if system_config.interactive:
+                print("import chunk size must be a positive whole number")
+            return False
+
+    try:
+        summary = import_trade_file(
+            portfolio, command_arguments[0], chunk_size, transaction_log=system_config.transaction_log
+        )
+    except (OSError, ValueError) as error:
+        if system_config.interactive:
+            print(f"could not import '{command_arguments[0]}': {error}")
+        return False
+
+    if system_config.transaction_log:
+        # One snapshot, so the next start-up does not replay the whole import.
+        system_config.transaction_log.snapshot()
+
+    if system_config.interactive:
+        print(summary)
+        for line_number, reason in summary.rejections:
+            print(f" - line {line_number}: {reason}")
+        if summary.rejected > len(summary.rejections):
+            print(f" - and {summary.rejected - len(summary.rejections)} more")
 
+    return True
@@ -0,0 +1,268 @@
+import datetime
+import os
+from itertools import islice
+from typing import Optional
+
+from classes import CommandArgs, Portfolio, SystemConfig
+from clock import from_ns, to_timestamp
+from valuation import END_OF_DAY, PRICE_HISTORY_DIRECTORY, load_price_histories, value_portfolio
+
+# Positions shown per page by the positions command.
+POSITIONS_PAGE_SIZE = 20
+
+
+def parse_query_time(text: str, end_of_day: bool = False) -> Optional[datetime.datetime]:
+    """
+    Parse an ISO format date or date and time. A bare date means the start of that day,
+    or the very end of it if end_of_day is set.
+
+    Returns:
+        The parsed datetime, or None if text is not a date.
+    """
+    try:
+        moment = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+    if end_of_day and len(text) == len("YYYY-MM-DD"):
+        moment += datetime.timedelta(days=1, microseconds=-1)
+
+    return moment
+
+
+def holdings(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    holdings expects arguments in the form:
+    [ticker] [date]
+
+    prints shares held and their cost basis at the end of date (default now), for one
+    ticker or for every ticker.
+    """
+    ticker_name = None
+    moment = datetime.datetime.now()
+
+    for argument in command_arguments:
+        parsed_time = parse_query_time(argument, end_of_day=True)
+        if parsed_time:
+            moment = parsed_time
+        else:
+            ticker_name = argument
+
+    if ticker_name:
+        ticker = portfolio.get_ticker(ticker_name)
+        if not ticker:
+            print(f"no position held in '{ticker_name}'")
+            return False
+        holdings_then = {ticker.name: ticker.holdings_at(moment)}
+    else:
+        holdings_then = portfolio.holdings_at(moment)
+
+    print(f"Holdings at {moment}:")
+    for name, (shares, cost_basis) in holdings_then.items():
+        print(f" - {name}: {shares} shares, cost basis ${cost_basis:.2f}")
+
+    return True
+
+
+def trades(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    trades expects arguments in the form:
+    [ticker] from_date to_date
+
+    prints every position made between the two dates, inclusive, oldest first.
+    """
+    if len(command_arguments) not in (2, 3):
+        return False
+
+    start = parse_query_time(command_arguments[-2])
+    end = parse_query_time(command_arguments[-1], end_of_day=True)
+    if not start or not end:
+        print("trades dates should be in the form YYYY-MM-DD")
+        return False
+
+    timeline = portfolio.timeline
+    if len(command_arguments) == 3:
+        ticker = portfolio.get_ticker(command_arguments[0])
+        if not ticker:
+            print(f"no position held in '{command_arguments[0]}'")
+            return False
+        timeline = ticker.timeline
+
+    trade_count = 0
+    for _, ticker_name, position_id in timeline.between(to_timestamp(start), to_timestamp(end)):
+        print(f"{ticker_name}: {repr(portfolio.get_ticker(ticker_name).get_position(position_id))}")
+        trade_count += 1
+
+    print(f"{trade_count} trades between {start} and {end}.")
+
+    return True
+
+
+def valuation(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    valuation expects arguments in the form:
+    [ticker] [from_date [to_date]]
+
+    prints the market value, cost basis, unrealized P&L and return at each close between
+    the two dates (default all), for one ticker or the whole portfolio. Closes are read
+    from <TICKER>.csv files in the prices directory under the data directory.
+    """
+    dates = [parse_query_time(argument) for argument in command_arguments]
+    ticker_name = None
+    if command_arguments and dates[0] is None:
+        ticker_name = command_arguments[0].upper()
+        dates = dates[1:]
+
+    if len(dates) > 2 or None in dates:
+        print("valuation expects [ticker] [from_date [to_date]], with dates in the form YYYY-MM-DD")
+        return False
+
+    if ticker_name and not portfolio.get_ticker(ticker_name):
+        print(f"no position held in '{ticker_name}'")
+        return False
+
+    start = to_timestamp(dates[0]) if dates else None
+    end = to_timestamp(parse_query_time(command_arguments[-1], end_of_day=True)) if len(dates) == 2 else None
+
+    price_directory = os.path.join(system_config.data_directory, PRICE_HISTORY_DIRECTORY)
+    histories = load_price_histories(price_directory, [ticker_name] if ticker_name else portfolio.tickers)
+    portfolio_series, ticker_series = value_portfolio(portfolio, histories, start=start, end=end)
+    series = ticker_series[ticker_name] if ticker_name else portfolio_series
+
+    if not len(series):
+        print(f"No price history in {price_directory} for the dates asked.")
+        return False
+
+    print(f"{'Date':<16} {'Value':>14} {'Cost basis':>14} {'P&L':>14} {'Return':>8}")
+    for timestamp, market_value, cost_basis, pnl, unrealized_return in series.rows():
+        moment = datetime.datetime.fromtimestamp(timestamp)
+        label = moment.date().isoformat() if moment.time() == END_OF_DAY else moment.isoformat(" ", "minutes")
+        print(f"{label:<16} {market_value:>14.2f} {cost_basis:>14.2f} {pnl:>14.2f} {unrealized_return:>8.2%}")
+
+    return True
+
+
+def positions(_: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    positions expects arguments in the form:
+    ticker [page]
+
+    prints a ticker's positions, bought and sold, in the order made, a page at a time.
+    """
+    if len(command_arguments) not in (1, 2):
+        return False
+
+    ticker = portfolio.get_ticker(command_arguments[0])
+    if not ticker:
+        print(f"no position held in '{command_arguments[0]}'")
+        return False
+
+    try:
+        page_number = int(command_arguments[1]) if len(command_arguments) == 2 else 1
+    except ValueError:
+        page_number = 0
+    page_count = max(-(-len(ticker.positions) // POSITIONS_PAGE_SIZE), 1)
+    if not 1 <= page_number <= page_count:
+        print(f"positions page should be from 1 to {page_count}")
+        return False
+
+    # Only the page's rows are made, whatever the ticker holds.
+    skip = (page_number - 1) * POSITIONS_PAGE_SIZE
+    for position_id, share_count, share_price, is_sell, timestamp_ns in islice(
+        ticker.positions.records(), skip, skip + POSITIONS_PAGE_SIZE
+    ):
+        print(
+            f"{from_ns(timestamp_ns):%Y-%m-%d %H:%M:%S} {position_id} {'sell' if is_sell else 'buy ':<4}"
+            f" {share_count} x ${share_price:.2f} = ${share_count * share_price:.2f}"
+        )
+
+    print(f"Page {page_number} of {page_count}.")
+
+    return True
+
+
+def export(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    export expects arguments in the form:
+    portfolio | tickers | positions, csv | jsonl | binary, path, [ticker...]
+
+    writes a report of the portfolio to path, streaming it so memory stays bounded.
+    positions can be limited to some tickers.
+    """
+    if len(command_arguments) < 3:
+        return False
+
+    # Imported here, so other queries do not load the export writers.
+    from export import export_portfolio
+
+    report_name, export_format, path = command_arguments[:3]
+    report_name, export_format = report_name.lower(), export_format.lower()
+    options = {}
+    if len(command_arguments) > 3:
+        if report_name != "positions":
+            print("only positions exports can be limited to some tickers")
+            return False
+        options["ticker_names"] = command_arguments[3:]
+
+    try:
+        row_count = export_portfolio(portfolio, report_name, export_format, path, **options)
+    except (OSError, ValueError) as error:
+        if system_config.interactive:
+            print(f"could not export: {error}")
+        return False
+
+    if system_config.interactive:
+        print(f"Exported {row_count} rows of {report_name} to {path}.")
+
+    return True
+
+
+def risk(system_config: SystemConfig, portfolio: Portfolio, command_arguments: CommandArgs):
+    """
+    risk expects arguments in the form:
+    [ticker...]
+
+    prints the weight, annualised return and volatility, and maximum drawdown of every
+    ticker held, largest first, and the portfolio's volatility, from the closes in the
+    prices directory under the data directory. With tickers named, prints only those,
+    and the correlations between them.
+    """
+    # Imported here, so other queries do not load the risk engine.
+    from risk import RiskEngine
+
+    price_directory = os.path.join(system_config.data_directory, PRICE_HISTORY_DIRECTORY)
+    if system_config.risk_engine is None or system_config.risk_engine.directory != price_directory:
+        system_config.risk_engine = RiskEngine(price_directory)
+
+    report = system_config.risk_engine.report(portfolio)
+    ticker_names = [ticker_name.upper() for ticker_name in command_arguments] or report.ticker_names
+    missing = [ticker_name for ticker_name in ticker_names if ticker_name not in report.tickers]
+    if missing:
+        print(f"no position held in '{', '.join(missing)}'")
+        return False
+
+    if not report.close_count:
+        print(f"No price history in {price_directory}; risk is measured from closing prices.")
+        return False
+
+    weights = dict(zip(report.ticker_names, report.weights))
+    print(f"{'Ticker':<8} {'Weight':>8} {'Return':>8} {'Volatility':>10} {'Drawdown':>9}")
+    for ticker_name in ticker_names:
+        ticker_risk = report.tickers[ticker_name]
+        print(
+            f"{ticker_name:<8} {weights[ticker_name]:>8.2%} {ticker_risk.annual_return:>8.2%}"
+            f" {ticker_risk.volatility:>10.2%} {ticker_risk.max_drawdown:>9.2%}"
+        )
+
+    if command_arguments:
+        print("Correlations:")
+        print(" " * 8 + "".join(f" {ticker_name:>8}" for ticker_name in ticker_names))
+        for ticker_name, correlations in zip(ticker_names, report.correlation_matrix(ticker_names)):
+            print(f"{ticker_name:<8}" + "".join(f" {correlation:>8.2f}" for correlation in correlations))
+
+    print(
+        f"Portfolio value ${report.market_value:.2f}, volatility {report.volatility:.2%} a year,"
+        f" over the last {report.close_count} closes."
+    )
+
+    return True
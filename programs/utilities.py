@@ -1,5 +1,71 @@
 from classes import SystemConfig, Portfolio, CommandArgs
+from clock import to_ns
+from notifications import NotificationSource
+from programs.queries import parse_query_time
+
+# Notifications shown per page by the history command.
+HISTORY_PAGE_SIZE = 20
+
+
 def quit_clip(system_config: SystemConfig, _: Portfolio, __: CommandArgs):
     system_config.main_loop_continue = False
     return system_config
-    
\ No newline at end of file
+
+
+def history(system_config: SystemConfig, _: Portfolio, command_arguments: CommandArgs):
+    """
+    history expects arguments in the form:
+    [page N] [source SOURCE] [since DATE] [until DATE] [TEXT...]
+
+    prints notifications that have left the notification column, newest first, a page at
+    a time. TEXT finds notifications containing it in their title, subtitle or text.
+    """
+    notification_manager = system_config.notification_manager
+    spill_log = notification_manager.spill_log if notification_manager else None
+    if spill_log is None:
+        print("Notification history is not being kept.")
+        return False
+
+    page_number, filters, words = 1, {}, []
+    arguments = iter(command_arguments)
+    try:
+        for argument in arguments:
+            keyword = argument.lower()
+            if keyword == "page":
+                page_number = max(int(next(arguments)), 1)
+            elif keyword == "source":
+                filters["source"] = NotificationSource(next(arguments).lower())
+            elif keyword in ("since", "until"):
+                moment = parse_query_time(next(arguments), end_of_day=keyword == "until")
+                if moment is None:
+                    raise ValueError(keyword)
+                filters[f"{keyword}_ns"] = to_ns(moment)
+            else:
+                words.append(argument)
+    except (StopIteration, ValueError):
+        print("history expects [page N] [source SOURCE] [since DATE] [until DATE] [TEXT...]")
+        return False
+
+    if words:
+        filters["text"] = " ".join(words)
+
+    # Held while reading, as notifications may be spilled from another thread meanwhile.
+    with notification_manager.lock:
+        notifications = spill_log.page(page_number, HISTORY_PAGE_SIZE, **filters)
+        spilled_count = len(spill_log)
+    for notification in notifications:
+        subtitle = f" ({notification.subtitle})" if notification.subtitle else ""
+        print(
+            f"{notification.notification_time:%Y-%m-%d %H:%M:%S} [{notification.source.value}]"
+            f" {notification.title}{subtitle} - {notification.text}"
+        )
+
+    if not notifications:
+        print("No notifications found.")
+    elif filters:
+        print(f"Page {page_number}.")
+    else:
+        page_count = -(-spilled_count // HISTORY_PAGE_SIZE)
+        print(f"Page {page_number} of {page_count}.")
+
+    return True
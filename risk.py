@@ -0,0 +1,262 @@
+import os
+from array import array
+from itertools import accumulate
+from math import fsum, sqrt
+from operator import mul, truediv
+from typing import Iterable, Optional
+
+from classes import Portfolio
+from lots import SHARE_EPSILON
+from valuation import PriceHistory, closes_at, read_price_history
+
+
+# Closes in a year, for annualising returns and volatility.
+TRADING_DAYS = 252
+
+# Returns used by default: the most recent year of closes.
+DEFAULT_WINDOW = 252
+
+# (modification time in nanoseconds, size) of a price history file, to tell when it changes.
+FileSignature = tuple[int, int]
+
+
+class TickerRisk:
+    """Return statistics of one ticker over the closes of a RiskEngine's calendar.
+
+    Attributes:
+        returns: Return from each close of the calendar to the next, as a fraction. Zero
+            before the ticker's first close.
+        deviations: Each return less mean_return, for covariances.
+        mean_return: Mean return per close.
+        variance: Sample variance of the returns.
+        volatility: Standard deviation of the returns, annualised.
+        max_drawdown: Largest fall from a peak close to a later close, as a negative
+            fraction, over the calendar.
+    """
+
+    __slots__ = ("returns", "deviations", "mean_return", "variance", "volatility", "max_drawdown")
+
+    def __init__(self, prices: array):
+        priced = [price for price in prices if price]
+        self.returns = array(
+            "d", (price / previous - 1.0 if previous else 0.0 for previous, price in zip(prices, prices[1:]))
+        )
+        count = len(self.returns)
+
+        self.mean_return = fsum(self.returns) / count if count else 0.0
+        mean_return = self.mean_return
+        self.deviations = array("d", (each_return - mean_return for each_return in self.returns))
+        self.variance = fsum(map(mul, self.deviations, self.deviations)) / (count - 1) if count > 1 else 0.0
+        self.volatility = sqrt(self.variance * TRADING_DAYS)
+        self.max_drawdown = min(map(truediv, priced, accumulate(priced, max)), default=1.0) - 1.0
+
+    @property
+    def annual_return(self) -> float:
+        return self.mean_return * TRADING_DAYS
+
+
+class RiskReport:
+    """Risk of a portfolio's holdings at one moment.
+
+    Attributes:
+        ticker_names: Upper case name of each ticker held, largest first.
+        market_values: Dollar value of each ticker held, at its last price, or at cost if
+            never priced.
+        weights: Each ticker's fraction of the total value.
+        tickers: TickerRisk of each ticker held, by name.
+        volatility: Annualised volatility of the portfolio's return, from the weights and
+            the covariances of the tickers' returns.
+        close_count: Number of closes the returns span.
+    """
+
+    __slots__ = (
+        "ticker_names",
+        "market_values",
+        "weights",
+        "tickers",
+        "volatility",
+        "close_count",
+        "_engine",
+    )
+
+    def __init__(
+        self,
+        engine: "RiskEngine",
+        ticker_names: list[str],
+        market_values: list[float],
+        tickers: dict[str, TickerRisk],
+    ):
+        self._engine = engine
+        self.ticker_names = ticker_names
+        self.market_values = market_values
+        self.tickers = tickers
+        self.close_count = len(engine.calendar)
+
+        total_value = fsum(market_values)
+        self.weights = [market_value / total_value if total_value else 0.0 for market_value in market_values]
+
+        # w' C w, a row of the covariance matrix at a time.
+        variance = 0.0
+        for ticker_name, weight in zip(ticker_names, self.weights):
+            covariances = map(engine.covariance_row(ticker_name).__getitem__, ticker_names)
+            variance += weight * fsum(map(mul, self.weights, covariances))
+        self.volatility = sqrt(max(variance, 0.0) * TRADING_DAYS)
+
+    @property
+    def market_value(self) -> float:
+        return fsum(self.market_values)
+
+    def covariance(self, first_name: str, second_name: str) -> float:
+        """
+        Sample covariance of two tickers' returns per close.
+        """
+        return self._engine.covariance_row(first_name)[second_name]
+
+    def correlation(self, first_name: str, second_name: str) -> float:
+        """
+        Correlation of two tickers' returns, or 0.0 if either never moved.
+        """
+        first_variance = self.tickers[first_name].variance
+        second_variance = self.tickers[second_name].variance
+        if not first_variance or not second_variance:
+            return 0.0
+
+        return self.covariance(first_name, second_name) / sqrt(first_variance * second_variance)
+
+    def correlation_matrix(self, ticker_names: Optional[Iterable[str]] = None) -> list[list[float]]:
+        """
+        Correlations between every pair of the named tickers, or of every ticker held, as
+        rows in the order named.
+        """
+        ticker_names = self.ticker_names if ticker_names is None else list(ticker_names)
+
+        return [[self.correlation(first, second) for second in ticker_names] for first in ticker_names]
+
+
+class RiskEngine:
+    """Risk figures of a portfolio, from the price history files of its tickers.
+
+    Returns are taken on a calendar shared by every ticker: the latest window + 1 closes
+    across all of the portfolio's price histories, with each ticker's price carried
+    forward to closes it lacks. Each ticker's TickerRisk, and each covariance between two
+    tickers, is cached until that ticker's price history file changes, or the calendar
+    does. Holdings and weights are read afresh from each ticker's published totals on
+    every report, so buys, sells and price updates only cost a pass over the tickers
+    held, and the covariances of tickers whose history has not changed are reused.
+
+    A report on n tickers costs O(n) file checks and O(n^2) multiplications to combine
+    the covariances, plus O(window) for each ticker, and each covariance, recalculated.
+
+    Attributes:
+        directory: Directory of <TICKER>.csv price history files.
+        window: Number of returns used.
+        calendar: POSIX timestamps of the closes the returns span, ascending.
+    """
+
+    def __init__(self, directory: str, window: int = DEFAULT_WINDOW):
+        self.directory = directory
+        self.window = window
+        self.calendar = array("d")
+
+        self._histories: dict[str, tuple[FileSignature, PriceHistory]] = {}
+        self._tickers: dict[str, TickerRisk] = {}
+        # Covariance of every pair of tickers worked out so far, both ways round.
+        self._covariances: dict[str, dict[str, float]] = {}
+
+    def invalidate(self, ticker_name: str):
+        """
+        Forget the cached figures of a ticker, and its covariances with every other.
+        """
+        self._tickers.pop(ticker_name, None)
+        for other_name in self._covariances.pop(ticker_name, {}):
+            self._covariances.get(other_name, {}).pop(ticker_name, None)
+
+    def _refresh_histories(self, ticker_names: Iterable[str]):
+        """
+        Read the price history files that are new or changed since last read, and drop
+        those that are gone, invalidating their tickers.
+        """
+        for ticker_name in ticker_names:
+            path = os.path.join(self.directory, f"{ticker_name}.csv")
+            try:
+                status = os.stat(path)
+            except OSError:
+                if self._histories.pop(ticker_name, None):
+                    self.invalidate(ticker_name)
+                continue
+
+            signature = (status.st_mtime_ns, status.st_size)
+            cached = self._histories.get(ticker_name)
+            if cached is None or cached[0] != signature:
+                self._histories[ticker_name] = (signature, read_price_history(path))
+                self.invalidate(ticker_name)
+
+    def _refresh_calendar(self):
+        closes = set()
+        for _, (timestamps, _) in self._histories.values():
+            closes.update(timestamps[-(self.window + 1) :])
+        calendar = array("d", sorted(closes)[-(self.window + 1) :])
+
+        if calendar != self.calendar:
+            # Every ticker's returns are over the calendar, so all are out of date.
+            self.calendar = calendar
+            self._tickers.clear()
+            self._covariances.clear()
+
+    def ticker_risk(self, ticker_name: str) -> TickerRisk:
+        """
+        TickerRisk of a ticker over the calendar, from the cache if still valid. A ticker
+        without a price history never moves.
+        """
+        ticker_risk = self._tickers.get(ticker_name)
+        if ticker_risk is None:
+            history = self._histories.get(ticker_name)
+            if history is None:
+                prices = array("d", [0.0]) * len(self.calendar)
+            else:
+                prices = array("d", closes_at(history[1], self.calendar))
+            ticker_risk = self._tickers[ticker_name] = TickerRisk(prices)
+
+        return ticker_risk
+
+    def covariance_row(self, ticker_name: str) -> dict[str, float]:
+        """
+        Covariances of a ticker with every ticker whose TickerRisk is cached, working out
+        any missing. Both tickers' figures are cached, so a ticker's row is only filled in
+        after ticker_risk().
+        """
+        row = self._covariances.setdefault(ticker_name, {})
+        if len(row) < len(self._tickers):
+            deviations = self.ticker_risk(ticker_name).deviations
+            divisor = max(len(deviations) - 1, 1)
+            for other_name, other_risk in self._tickers.items():
+                if other_name not in row:
+                    # sum rather than fsum, which is several times slower; the deviations
+                    # are small and centred, so little precision is lost.
+                    covariance = sum(map(mul, deviations, other_risk.deviations)) / divisor
+                    row[other_name] = covariance
+                    self._covariances.setdefault(other_name, {})[ticker_name] = covariance
+
+        return row
+
+    def report(self, portfolio: Portfolio) -> RiskReport:
+        """
+        Risk of the portfolio's current holdings. Tickers are read through their published
+        totals, so the portfolio may be traded on other threads meanwhile.
+        """
+        tickers = list(portfolio.tickers.items())
+        self._refresh_histories(ticker_name for ticker_name, _ in tickers)
+        self._refresh_calendar()
+
+        held = []
+        for ticker_name, ticker in tickers:
+            totals = ticker.totals
+            if totals.shares > SHARE_EPSILON:
+                market_value = totals.cost_basis if totals.last_price is None else totals.market_value
+                held.append((market_value, ticker_name))
+        held.sort(reverse=True)
+
+        ticker_names = [ticker_name for _, ticker_name in held]
+        ticker_risks = {ticker_name: self.ticker_risk(ticker_name) for ticker_name in ticker_names}
+
+        return RiskReport(self, ticker_names, [market_value for market_value, _ in held], ticker_risks)
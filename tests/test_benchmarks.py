@@ -0,0 +1,34 @@
+from benchmarks.suite import BENCHMARKS, find_regressions, run_suite
+
+
+def test_suite_runs_every_benchmark():
+    results = run_suite([10], repeat=1, report=lambda line: None)
+
+    assert set(results) == {f"{name}@10" for name in BENCHMARKS}
+    assert all(result["seconds"] >= 0 and result["peak_bytes"] >= 0 for result in results.values())
+
+
+def test_regressions_beyond_threshold_are_reported():
+    baseline = {
+        "fast@10": {"seconds": 1.0, "peak_bytes": 1000},
+        "noisy@10": {"seconds": 0.0001, "peak_bytes": 1000},
+    }
+    results = {
+        "fast@10": {"seconds": 1.5, "peak_bytes": 1100},
+        "noisy@10": {"seconds": 0.0005, "peak_bytes": 1000},
+        "new@10": {"seconds": 9.0, "peak_bytes": 9000},
+    }
+
+    regressions = find_regressions(results, baseline, threshold=0.2)
+    assert len(regressions) == 1 and regressions[0].startswith("fast@10")
+
+    # Memory growth is held to the same threshold.
+    assert len(find_regressions(results, baseline, threshold=0.05)) == 2
+
+
+def test_zero_baseline_time_is_reported_without_dividing_by_zero():
+    baseline = {"coarse@10": {"seconds": 0.0, "peak_bytes": 0}}
+    results = {"coarse@10": {"seconds": 0.5, "peak_bytes": 0}}
+
+    regressions = find_regressions(results, baseline, threshold=0.2)
+    assert len(regressions) == 1 and regressions[0].startswith("coarse@10: 0.5000 s, baseline 0.0000 s")
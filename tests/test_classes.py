@@ -0,0 +1,142 @@
+from classes import POSITION_ID_WIDTH, Portfolio, Position, Ticker
+import datetime
+import pickle
+import sys
+import threading
+import pytest
+
+
+def build_ticker(columnar: bool) -> tuple[Ticker, list[Position]]:
+    ticker = Ticker("TEST", columnar=columnar)
+    positions = [
+        Position(share_count=10, share_value=5.0),
+        Position(share_count=4, share_value=7.5),
+        Position(share_count=3, share_value=6.0, is_sell=True),
+    ]
+
+    for position in positions:
+        ticker.positions[position.id] = position
+
+    return ticker, positions
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_ticker_totals_with_either_store(columnar):
+    ticker = Ticker("TEST", columnar=columnar)
+    ticker.add_position(Position(share_count=10, share_value=5.0))
+    ticker.add_position(Position(share_count=4, share_value=7.5))
+    assert ticker.sell_position(Position(share_count=3, share_value=6.0, is_sell=True))
+
+    # The cost basis of the shares still held: 7 left at $5.00 and 4 at $7.50.
+    assert ticker.total_shares == pytest.approx(11)
+    assert ticker.total_value == pytest.approx(65)
+    assert ticker.avg_price == pytest.approx(65 / 11)
+    assert len(ticker.positions) == 3
+
+    ticker.recalculate_totals()
+    assert ticker.total_value == pytest.approx(65)
+
+
+def test_columnar_store_round_trips_positions():
+    ticker, positions = build_ticker(columnar=True)
+
+    for position in positions:
+        view = ticker.positions[position.id]
+        assert view.id == position.id
+        assert view.number_of_shares == position.number_of_shares
+        assert view.share_price == position.share_price
+        assert view.is_sell == position.is_sell
+
+    removed = ticker.positions.pop(positions[0].id)
+    assert removed.id == positions[0].id
+    assert positions[0].id not in ticker.positions
+    assert sorted(ticker.positions) == sorted(position.id for position in positions[1:])
+
+
+def test_columnar_portfolio_tickers():
+    portfolio = Portfolio("Test", columnar=True)
+    position = Position(share_count=2, share_value=3.0)
+    portfolio.buy_position("abc", position)
+
+    assert portfolio.get_ticker("ABC").get_position(position.id).value == 6.0
+
+
+def test_position_ids_unique_across_blocks():
+    position_ids = [Position(share_count=1, share_value=1.0).id for _ in range(5000)]
+
+    assert len(set(position_ids)) == len(position_ids)
+    assert all(len(position_id) == POSITION_ID_WIDTH for position_id in position_ids)
+    assert all(int(position_id, 16) >= 0 for position_id in position_ids)
+
+
+def test_create_many_matches_individual_positions():
+    moment = datetime.datetime(2024, 3, 1, 9, 30, 0, 123456)
+    positions = Position.create_many([1, 2, 3], [10.0, 20.0, 30.0], position_start=moment)
+
+    assert [position.value for position in positions] == [10.0, 40.0, 90.0]
+    assert all(position.position_start == moment for position in positions)
+    assert len({position.id for position in positions}) == 3
+    assert not hasattr(positions[0], "__dict__")
+
+
+def test_concurrent_writers_keep_totals_consistent():
+    portfolio = Portfolio("Test")
+    ticker_names = ["AAA", "BBB", "CCC", "DDD"]
+    buys_per_thread = 300
+    stop = threading.Event()
+
+    def trade(offset: int):
+        for index in range(buys_per_thread):
+            ticker_name = ticker_names[(index + offset) % len(ticker_names)]
+            portfolio.buy_position(ticker_name, Position(share_count=2, share_value=1.0 + index % 7))
+            if index % 3 == 0:
+                portfolio.sell_position(ticker_name, Position(share_count=1, share_value=9.0, is_sell=True))
+
+    def feed():
+        price = 1.0
+        while not stop.is_set():
+            for ticker_name in ticker_names:
+                portfolio.update_price(ticker_name, price)
+            price = price % 10 + 0.5
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        feeder = threading.Thread(target=feed)
+        traders = [threading.Thread(target=trade, args=(offset,)) for offset in range(4)]
+        feeder.start()
+        for trader in traders:
+            trader.start()
+        for trader in traders:
+            trader.join()
+        stop.set()
+        feeder.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    tickers = portfolio.tickers.values()
+    assert portfolio.totals.ticker_count == len(portfolio.tickers) == len(ticker_names)
+    assert sum(ticker.position_count for ticker in tickers) == 4 * buys_per_thread
+    assert len(portfolio.timeline) == sum(ticker.position_count + ticker.sell_count for ticker in tickers)
+    for ticker in tickers:
+        totals = ticker.totals
+        assert totals.shares == pytest.approx(ticker.lots.open_shares)
+        assert totals.market_value == pytest.approx(totals.last_price * ticker.lots.open_shares)
+    assert portfolio.totals.market_value == pytest.approx(sum(ticker.market_value for ticker in tickers))
+    assert portfolio.totals.market_pnl == pytest.approx(sum(ticker.market_pnl for ticker in tickers))
+
+
+def test_locks_are_not_pickled():
+    portfolio = Portfolio("Test")
+    portfolio.buy_position("abc", Position(share_count=2, share_value=3.0))
+    portfolio.update_price("abc", 4.0)
+
+    restored = pickle.loads(pickle.dumps(portfolio))
+    ticker = restored.get_ticker("abc")
+    assert restored.lock is not portfolio.lock and ticker.lock is not portfolio.get_ticker("abc").lock
+    assert restored.totals == portfolio.totals
+    assert ticker.totals.market_value == 8.0
+
+    with restored.frozen():
+        restored.update_price("abc", 5.0)
+    assert restored.totals.market_pnl == 4.0
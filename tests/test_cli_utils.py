@@ -0,0 +1,55 @@
+from benchmarks.startup import DEFERRED_MODULES, imported_modules
+from classes import Command, Portfolio, SystemConfig
+from cli_utils import COMMAND_HANDLERS, command_mapping, run_batch
+import os
+import subprocess
+import sys
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_run_batch_summary():
+    system_config = SystemConfig()
+    system_config.interactive = False
+    portfolio = Portfolio("Test")
+
+    command_lines = [
+        "# comment",
+        "buy abc 10 5",
+        "",
+        "buy abc ten 5",
+        "bogus",
+        "sell abc 2 6",
+        "quit",
+        "buy abc 1 1",
+    ]
+    summary = run_batch(command_lines, system_config, portfolio)
+
+    assert summary.lines_read == 5
+    assert summary.succeeded == 3
+    assert summary.failed == 1
+    assert summary.unrecognised == 1
+    assert summary.command_counts[Command.BUY] == 2
+    assert portfolio.get_ticker("abc").total_shares == 8
+
+
+def test_every_command_has_a_handler():
+    assert set(COMMAND_HANDLERS) == set(Command)
+    assert all(callable(command_mapping[command]) for command in Command)
+
+
+def test_one_shot_commands(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPOSITORY_ROOT)
+    environment = {**os.environ, "CLIP_DATA_DIR": str(tmp_path)}
+
+    def run(*command):
+        return subprocess.run(
+            [sys.executable, "main.py", *command], env=environment, capture_output=True, text=True
+        )
+
+    assert run("buy", "abc", "10", "5").returncode == 0
+    assert run("sell", "abc", "20", "5").returncode == 1
+    assert run("bogus").returncode == 2
+    assert "ABC: 10.0 shares" in run("holdings").stdout
+
+    assert not set(DEFERRED_MODULES) & imported_modules(["holdings"], environment)
@@ -0,0 +1,102 @@
+import asyncio
+import io
+import threading
+from datetime import timedelta
+
+from classes import Command, Portfolio, Position, SystemConfig
+from cli_utils import command_mapping, run_batch
+from event_loop import AsyncClip
+from notifications import Notification, NotificationManager
+
+
+def build_clip(quote_source=None) -> AsyncClip:
+    system_config = SystemConfig()
+    system_config.notification_manager = NotificationManager()
+
+    portfolio = Portfolio("Test")
+    portfolio.buy_position("abc", Position(share_count=10, share_value=5.0))
+
+    return AsyncClip(system_config, portfolio, quote_source=quote_source, expiry_interval=0.01)
+
+
+def test_commands_run_until_input_ends(monkeypatch):
+    monkeypatch.setattr("sys.stdin", io.StringIO("price ABC 7\n"))
+    clip = build_clip()
+
+    asyncio.run(clip.run())
+
+    assert clip.portfolio.last_prices["ABC"] == 7.0
+    assert clip.portfolio.market_value == 70.0
+
+
+class ConfirmingInput:
+    """stdin that answers a confirmation only once the expiry task has run meanwhile."""
+
+    def __init__(self, notification_manager: NotificationManager):
+        self.notification_manager = notification_manager
+        self.lines = iter(["prise ABC 7\n", None])
+        self.expired_while_confirming = threading.Event()
+
+    def readline(self) -> str:
+        line = next(self.lines, "")
+        if line is None:
+            # The "Did you mean" confirmation.
+            for _ in range(500):
+                if not self.notification_manager.get_valid_notification_count():
+                    self.expired_while_confirming.set()
+                    break
+                self.expired_while_confirming.wait(0.01)
+            return "yes\n"
+        return line
+
+
+def test_confirmation_does_not_block_background_tasks(monkeypatch):
+    clip = build_clip()
+    notification_manager = clip.system_config.notification_manager
+    stdin = ConfirmingInput(notification_manager)
+    monkeypatch.setattr("sys.stdin", stdin)
+    notification_manager.add_notification(
+        Notification(title="SOON", text="gone", expiration_delta=timedelta(milliseconds=50))
+    )
+
+    asyncio.run(clip.run())
+
+    assert stdin.expired_while_confirming.is_set()
+    assert clip.portfolio.last_prices["ABC"] == 7.0
+
+
+def test_feed_applies_prices_in_background(tmp_path):
+    quotes_path = tmp_path / "quotes.txt"
+    quotes_path.write_text("abc 6\nabc 8\n")
+    clip = build_clip(quote_source=str(quotes_path))
+
+    async def run_feed():
+        clip._state_changed = asyncio.Event()
+        # Stop following once the file is read.
+        clip._stop_event.set()
+        await clip.feed_task()
+
+    asyncio.run(run_feed())
+
+    assert clip.portfolio.last_prices["ABC"] == 8.0
+    assert clip._state_changed.is_set()
+    assert clip.system_config.notification_manager.get_valid_notification_count() == 1
+
+
+def test_batch_runs_coroutine_commands(monkeypatch):
+    runs = []
+
+    async def record_run(system_config, portfolio, command_arguments):
+        await asyncio.sleep(0)
+        if command_arguments == ["fail"]:
+            raise ValueError("failed while awaited")
+        runs.append(command_arguments)
+
+    monkeypatch.setitem(command_mapping, Command.JOEY, record_run)
+    clip = build_clip()
+
+    summary = run_batch(["JOEY once\n", "JOEY fail\n"], clip.system_config, clip.portfolio)
+
+    assert runs == [["once"]]
+    assert summary.succeeded == 1
+    assert summary.failed == 1
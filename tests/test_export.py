@@ -0,0 +1,64 @@
+import csv
+import json
+
+from classes import Portfolio, Position, SystemConfig
+from export import export_chunks, export_portfolio, read_binary_export
+from programs.queries import POSITIONS_PAGE_SIZE, positions
+import pytest
+
+
+def build_portfolio(columnar: bool = False) -> Portfolio:
+    portfolio = Portfolio("Test Portfolio", columnar=columnar)
+    for index in range(50):
+        ticker_name = "abc" if index % 2 else "xyz"
+        portfolio.buy_position(ticker_name, Position(share_count=index + 1, share_value=2.5))
+    portfolio.sell_position("abc", Position(share_count=3, share_value=4.0, is_sell=True))
+    portfolio.update_price("abc", 3.0)
+
+    return portfolio
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_text_exports_stream_every_position(tmp_path, columnar):
+    portfolio = build_portfolio(columnar)
+    ticker = portfolio.get_ticker("abc")
+
+    assert export_portfolio(portfolio, "positions", "csv", str(tmp_path / "positions.csv")) == 51
+    with open(tmp_path / "positions.csv", newline="") as export_file:
+        rows = list(csv.DictReader(export_file))
+    assert [row["id"] for row in rows if row["ticker"] == "ABC"] == list(ticker.positions.keys())
+    assert rows[-1]["side"] == "sell" and float(rows[-1]["value"]) == 12.0
+
+    assert export_portfolio(portfolio, "tickers", "jsonl", str(tmp_path / "tickers.jsonl")) == 2
+    with open(tmp_path / "tickers.jsonl") as export_file:
+        tickers = {record["ticker"]: record for record in map(json.loads, export_file)}
+    assert tickers["ABC"]["shares"] == ticker.total_shares
+    assert tickers["ABC"]["market_value"] == ticker.market_value
+    assert tickers["XYZ"]["last_price"] is None
+
+
+def test_binary_export_round_trips(tmp_path):
+    portfolio = build_portfolio()
+    path = str(tmp_path / "positions.bin")
+    export_portfolio(portfolio, "positions", "binary", path, ticker_names=["abc"])
+
+    report_name, records = read_binary_export(path)
+    records = list(records)
+    ticker = portfolio.get_ticker("abc")
+    assert report_name == "positions"
+    assert [f"{record[1]:016X}" for record in records] == list(ticker.positions.keys())
+    assert records[-1][0] == b"ABC".ljust(16, b"\0")
+    assert records[-1][2:4] == (True, 3.0)
+
+    with pytest.raises(ValueError):
+        list(export_chunks(portfolio, "positions", "xml"))
+
+
+def test_positions_are_paged(capsys):
+    portfolio = build_portfolio()
+    assert positions(SystemConfig(), portfolio, ["abc", "2"])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 26 - POSITIONS_PAGE_SIZE + 1
+    assert lines[-1] == "Page 2 of 2."
+    assert not positions(SystemConfig(), portfolio, ["abc", "3"])
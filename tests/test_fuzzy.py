@@ -0,0 +1,28 @@
+from fuzzy import FuzzyIndex
+from classes import Portfolio, Position
+
+
+def test_closest_matches_typos():
+    index = FuzzyIndex(["buy", "sell", "quit", "JOEY"])
+
+    assert index.closest("by")[0][0] == "buy"
+    assert index.closest("sel")[0][0] == "sell"
+    assert index.closest("joey")[0][0] == "JOEY"
+    assert index.closest("zzz") == []
+
+
+def test_index_updates_incrementally():
+    index = FuzzyIndex(["AAPL", "MSFT"])
+
+    assert index.closest("APPL")[0][0] == "AAPL"
+    index.remove("AAPL")
+    index.add("APPN")
+    assert index.closest("APPL")[0][0] == "APPN"
+    assert index.closest("msft") == [("MSFT", 1.0)]
+
+
+def test_portfolio_indexes_tickers():
+    portfolio = Portfolio("Test")
+    portfolio.buy_position("goog", Position(share_count=1, share_value=1.0))
+
+    assert portfolio.ticker_index.closest("GOGL")[0][0] == "GOOG"
@@ -0,0 +1,64 @@
+from graphics import (
+    FrameRenderer,
+    combine_segments,
+    generate_panel,
+    notif_width,
+    queue_notifications,
+    segment_height,
+)
+from notifications import Notification
+import io
+
+
+def test_renderer_redraws_only_changed_rows():
+    renderer = FrameRenderer(io.StringIO())
+
+    # First frame draws every row, plus the separator.
+    assert renderer.render(combine_segments(generate_panel(), ["first"])) == segment_height + 1
+
+    # Nothing changed.
+    renderer.output_stream = io.StringIO()
+    assert renderer.render(combine_segments(generate_panel(), ["first"])) == 0
+    assert "first" not in renderer.output_stream.getvalue()
+
+    # One notification row changed.
+    renderer.output_stream = io.StringIO()
+    assert renderer.render(combine_segments(generate_panel(), ["second"])) == 1
+    assert "second" in renderer.output_stream.getvalue()
+
+    renderer.invalidate()
+    assert renderer.render(combine_segments(generate_panel(), ["second"])) == segment_height + 1
+
+
+def test_queue_wraps_text_at_notification_width():
+    text = "".join(chr(ord("a") + index % 26) for index in range(100))
+    rows = queue_notifications([Notification(title="Title", text=text)])
+
+    # Bottom row first: wrapped text from its last line up, then the title and a gap.
+    text_rows = rows[:-2][::-1]
+    assert "".join(text_rows) == text
+    assert all(len(row) <= notif_width - 1 for row in text_rows)
+    assert rows[-2:] == ["Title", " "]
+
+
+def test_queue_stops_once_rows_are_filled():
+    visited = []
+
+    def notifications():
+        for index in range(100):
+            notification = Notification(title=f"Notification {index}", text="text")
+            visited.append(notification)
+            yield notification
+
+    rows = queue_notifications(notifications())
+
+    assert len(rows) == segment_height
+    # Three rows each, so only enough to fill the segment are visited.
+    assert len(visited) == -(-segment_height // 3)
+
+
+def test_wrapping_is_cached_per_width():
+    notification = Notification(title="Title", text="x" * 50)
+
+    assert notification.wrap_text(20) is notification.wrap_text(20)
+    assert notification.wrap_text(25) == ("x" * 25, "x" * 25)
@@ -0,0 +1,117 @@
+from classes import Portfolio, Position
+from lots import LotPolicy
+from persistence import TransactionLog
+
+
+def ticker_state(portfolio: Portfolio, ticker_name: str) -> tuple:
+    ticker = portfolio.get_ticker(ticker_name)
+    return (
+        ticker.total_shares,
+        ticker.total_value,
+        ticker.avg_price,
+        ticker.realized_pnl,
+        sorted((lot.lot_id, lot.remaining_shares) for lot in ticker.lots.lots.values() if not lot.closed),
+        sorted(ticker.positions.keys()),
+    )
+
+
+def test_undo_buy_of_new_ticker_removes_it():
+    portfolio = Portfolio("Test Portfolio")
+    position = Position(share_count=10, share_value=5.0)
+    portfolio.history.buy("abc", position)
+
+    assert portfolio.history.undo().position is position
+    assert portfolio.get_ticker("ABC") is None
+    assert portfolio.ticker_count == 0
+    assert portfolio.timeline.holdings_at(position.timestamp) == (0.0, 0.0)
+    assert portfolio.history.undo() is None
+
+
+def test_undo_sell_restores_exact_state():
+    portfolio = Portfolio("Test Portfolio")
+    for share_price in (10.1, 20.3, 30.7):
+        portfolio.history.buy("abc", Position(share_count=3.3, share_value=share_price))
+    portfolio.update_price("abc", 25.0)
+    before = ticker_state(portfolio, "ABC")
+    market_value = portfolio.market_value
+
+    assert portfolio.history.sell("abc", Position(share_count=5, share_value=26.0, is_sell=True), LotPolicy.LIFO)
+    assert ticker_state(portfolio, "ABC") != before
+
+    portfolio.history.undo()
+    assert ticker_state(portfolio, "ABC") == before
+    assert portfolio.market_value == market_value
+
+
+def test_redo_reapplies_until_a_new_trade():
+    portfolio = Portfolio("Test Portfolio")
+    portfolio.history.buy("abc", Position(share_count=10, share_value=5.0))
+    portfolio.history.sell("abc", Position(share_count=4, share_value=6.0, is_sell=True))
+    after = ticker_state(portfolio, "ABC")
+
+    portfolio.history.undo()
+    assert portfolio.history.redo().operation == "sell"
+    assert ticker_state(portfolio, "ABC") == after
+
+    portfolio.history.undo()
+    portfolio.history.buy("abc", Position(share_count=1, share_value=5.0))
+    assert portfolio.history.redo() is None
+    assert portfolio.get_ticker("ABC").total_shares == 11
+
+
+def test_failed_sell_keeps_undone_trades_to_redo():
+    portfolio = Portfolio("Test Portfolio")
+    portfolio.history.buy("abc", Position(share_count=10, share_value=5.0))
+    portfolio.history.sell("abc", Position(share_count=4, share_value=6.0, is_sell=True))
+    after = ticker_state(portfolio, "ABC")
+    checkpoints = list(portfolio.history._checkpoints["ABC"])
+
+    portfolio.history.undo()
+    assert not portfolio.history.sell("abc", Position(share_count=50, share_value=6.0, is_sell=True))
+    specific_sell = Position(share_count=1, share_value=6.0, is_sell=True)
+    assert not portfolio.history.sell("abc", specific_sell, LotPolicy.SPECIFIC, "nope")
+    assert not portfolio.history.sell("xyz", Position(share_count=1, share_value=6.0, is_sell=True))
+    assert portfolio.history._checkpoints["ABC"] == checkpoints
+
+    assert portfolio.history.redo().operation == "sell"
+    assert ticker_state(portfolio, "ABC") == after
+
+
+def test_undo_replays_from_latest_checkpoint():
+    portfolio = Portfolio("Test Portfolio")
+    portfolio.history.checkpoint_interval = 4
+    states = []
+    for index in range(10):
+        states.append(ticker_state(portfolio, "ABC") if index else None)
+        if index % 3 == 2:
+            portfolio.history.sell("abc", Position(share_count=1, share_value=7.0 + index, is_sell=True))
+        else:
+            portfolio.history.buy("abc", Position(share_count=2, share_value=5.0 + index / 3))
+
+    assert len(portfolio.history._checkpoints["ABC"]) == 3
+
+    for state in reversed(states[1:]):
+        portfolio.history.undo()
+        assert ticker_state(portfolio, "ABC") == state
+
+
+def test_undone_trade_is_not_reloaded(tmp_path):
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio", snapshot_interval=None)
+    portfolio = transaction_log.load()
+
+    kept = Position(share_count=10, share_value=5.0)
+    undone = Position(share_count=5, share_value=6.0)
+    for position in (kept, undone):
+        portfolio.history.buy("abc", position)
+        transaction_log.record_buy("abc", position)
+
+    event = portfolio.history.undo()
+    transaction_log.record_undo(event.ticker_name, event.position)
+    # Lose the snapshot, so the whole log is replayed.
+    transaction_log._log_file.close()
+    transaction_log._log_file = None
+    (tmp_path / "test_portfolio.snapshot").unlink()
+
+    restored = TransactionLog(str(tmp_path), "Test Portfolio").load(read_only=True)
+    assert restored.get_ticker("ABC").total_shares == 10
+    assert restored.get_ticker("ABC").get_position(undone.id) is None
@@ -0,0 +1,38 @@
+import asyncio
+
+from classes import Portfolio, SystemConfig
+from cli_utils import dispatch_command
+from instrumentation import LatencyHistogram, Stats
+
+
+def test_histogram_percentiles_within_a_bucket():
+    histogram = LatencyHistogram()
+    for duration_ns in [1_000] * 98 + [1_000_000] * 2:
+        histogram.record(duration_ns)
+
+    assert histogram.count == 100
+    assert 1_000 <= histogram.percentile(0.5) < 2_048
+    assert histogram.percentile(0.99) == histogram.max_ns == 1_000_000
+
+
+def test_dispatch_records_only_when_enabled():
+    system_config = SystemConfig()
+    portfolio = Portfolio("Test")
+
+    dispatch_command(system_config, portfolio, ["price", "ABC", "5"])
+    assert system_config.stats.is_empty()
+
+    system_config.stats.enabled = True
+    dispatch_command(system_config, portfolio, ["price", "ABC", "6"])
+    assert system_config.stats.latencies["command.price"].count == 1
+
+
+def test_awaited_commands_are_timed_to_completion():
+    stats = Stats(enabled=True)
+
+    async def slow_command():
+        await asyncio.sleep(0.01)
+        return True
+
+    assert asyncio.run(stats.record_awaited("command.slow", 0, slow_command())) is True
+    assert stats.latencies["command.slow"].count == 1
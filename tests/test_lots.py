@@ -0,0 +1,85 @@
+from classes import Position, Ticker
+from lots import LotBook, LotPolicy
+import pickle
+import pytest
+
+
+def build_book() -> LotBook:
+    lot_book = LotBook()
+    lot_book.add_lot("A", share_count=10, share_price=10.0)
+    lot_book.add_lot("B", share_count=10, share_price=30.0)
+    lot_book.add_lot("C", share_count=10, share_price=20.0)
+
+    return lot_book
+
+
+@pytest.mark.parametrize(
+    "policy, expected_matches",
+    [
+        (LotPolicy.FIFO, [("A", 10, 10.0), ("B", 5, 30.0)]),
+        (LotPolicy.LIFO, [("C", 10, 20.0), ("B", 5, 30.0)]),
+        (LotPolicy.HIGHEST_COST, [("B", 10, 30.0), ("C", 5, 20.0)]),
+    ],
+)
+def test_sell_policies(policy, expected_matches):
+    lot_book = build_book()
+    matches = lot_book.match_sell(15, share_price=25.0, policy=policy)
+
+    assert matches == expected_matches
+
+    sold_cost = sum(shares * price for _, shares, price in expected_matches)
+    assert lot_book.open_shares == pytest.approx(15)
+    assert lot_book.open_cost == pytest.approx(600 - sold_cost)
+    assert lot_book.realized_pnl == pytest.approx(15 * 25.0 - sold_cost)
+
+
+def test_specific_lot_and_shortfall():
+    lot_book = build_book()
+
+    assert lot_book.match_sell(4, share_price=40.0, policy=LotPolicy.SPECIFIC, lot_id="C") == [("C", 4, 20.0)]
+    assert lot_book.unrealized_pnl(20.0) == pytest.approx(26 * 20.0 - (600 - 80))
+
+    with pytest.raises(ValueError):
+        lot_book.match_sell(7, share_price=40.0, policy=LotPolicy.SPECIFIC, lot_id="C")
+    with pytest.raises(ValueError):
+        lot_book.match_sell(27, share_price=40.0)
+
+    # Failed sells change nothing.
+    assert lot_book.open_shares == pytest.approx(26)
+
+    # Subsequent FIFO sells skip the lots already closed.
+    lot_book.match_sell(6, share_price=40.0, policy=LotPolicy.SPECIFIC, lot_id="C")
+    assert lot_book.match_sell(12, share_price=40.0, policy=LotPolicy.LIFO) == [("B", 10, 30.0), ("A", 2, 10.0)]
+
+
+def test_ticker_cost_basis():
+    ticker = Ticker("TEST")
+    first = Position(share_count=10, share_value=10.0)
+    second = Position(share_count=30, share_value=20.0)
+    ticker.add_position(first)
+    ticker.add_position(second)
+
+    # Weighted, not pairwise, average.
+    assert ticker.avg_price == pytest.approx(700 / 40)
+
+    assert ticker.sell_position(Position(share_count=20, share_value=30.0, is_sell=True))
+    assert ticker.total_shares == pytest.approx(20)
+    assert ticker.avg_price == pytest.approx(20.0)
+    assert ticker.realized_pnl == pytest.approx(10 * 20 + 10 * 10)
+
+    assert not ticker.sell_position(Position(share_count=50, share_value=30.0, is_sell=True))
+    # The second lot has been sold from, so it can no longer be removed.
+    assert not ticker.remove_position(second.id)
+
+
+def test_pickled_book_holds_no_itertools_objects():
+    lot_book = build_book()
+    lot_book.add_lot("D", share_count=5, share_price=30.0)
+    lot_book.add_lot("E", share_count=5, share_price=30.0)
+
+    state = pickle.dumps(lot_book)
+    assert b"itertools" not in state
+    restored = pickle.loads(state)
+    restored.add_lot("F", share_count=5, share_price=30.0)
+    # Equal prices sell in the order bought, across the pickling.
+    assert [lot_id for lot_id, *_ in restored.match_sell(20, 40.0, policy=LotPolicy.HIGHEST_COST)] == ["B", "D", "E"]
@@ -0,0 +1,44 @@
+from classes import Position
+from multi_portfolio import MultiPortfolioManager
+from persistence import TransactionLog
+import pytest
+
+
+def save_portfolio(data_directory: str, name: str, trades: list[tuple[str, float, float, bool]]):
+    transaction_log = TransactionLog(data_directory, name)
+    portfolio = transaction_log.load()
+
+    for ticker_name, share_count, share_value, is_sell in trades:
+        position = Position(share_count=share_count, share_value=share_value, is_sell=is_sell)
+        if is_sell:
+            portfolio.sell_position(ticker_name, position)
+            transaction_log.record_sell(ticker_name, position)
+        else:
+            portfolio.buy_position(ticker_name, position)
+            transaction_log.record_buy(ticker_name, position)
+
+    transaction_log.close()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_rollup_merges_portfolios(tmp_path, workers):
+    save_portfolio(str(tmp_path), "Alice", [("abc", 10, 5.0, False), ("abc", 4, 6.0, True)])
+    save_portfolio(str(tmp_path), "Bob", [("abc", 2, 8.0, False), ("xyz", 3, 1.0, False)])
+    save_portfolio(str(tmp_path), "Carol", [("xyz", 1, 2.0, False)])
+
+    manager = MultiPortfolioManager(str(tmp_path), workers=workers)
+    assert manager.portfolio_names == ["alice", "bob", "carol"]
+
+    rollup = manager.aggregate({"ABC": 10.0})
+    abc, xyz = rollup.tickers["ABC"], rollup.tickers["XYZ"]
+
+    assert rollup.portfolio_count == 3
+    assert abc.shares == pytest.approx(8)
+    assert abc.cost == pytest.approx(6 * 5.0 + 2 * 8.0)
+    assert abc.exposure == pytest.approx(80)
+    assert abc.unrealized_pnl == pytest.approx(80 - 46)
+    assert abc.realized_pnl == pytest.approx(4)
+    assert abc.holders == 2
+    # Unpriced tickers count at cost.
+    assert xyz.exposure == pytest.approx(5)
+    assert rollup.exposure == pytest.approx(85)
@@ -0,0 +1,89 @@
+from notification_log import NotificationLog
+from notifications import Notification, NotificationManager, NotificationSource
+import json
+import os
+
+
+def fill(manager: NotificationManager, count: int):
+    for index in range(count):
+        source = NotificationSource.FEED if index % 5 == 0 else NotificationSource.SYSTEM
+        manager.add_notification(Notification(title=f"n{index}", text=f"text {index}", source=source))
+
+
+def test_evicted_notifications_are_spilled_and_paged(tmp_path):
+    spill_log = NotificationLog(str(tmp_path), segment_size=50)
+    manager = NotificationManager(spill_log=spill_log)
+    manager.update_buffer_size(10)
+    fill(manager, 125)
+
+    # Everything but the ten still buffered, across three segments.
+    assert len(spill_log) == 115
+    assert [segment.count for segment in spill_log.segments] == [50, 50, 15]
+
+    assert [notification.title for notification in spill_log.page(1, 3)] == ["n114", "n113", "n112"]
+    assert [notification.title for notification in spill_log.page(11, 5)] == ["n64", "n63", "n62", "n61", "n60"]
+
+    manager.close()
+    assert len(NotificationLog(str(tmp_path))) == 125
+
+
+def test_search_filters(tmp_path):
+    spill_log = NotificationLog(str(tmp_path), segment_size=20)
+    manager = NotificationManager(spill_log=spill_log)
+    fill(manager, 60)
+    manager.close()
+
+    feed_titles = [notification.title for notification in spill_log.search(source=NotificationSource.FEED)]
+    assert feed_titles == [f"n{index}" for index in range(55, -1, -5)]
+
+    assert [notification.title for notification in spill_log.search(text="TEXT 42")] == ["n42"]
+
+    created_ns = next(spill_log.search(text="text 30")).created_ns
+    assert all(notification.created_ns >= created_ns for notification in spill_log.search(since_ns=created_ns))
+
+
+def test_unclosed_log_is_recounted_and_continued(tmp_path):
+    spill_log = NotificationLog(str(tmp_path), segment_size=100)
+    manager = NotificationManager(spill_log=spill_log)
+    manager.update_buffer_size(1)
+    fill(manager, 11)
+    spill_log.flush()
+    fill(manager, 5)
+
+    # Reopened without close(), as after a crash: the segment is recounted from disk,
+    # keeping what was flushed, and new notifications go to a fresh segment.
+    reopened = NotificationLog(str(tmp_path), segment_size=100)
+    assert len(reopened) == 10
+    reopened.append(Notification(title="after", text="crash"))
+    reopened.close()
+    assert len(reopened.segments) == 2
+
+    # A cleanly closed segment is carried on by the next run.
+    continued = NotificationLog(str(tmp_path), segment_size=100)
+    continued.append(Notification(title="next", text="run"))
+    continued.close()
+    assert sorted(os.listdir(tmp_path)) == ["index.json", "segment-000001.jsonl.gz", "segment-000002.jsonl.gz"]
+    assert [notification.title for notification in NotificationLog(str(tmp_path)).page(1, 2)] == ["next", "after"]
+
+
+def test_closed_log_opens_without_reading_segments(tmp_path, monkeypatch):
+    spill_log = NotificationLog(str(tmp_path), segment_size=100)
+    manager = NotificationManager(spill_log=spill_log)
+    manager.update_buffer_size(1)
+    fill(manager, 11)
+    spill_log.close()
+
+    def no_reading(*_, **__):
+        raise AssertionError("segment read")
+
+    monkeypatch.setattr(NotificationLog, "_read_segment", no_reading)
+    reopened = NotificationLog(str(tmp_path), segment_size=100)
+    assert len(reopened) == 10
+
+    # Appending marks the index open again, so a crash now leaves it to be recounted.
+    reopened.append(Notification(title="after", text="close"))
+    reopened.flush()
+    with open(reopened.index_path) as index_file:
+        assert not json.load(index_file)["closed"]
+    monkeypatch.undo()
+    assert len(NotificationLog(str(tmp_path), segment_size=100)) == 11
@@ -3,8 +3,11 @@ import random
 import time
 import string
 from datetime import timedelta
+from clock import to_ns
+import pytest
 
 
+@pytest.mark.parametrize("number_of_notifications", [1, 100, 10_000])
 def test_adding_of_notifications(number_of_notifications):
     notification_manager = NotificationManager()
 
@@ -45,3 +48,100 @@ def test_expiration():
     time.sleep(1)
     new_notification.check_expired()
     assert not new_notification.valid
+
+
+def test_ring_buffer_keeps_most_recent():
+    notification_manager = NotificationManager()
+    notification_manager.update_buffer_size(5)
+
+    for notif in range(8):
+        notification_manager.add_notification(Notification(title=f"Test Notification {notif}", text=""))
+
+    titles = [notification.title for notification in notification_manager.get_notifications()]
+
+    assert titles == [f"Test Notification {notif}" for notif in range(7, 2, -1)]
+    assert [n.title for n in notification_manager.get_notifications(2)] == titles[:2]
+    assert notification_manager.get_most_recent_notification().title == "Test Notification 7"
+
+
+def test_expiry_scheduler_evicts_due_notifications():
+    notification_manager = NotificationManager()
+
+    expiring = Notification(title="Expiring", text="", expiration_delta=timedelta(seconds=1))
+    lasting = Notification(title="Lasting", text="", expiration_delta=timedelta(hours=1))
+    permanent = Notification(title="Permanent", text="")
+
+    for notification in (expiring, lasting, permanent):
+        notification_manager.add_notification(notification)
+
+    assert notification_manager.get_valid_notification_count() == 3
+
+    # Nothing is due yet.
+    assert notification_manager.expire_notifications() == 0
+
+    expired_count = notification_manager.expire_notifications(now=expiring.expiration_time)
+
+    assert expired_count == 1
+    assert not expiring.valid
+    assert notification_manager.get_valid_notification_count() == 2
+    # The expired notification was the oldest, so it has been evicted.
+    assert notification_manager.get_total_notification_count() == 2
+
+    permanent.invalidate()
+    assert notification_manager.get_valid_notification_count() == 1
+    assert [n.title for n in notification_manager.get_notifications(valid_only=True)] == ["Lasting"]
+
+
+def test_indexes_follow_adds_invalidations_and_evictions():
+    notification_manager = NotificationManager()
+    notification_manager.update_buffer_size(6)
+
+    for index in range(8):
+        source = NotificationSource.SYSTEM if index % 3 == 0 else NotificationSource.FEED
+        notification_manager.add_notification(Notification(title=f"n{index}", text="", source=source))
+
+    # n0 and n1 were evicted.
+    system = [n.title for n in notification_manager.get_notifications(source=NotificationSource.SYSTEM)]
+    assert system == ["n6", "n3"]
+    assert notification_manager.get_notification_count(NotificationSource.FEED) == 4
+
+    next(notification_manager.get_notifications(source=NotificationSource.FEED)).invalidate()
+    feed = notification_manager.get_notifications(valid_only=True, source=NotificationSource.FEED)
+    assert [n.title for n in feed] == ["n5", "n4", "n2"]
+    assert notification_manager.get_notification_count(NotificationSource.FEED, valid_only=True) == 3
+    assert notification_manager.get_notification_count(valid_only=True) == 5
+
+    since = notification_manager.get_most_recent_notification().notification_time
+    assert all(n.created_ns >= to_ns(since) for n in notification_manager.get_notifications(since=since))
+
+
+def test_filtered_views_keep_recency_after_append():
+    notification_manager = NotificationManager()
+    newer = Notification(title="newer", text="")
+    older = Notification(title="older", text="")
+    older.created_ns = newer.created_ns - 1
+
+    notification_manager.append_notification(newer)
+    notification_manager.append_notification(older)
+    notification_manager.add_notification(Notification(title="newest", text=""))
+
+    titles = [n.title for n in notification_manager.get_notifications(valid_only=True)]
+    assert titles == ["newest", "newer", "older"]
+
+
+def test_time_filter_skips_notifications_added_late():
+    notification_manager = NotificationManager()
+    first = Notification(title="first", text="")
+    # Made before first, but added after it, as by a command on another thread.
+    late = Notification(title="late", text="")
+    late.created_ns = first.created_ns - 10_000
+    newest = Notification(title="newest", text="")
+    newest.created_ns = first.created_ns + 10_000
+
+    for notification in (first, late, newest):
+        notification_manager.add_notification(notification)
+
+    since = first.notification_time
+    assert [n.title for n in notification_manager.get_notifications(since=since)] == ["newest", "first"]
+    sources = notification_manager.get_notifications(source=NotificationSource.SYSTEM, since=since)
+    assert [n.title for n in sources] == ["newest", "first"]
@@ -0,0 +1,106 @@
+from classes import ColumnarPositionStore, Position, PositionStore, SystemConfig
+from persistence import TransactionLog, TRANSACTION_RECORD
+from programs.portfolio import buy
+import os
+import pytest
+
+
+def test_portfolio_survives_restart(tmp_path):
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio")
+    portfolio = transaction_log.load()
+
+    bought = Position(share_count=10, share_value=5.0)
+    sold = Position(share_count=4, share_value=6.0, is_sell=True)
+    portfolio.buy_position("abc", bought)
+    transaction_log.record_buy("abc", bought)
+    portfolio.sell_position("abc", sold)
+    transaction_log.record_sell("abc", sold)
+    transaction_log.close()
+
+    restored = TransactionLog(str(tmp_path), "Test Portfolio").load()
+    ticker = restored.get_ticker("ABC")
+
+    assert ticker.total_shares == 6
+    assert ticker.get_position(bought.id).share_price == 5.0
+    assert ticker.get_position(sold.id).is_sell
+
+
+def test_columnar_load_applies_to_new_tickers(tmp_path):
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio")
+    portfolio = transaction_log.load()
+    position = Position(share_count=10, share_value=5.0)
+    portfolio.buy_position("abc", position)
+    transaction_log.record_buy("abc", position)
+    transaction_log.close()
+
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio")
+    restored = transaction_log.load(columnar=True)
+    restored.buy_position("xyz", Position(share_count=1, share_value=2.0))
+
+    assert isinstance(restored.get_ticker("ABC").positions, PositionStore)
+    assert isinstance(restored.get_ticker("XYZ").positions, ColumnarPositionStore)
+    transaction_log.close()
+
+
+def test_load_replays_only_log_tail(tmp_path):
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio", snapshot_interval=3)
+    portfolio = transaction_log.load()
+
+    for _ in range(4):
+        position = Position(share_count=1, share_value=2.0)
+        portfolio.buy_position("abc", position)
+        transaction_log.record_buy("abc", position)
+
+    # Three records were covered by the snapshot, one remains in the log tail.
+    assert transaction_log.records_since_snapshot == 1
+
+    # Simulate a crash: no close(), and a torn record at the end of the log.
+    transaction_log._log_file.write(b"\x01\x02")
+    transaction_log._log_file.flush()
+
+    reopened = TransactionLog(str(tmp_path), "Test Portfolio", snapshot_interval=3)
+    restored = reopened.load()
+
+    assert reopened.records_since_snapshot == 1
+    assert restored.get_ticker("ABC").total_shares == 4
+    assert (os.path.getsize(reopened.log_path) - 8) % TRANSACTION_RECORD.size == 0
+
+
+def test_older_log_format_is_refused(tmp_path):
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio")
+    with open(transaction_log.log_path, "wb") as log_file:
+        log_file.write(b"CLIPLOG2" + bytes(TRANSACTION_RECORD.size))
+
+    with pytest.raises(ValueError):
+        transaction_log.load()
+
+
+def test_timestamps_survive_restart_exactly(tmp_path):
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio", snapshot_interval=None)
+    portfolio = transaction_log.load()
+
+    bought = Position(share_count=1, share_value=2.0)
+    portfolio.buy_position("abc", bought)
+    transaction_log.record_buy("abc", bought)
+    transaction_log._log_file.flush()
+
+    restored = TransactionLog(str(tmp_path), "Test Portfolio").load()
+    position = restored.get_ticker("ABC").get_position(bought.id)
+
+    assert position.timestamp_ns == bought.timestamp_ns
+    assert restored.holdings_at(bought.position_start) == {"ABC": (1, 2.0)}
+
+
+def test_over_long_ticker_is_refused_before_trading(tmp_path):
+    system_config = SystemConfig()
+    system_config.interactive = False
+    system_config.transaction_log = TransactionLog(str(tmp_path), "Test Portfolio")
+    portfolio = system_config.transaction_log.load()
+
+    assert not buy(system_config, portfolio, ["ABCDEFGHIJKLMNOPQ", "1", "5"])
+    assert not portfolio.tickers and not portfolio.history.can_undo()
+
+    assert buy(system_config, portfolio, ["ABCDEFGHIJKLMNOP", "1", "5"])
+    system_config.transaction_log.close(snapshot=False)
+    restored = TransactionLog(str(tmp_path), "Test Portfolio").load(read_only=True)
+    assert list(restored.tickers) == ["ABCDEFGHIJKLMNOP"]
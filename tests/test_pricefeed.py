@@ -0,0 +1,77 @@
+from classes import Portfolio, Position, SystemConfig
+from notifications import NotificationManager, NotificationSource
+from pricefeed import IDLE, PriceFeed, batch_quotes, parse_quotes, read_quote_file
+from programs.market import feed
+import socket
+import threading
+import pytest
+
+
+def test_pipeline_batches_latest_prices(tmp_path):
+    quotes_path = tmp_path / "quotes.txt"
+    quotes_path.write_text("abc 10\nxyz,5\nnot a quote\nabc 11\n")
+
+    batches = list(batch_quotes(parse_quotes(read_quote_file(str(quotes_path)))))
+    assert batches == [{"ABC": 11.0, "XYZ": 5.0}]
+
+    # Idle sources end the batch early.
+    assert list(batch_quotes([("ABC", 1.0), IDLE, ("ABC", 2.0)])) == [{"ABC": 1.0}, {"ABC": 2.0}]
+
+
+def test_feed_marks_only_changed_tickers():
+    portfolio = Portfolio("Test")
+    portfolio.buy_position("abc", Position(share_count=10, share_value=5.0))
+    portfolio.buy_position("xyz", Position(share_count=2, share_value=50.0))
+
+    notification_manager = NotificationManager()
+    price_feed = PriceFeed(portfolio, notification_manager)
+
+    assert price_feed.apply({"ABC": 6.0, "XYZ": 40.0, "QQQ": 1.0}) == 2
+    assert portfolio.market_value == pytest.approx(140)
+    assert portfolio.market_pnl == pytest.approx(10 - 20)
+
+    # Unchanged prices are skipped.
+    assert price_feed.apply({"ABC": 6.0, "XYZ": 45.0}) == 1
+    assert portfolio.market_pnl == pytest.approx(10 - 10)
+    assert notification_manager.get_most_recent_notification().source == NotificationSource.FEED
+
+    # Trades revalue the ticker at its last price, and new tickers pick up known prices.
+    portfolio.sell_position("abc", Position(share_count=5, share_value=6.0, is_sell=True))
+    portfolio.buy_position("qqq", Position(share_count=3, share_value=2.0))
+    assert portfolio.market_value == pytest.approx(30 + 90 + 3)
+    assert portfolio.get_ticker("QQQ").market_pnl == pytest.approx(-3)
+
+
+def test_feed_returns_while_quote_server_stays_connected():
+    portfolio = Portfolio("Test")
+    portfolio.buy_position("abc", Position(share_count=10, share_value=5.0))
+    server = socket.create_server(("127.0.0.1", 0))
+    done = threading.Event()
+
+    def serve():
+        connection, _ = server.accept()
+        with connection:
+            connection.sendall(b"abc 6\nxyz 5\n")
+            # Keep the connection open, as a live quote server does.
+            done.wait(10)
+
+    server_thread = threading.Thread(target=serve)
+    server_thread.start()
+    system_config = SystemConfig()
+    system_config.interactive = False
+    results = []
+    feed_thread = threading.Thread(
+        target=lambda: results.append(feed(system_config, portfolio, [f"127.0.0.1:{server.getsockname()[1]}"]))
+    )
+    try:
+        feed_thread.start()
+        feed_thread.join(5)
+        assert not feed_thread.is_alive()
+    finally:
+        done.set()
+        server_thread.join()
+        server.close()
+
+    assert results == [True]
+    assert portfolio.last_prices == {"ABC": 6.0, "XYZ": 5.0}
+    assert portfolio.market_value == pytest.approx(60)
@@ -0,0 +1,112 @@
+import os
+from math import sqrt
+
+from classes import Portfolio, Position, SystemConfig
+from programs.queries import risk
+from risk import TRADING_DAYS, RiskEngine, TickerRisk
+import pytest
+
+
+DAYS = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
+
+
+def write_history(directory, ticker_name: str, closes: list[float]):
+    path = directory / f"{ticker_name}.csv"
+    path.write_text("Date,Close\n" + "".join(f"{day},{close}\n" for day, close in zip(DAYS, closes)))
+    return path
+
+
+def build_portfolio() -> Portfolio:
+    portfolio = Portfolio("Test")
+    portfolio.buy_position("abc", Position(share_count=10, share_value=10.0))
+    portfolio.buy_position("xyz", Position(share_count=5, share_value=20.0))
+    portfolio.buy_position("flat", Position(share_count=1, share_value=100.0))
+    portfolio.update_price("abc", 12.0)
+    portfolio.update_price("xyz", 16.0)
+
+    return portfolio
+
+
+def test_ticker_risk_figures():
+    ticker_risk = TickerRisk([0.0, 10.0, 12.0, 9.0, 9.9])
+
+    assert list(ticker_risk.returns) == pytest.approx([0.0, 0.2, -0.25, 0.1])
+    assert ticker_risk.mean_return == pytest.approx(0.05 / 4)
+    deviations = [each_return - 0.0125 for each_return in (0.0, 0.2, -0.25, 0.1)]
+    assert ticker_risk.variance == pytest.approx(sum(deviation**2 for deviation in deviations) / 3)
+    assert ticker_risk.volatility == pytest.approx(sqrt(ticker_risk.variance * TRADING_DAYS))
+    assert ticker_risk.max_drawdown == pytest.approx(9.0 / 12.0 - 1.0)
+
+
+def test_report_weights_correlations_and_volatility(tmp_path):
+    write_history(tmp_path, "ABC", [10.0, 11.0, 9.9, 11.88, 11.88])
+    # Each XYZ return is minus ABC's, so their correlation is -1.
+    write_history(tmp_path, "XYZ", [20.0, 18.0, 19.8, 15.84, 15.84])
+    portfolio = build_portfolio()
+
+    report = RiskEngine(str(tmp_path)).report(portfolio)
+
+    # FLAT has no price history, and has never been priced, so counts at cost.
+    assert report.ticker_names == ["ABC", "FLAT", "XYZ"]
+    assert report.market_values == [120.0, 100.0, 80.0]
+    assert report.weights == pytest.approx([0.4, 1 / 3, 80 / 300])
+    assert report.close_count == len(DAYS)
+    assert report.correlation("ABC", "XYZ") == pytest.approx(-1.0)
+    assert report.correlation_matrix(["ABC", "FLAT"]) == [[pytest.approx(1.0), 0.0], [0.0, 0.0]]
+
+    abc, xyz = report.tickers["ABC"], report.tickers["XYZ"]
+    weights = dict(zip(report.ticker_names, report.weights))
+    variance = (
+        weights["ABC"] ** 2 * abc.variance
+        + weights["XYZ"] ** 2 * xyz.variance
+        + 2 * weights["ABC"] * weights["XYZ"] * report.covariance("ABC", "XYZ")
+    )
+    assert report.volatility == pytest.approx(sqrt(variance * TRADING_DAYS))
+
+
+def test_only_changed_tickers_are_recalculated(tmp_path):
+    write_history(tmp_path, "ABC", [10.0, 11.0, 9.9, 11.88, 11.88])
+    xyz_path = write_history(tmp_path, "XYZ", [20.0, 18.0, 19.8, 15.84, 15.84])
+    portfolio = build_portfolio()
+    engine = RiskEngine(str(tmp_path))
+
+    first = engine.report(portfolio)
+    abc_risk, xyz_risk = first.tickers["ABC"], first.tickers["XYZ"]
+
+    # Trades and prices change the weights, not the returns.
+    portfolio.buy_position("abc", Position(share_count=10, share_value=12.0))
+    portfolio.update_price("xyz", 15.0)
+    second = engine.report(portfolio)
+    assert second.tickers["ABC"] is abc_risk and second.tickers["XYZ"] is xyz_risk
+    assert second.market_values[0] == 240.0 and second.weights != first.weights
+
+    xyz_path.write_text(xyz_path.read_text().replace("18.0", "17.0"))
+    status = os.stat(xyz_path)
+    os.utime(xyz_path, ns=(status.st_atime_ns, status.st_mtime_ns + 1_000_000))
+    third = engine.report(portfolio)
+    assert third.tickers["ABC"] is abc_risk
+    assert third.tickers["XYZ"] is not xyz_risk
+    assert third.tickers["XYZ"].returns[0] == pytest.approx(-0.15)
+    assert third.correlation("ABC", "XYZ") != pytest.approx(-1.0)
+
+
+def test_risk_command(tmp_path, capsys):
+    prices = tmp_path / "prices"
+    prices.mkdir()
+    write_history(prices, "ABC", [10.0, 11.0, 9.9, 11.88, 11.88])
+    write_history(prices, "XYZ", [20.0, 18.0, 19.8, 15.84, 15.84])
+    system_config = SystemConfig()
+    system_config.data_directory = str(tmp_path)
+    portfolio = build_portfolio()
+
+    assert risk(system_config, portfolio, [])
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[0] for line in lines[1:4]] == ["ABC", "FLAT", "XYZ"]
+    assert lines[-1].startswith("Portfolio value $300.00")
+
+    assert risk(system_config, portfolio, ["abc", "xyz"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[3] == "Correlations:"
+    assert lines[5].split() == ["ABC", "1.00", "-1.00"]
+
+    assert not risk(system_config, portfolio, ["nope"])
@@ -0,0 +1,45 @@
+from classes import Portfolio, Position
+from timeline import FenwickTree, TimeIndex
+import datetime
+import pytest
+
+
+def test_fenwick_tree_appends_and_updates():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    tree = FenwickTree(values[:2])
+    for value in values[2:]:
+        tree.append(value)
+
+    assert [tree.prefix_sum(count) for count in range(6)] == [0, 1, 3, 6, 10, 15]
+
+    tree.add(1, -2.0)
+    assert tree.prefix_sum(5) == 13
+
+
+def test_time_index_handles_back_dated_positions():
+    time_index = TimeIndex()
+    time_index.insert(10.0, "A", "T", 5, 50)
+    time_index.insert(30.0, "C", "T", -2, -20)
+    time_index.insert(20.0, "B", "T", 1, 12)
+
+    assert time_index.holdings_at(5.0) == (0, 0)
+    assert time_index.holdings_at(20.0) == (6, 62)
+    assert time_index.holdings_at(30.0) == (4, 42)
+    assert [position_id for _, _, position_id in time_index.between(15.0, 30.0)] == ["B", "C"]
+
+    assert time_index.remove(20.0, "B")
+    assert time_index.holdings_at(30.0) == (3, 30)
+    assert [position_id for _, _, position_id in time_index.between(0.0, 40.0)] == ["A", "C"]
+
+
+def test_point_in_time_portfolio_holdings():
+    portfolio = Portfolio("Test")
+    day = datetime.datetime(2024, 1, 1)
+
+    portfolio.buy_position("abc", Position(10, 5.0, position_start=day))
+    portfolio.buy_position("xyz", Position(4, 2.0, position_start=day + datetime.timedelta(days=1)))
+    portfolio.sell_position("abc", Position(6, 9.0, is_sell=True, position_start=day + datetime.timedelta(days=2)))
+
+    assert portfolio.holdings_at(day) == {"ABC": (10, 50)}
+    assert portfolio.holdings_at(day + datetime.timedelta(days=2)) == {"ABC": (4, 20), "XYZ": (4, 8)}
+    assert portfolio.timeline.holdings_at((day + datetime.timedelta(days=2)).timestamp())[1] == pytest.approx(28)
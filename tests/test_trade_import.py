@@ -0,0 +1,91 @@
+from classes import Portfolio, Position
+from persistence import TransactionLog
+from trade_import import import_trades, trade_time_ns
+import pytest
+
+
+def ticker_state(portfolio: Portfolio, ticker_name: str) -> tuple:
+    ticker = portfolio.get_ticker(ticker_name)
+    return (
+        ticker.total_shares,
+        ticker.total_value,
+        ticker.avg_price,
+        ticker.realized_pnl,
+        ticker.position_count,
+        ticker.sell_count,
+        [(lot.remaining_shares, lot.share_price) for lot in ticker.lots.lots.values() if not lot.closed],
+    )
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_import_matches_trading_one_by_one(tmp_path, columnar):
+    trades = [
+        ("2024-01-02", "abc", "Buy", "10", "5.25"),
+        ("2024-01-02", "XYZ", "Buy", "3", '"$1,000.50"'),
+        ("2024-01-03", "ABC", "Buy", "4.5", "6.10"),
+        ("2024-01-04", "ABC", "Sell", "12", "7.00"),
+        ("2024-01-05", "ABC", "Buy", "2", "4.00"),
+        ("2024-01-05", "XYZ", "Sold", "1", "990"),
+    ]
+    path = tmp_path / "trades.csv"
+    path.write_text("Date,Symbol,Action,Quantity,Price\n" + "".join(f"{','.join(trade)}\n" for trade in trades))
+
+    expected = Portfolio("Expected", columnar=columnar)
+    for index, (day, ticker_name, side, quantity, price) in enumerate(trades):
+        share_price = float(price.strip('"$').replace(",", ""))
+        is_sell = side[0] == "S"
+        position = Position.from_record(f"{index:016X}", float(quantity), share_price, is_sell, trade_time_ns(day))
+        if position.is_sell:
+            expected.sell_position(ticker_name, position)
+        else:
+            expected.buy_position(ticker_name, position)
+
+    portfolio = Portfolio("Imported", columnar=columnar)
+    summary = import_trades(portfolio, str(path), chunk_size=4)
+
+    assert (summary.rows, summary.buys, summary.sells, summary.rejected) == (6, 4, 2, 0)
+    for ticker_name in ("ABC", "XYZ"):
+        assert ticker_state(portfolio, ticker_name) == ticker_state(expected, ticker_name)
+    moment = trade_time_ns("2024-01-04T23:00") / 1e9
+    assert portfolio.timeline.holdings_at(moment) == expected.timeline.holdings_at(moment)
+
+
+def test_bad_rows_are_rejected_with_line_numbers(tmp_path):
+    path = tmp_path / "trades.csv"
+    path.write_text(
+        "Trade Date,Ticker,Qty,Price\n"
+        "01/02/2024,ABC,10,5\n"
+        "01/03/2024,ABC,ten,5\n"
+        "\n"
+        "not a date,ABC,1,5\n"
+        "01/04/2024,,1,5\n"
+        "01/05/2024,ABC,-4,6\n"
+        "01/06/2024,XYZ,-1,6\n"
+    )
+    portfolio = Portfolio("Imported")
+    summary = import_trades(portfolio, str(path))
+
+    assert (summary.rows, summary.buys, summary.sells) == (6, 1, 1)
+    assert [line_number for line_number, _ in summary.rejections] == [3, 5, 6, 8]
+    assert portfolio.get_ticker("ABC").total_shares == 6
+
+    (tmp_path / "bad.csv").write_text("Symbol,Quantity\nABC,1\n")
+    with pytest.raises(ValueError, match="price, date"):
+        import_trades(portfolio, str(tmp_path / "bad.csv"))
+
+
+def test_imported_trades_are_logged_and_reloaded(tmp_path):
+    path = tmp_path / "trades.csv"
+    path.write_text("Date,Symbol,Side,Quantity,Price\n2024-01-02,ABC,B,10,5\n2024-01-03,ABC,S,4,6\n")
+    transaction_log = TransactionLog(str(tmp_path), "Test Portfolio", snapshot_interval=None)
+    portfolio = transaction_log.load()
+    portfolio.history.buy("ABC", Position(share_count=1, share_value=5.0))
+
+    import_trades(portfolio, str(path), transaction_log=transaction_log)
+    assert not portfolio.history.can_undo()
+    transaction_log._log_file.close()
+    transaction_log._log_file = None
+
+    restored = TransactionLog(str(tmp_path), "Test Portfolio").load(read_only=True)
+    assert restored.get_ticker("ABC").total_shares == 6
+    assert restored.get_ticker("ABC").realized_pnl == 4.0
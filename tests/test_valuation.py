@@ -0,0 +1,69 @@
+from array import array
+from classes import Portfolio, Position
+from clock import to_ns
+from valuation import close_timestamp, closes_at, read_price_history, value_portfolio
+import datetime
+import pytest
+
+
+def buy_on(portfolio: Portfolio, ticker_name: str, day: str, share_count: float, share_value: float):
+    moment = datetime.datetime.fromisoformat(f"{day}T12:00")
+    position_id = f"{len(portfolio.timeline):016X}"
+    portfolio.buy_position(
+        ticker_name, Position.from_record(position_id, share_count, share_value, False, to_ns(moment))
+    )
+
+
+def test_read_price_history_picks_close_column_and_sorts(tmp_path):
+    path = tmp_path / "ABC.csv"
+    path.write_text("Date,Open,High,Low,Close,Volume\n2024-01-03,1,1,1,12.5,100\n2024-01-02,1,1,1,11.0,100\n")
+
+    timestamps, closes = read_price_history(str(path))
+    assert list(closes) == [11.0, 12.5]
+    assert list(timestamps) == [close_timestamp("2024-01-02"), close_timestamp("2024-01-03")]
+
+    path.write_text("2024-01-02T16:00,11.0\n")
+    assert list(read_price_history(str(path))[1]) == [11.0]
+
+
+def test_closes_at_carries_the_latest_close_forward():
+    history = (array("d", [10.0, 20.0, 30.0]), array("d", [1.5, 2.5, 3.5]))
+
+    assert list(closes_at(history, [5.0, 10.0, 25.0, 30.0, 99.0])) == [0.0, 1.5, 2.5, 3.5, 3.5]
+
+
+def test_value_portfolio_matches_holdings_each_day():
+    portfolio = Portfolio("Test")
+    buy_on(portfolio, "abc", "2024-01-02", 10, 5.0)
+    buy_on(portfolio, "abc", "2024-01-04", 10, 7.0)
+    portfolio.sell_position("ABC", Position(share_count=5, share_value=8.0, is_sell=True))
+    buy_on(portfolio, "xyz", "2024-01-01", 2, 50.0)
+
+    days = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]
+    histories = {"ABC": (array("d", map(close_timestamp, days[1:])), array("d", [6.0, 6.5, 8.0]))}
+    total, tickers = value_portfolio(portfolio, histories, start=close_timestamp("2024-01-02"))
+
+    abc = tickers["ABC"]
+    assert list(abc.shares) == [10, 10, 20]
+    assert list(abc.market_value) == [60.0, 65.0, 160.0]
+    assert list(abc.cost_basis) == [50.0, 50.0, 120.0]
+    assert abc.returns[-1] == pytest.approx(40 / 120)
+
+    # XYZ has no price history, so it counts at cost.
+    assert list(total.market_value) == [160.0, 165.0, 260.0]
+    assert total.shares is None
+
+
+def test_moments_before_first_close_are_valued_at_cost():
+    portfolio = Portfolio("Test")
+    buy_on(portfolio, "abc", "2024-01-01", 10, 5.0)
+    buy_on(portfolio, "xyz", "2024-01-01", 1, 1.0)
+
+    histories = {
+        "ABC": (array("d", [close_timestamp("2024-01-03")]), array("d", [9.0])),
+        "XYZ": (array("d", map(close_timestamp, ["2024-01-02", "2024-01-03"])), array("d", [2.0, 3.0])),
+    }
+    _, tickers = value_portfolio(portfolio, histories)
+
+    assert list(tickers["ABC"].market_value) == [50.0, 90.0]
+    assert list(tickers["XYZ"].market_value) == [2.0, 3.0]
@@ -0,0 +1,240 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+from itertools import accumulate
+from operator import le
+from typing import Iterable, Iterator, Optional
+
+
+class FenwickTree:
+    """Binary indexed tree over a sequence of floats.
+
+    Supports prefix sums, point updates and appends, each in O(log n).
+    """
+
+    def __init__(self, values: Iterable[float] = ()):
+        """
+        Build a tree over values in O(n).
+        """
+        # 1-indexed; slot 0 is unused.
+        tree = array("d", [0.0])
+        tree.extend(values)
+
+        for index in range(1, len(tree)):
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+
+        self._tree = tree
+
+    def __len__(self) -> int:
+        return len(self._tree) - 1
+
+    def prefix_sum(self, count: int) -> float:
+        """
+        Sum of the first count values.
+        """
+        tree = self._tree
+        total = 0.0
+        while count > 0:
+            total += tree[count]
+            count -= count & -count
+
+        return total
+
+    def add(self, position: int, delta: float):
+        """
+        Add delta to the value at (0-indexed) position.
+        """
+        tree = self._tree
+        index = position + 1
+        while index < len(tree):
+            tree[index] += delta
+            index += index & -index
+
+    def append(self, value: float):
+        """
+        Add a new value to the end of the sequence.
+        """
+        tree = self._tree
+        index = len(tree)
+        # The new node covers (index - lowbit, index], so it holds value plus the
+        # nodes making up the rest of that range.
+        range_start = index - (index & -index)
+        child = index - 1
+        while child > range_start:
+            value += tree[child]
+            child -= child & -child
+
+        tree.append(value)
+
+
+class TimeIndex:
+    """Time-ordered index of positions, for range and point-in-time queries.
+
+    Positions are kept sorted by timestamp in parallel arrays, along with the change each
+    made to shares held and to cost basis. Fenwick trees over those changes give the
+    holdings at any moment as a prefix sum, so both "trades between A and B" and "held at
+    time X" are answered with a binary search and an O(log n) sum.
+
+    Positions arriving in time order are appended in O(1), and added to the prefix sums
+    on the next query. Back-dated positions are inserted in place, and the prefix sums
+    are rebuilt on the next query.
+
+    Attributes:
+        timestamps: POSIX timestamp of each indexed position, in ascending order.
+        position_ids: Id of each indexed position, or None where one was removed.
+        ticker_names: Ticker of each indexed position.
+    """
+
+    def __init__(self):
+        self.timestamps = array("d")
+        self.position_ids: list[Optional[str]] = []
+        self.ticker_names: list[str] = []
+
+        self._share_deltas = array("d")
+        self._value_deltas = array("d")
+        self._share_sums = FenwickTree()
+        self._value_sums = FenwickTree()
+        self._sums_stale = False
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def insert(self, timestamp: float, position_id: str, ticker_name: str, share_delta: float, value_delta: float):
+        """
+        Index a position.
+
+        Arguments:
+            timestamp: POSIX timestamp of the position.
+            position_id: Id of the position.
+            ticker_name: Ticker the position belongs to.
+            share_delta: Change in shares held caused by the position.
+            value_delta: Change in cost basis caused by the position.
+        """
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.position_ids.append(position_id)
+            self.ticker_names.append(ticker_name)
+            self._share_deltas.append(share_delta)
+            self._value_deltas.append(value_delta)
+            return
+
+        row = bisect_right(self.timestamps, timestamp)
+        self.timestamps.insert(row, timestamp)
+        self.position_ids.insert(row, position_id)
+        self.ticker_names.insert(row, ticker_name)
+        self._share_deltas.insert(row, share_delta)
+        self._value_deltas.insert(row, value_delta)
+        self._sums_stale = True
+
+    def extend(
+        self,
+        timestamps: Iterable[float],
+        position_ids: Iterable[str],
+        ticker_names: Iterable[str],
+        share_deltas: Iterable[float],
+        value_deltas: Iterable[float],
+    ):
+        """
+        Index many positions at once, given column-wise. Positions in time order, all at
+        or after the last indexed, are appended. Otherwise the new rows are merged in with
+        one sort, rather than inserted one by one.
+        """
+        first_new_row = len(self.timestamps)
+        self.timestamps.extend(timestamps)
+        self.position_ids.extend(position_ids)
+        self.ticker_names.extend(ticker_names)
+        self._share_deltas.extend(share_deltas)
+        self._value_deltas.extend(value_deltas)
+
+        new_timestamps = self.timestamps[max(first_new_row - 1, 0) :]
+        if all(map(le, new_timestamps, new_timestamps[1:])):
+            return
+
+        # Stable, so positions at the same moment keep the order they were indexed in.
+        order = sorted(range(len(self.timestamps)), key=self.timestamps.__getitem__)
+        self.timestamps = array("d", map(self.timestamps.__getitem__, order))
+        self.position_ids = list(map(self.position_ids.__getitem__, order))
+        self.ticker_names = list(map(self.ticker_names.__getitem__, order))
+        self._share_deltas = array("d", map(self._share_deltas.__getitem__, order))
+        self._value_deltas = array("d", map(self._value_deltas.__getitem__, order))
+        self._sums_stale = True
+
+    def remove(self, timestamp: float, position_id: str) -> bool:
+        """
+        Remove a position from the index, so it no longer counts towards holdings.
+
+        Returns:
+            Whether the position was found.
+        """
+        row = bisect_left(self.timestamps, timestamp)
+
+        while row < len(self.timestamps) and self.timestamps[row] == timestamp:
+            if self.position_ids[row] == position_id:
+                if not self._sums_stale and row < len(self._share_sums):
+                    self._share_sums.add(row, -self._share_deltas[row])
+                    self._value_sums.add(row, -self._value_deltas[row])
+
+                self._share_deltas[row] = 0.0
+                self._value_deltas[row] = 0.0
+                self.position_ids[row] = None
+                return True
+            row += 1
+
+        return False
+
+    def _refresh_sums(self):
+        if self._sums_stale:
+            self._share_sums = FenwickTree(self._share_deltas)
+            self._value_sums = FenwickTree(self._value_deltas)
+            self._sums_stale = False
+            return
+
+        # Bring in anything appended since the last query.
+        for row in range(len(self._share_sums), len(self._share_deltas)):
+            self._share_sums.append(self._share_deltas[row])
+            self._value_sums.append(self._value_deltas[row])
+
+    def holdings_at(self, timestamp: float) -> tuple[float, float]:
+        """
+        Shares held and their cost basis at a moment in time, counting every position
+        made at or before it.
+
+        Returns:
+            Tuple of shares held and cost basis.
+        """
+        self._refresh_sums()
+        count = bisect_right(self.timestamps, timestamp)
+
+        return self._share_sums.prefix_sum(count), self._value_sums.prefix_sum(count)
+
+    def holdings_series(self, timestamps: Iterable[float]) -> tuple[array, array]:
+        """
+        Shares held and cost basis at each of many moments at once. Running totals of the
+        changes are accumulated once, then each moment is a binary search into them, so m
+        moments cost O(n + m log n) rather than m separate prefix sums.
+
+        Returns:
+            Tuple of arrays of shares held and of cost basis, one entry per moment.
+        """
+        share_totals = array("d", accumulate(self._share_deltas, initial=0.0))
+        value_totals = array("d", accumulate(self._value_deltas, initial=0.0))
+        counts = list(map(partial(bisect_right, self.timestamps), timestamps))
+
+        return array("d", map(share_totals.__getitem__, counts)), array("d", map(value_totals.__getitem__, counts))
+
+    def between(self, start: float, end: float) -> Iterator[tuple[float, str, str]]:
+        """
+        Positions made between two moments in time, inclusive, oldest first.
+
+        Returns:
+            An iterator of (timestamp, ticker name, position id) tuples.
+        """
+        first_row = bisect_left(self.timestamps, start)
+        last_row = bisect_right(self.timestamps, end)
+
+        for row in range(first_row, last_row):
+            position_id = self.position_ids[row]
+            if position_id is not None:
+                yield self.timestamps[row], self.ticker_names[row], position_id
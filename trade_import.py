@@ -0,0 +1,308 @@
+import csv
+import datetime
+from functools import lru_cache
+from itertools import islice
+from operator import gt
+from typing import Iterator, Optional
+
+from classes import Portfolio, Position, paused_gc, position_ids
+from clock import to_ns
+from persistence import MAX_TICKER_BYTES
+
+
+# Rows read, validated and applied at a time. Bounds memory, whatever the file size.
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Rejected rows kept, with their reasons, for the summary. Every rejection is counted.
+MAX_REPORTED_REJECTIONS = 100
+
+# Header names brokerages use for each column, lower case. The first found is used.
+COLUMN_ALIASES = {
+    "ticker": ("ticker", "symbol"),
+    "side": ("side", "action", "type", "transaction type", "buy/sell"),
+    "quantity": ("quantity", "qty", "shares"),
+    "price": ("price", "share price", "fill price", "execution price"),
+    "date": ("date", "trade date", "time", "timestamp", "datetime", "executed at"),
+}
+REQUIRED_COLUMNS = ("ticker", "quantity", "price", "date")
+
+# Whether each side, lower case, is a sell.
+SIDES = {"buy": False, "bought": False, "b": False, "sell": True, "sold": True, "s": True}
+
+# Marks blank rows in parse_chunk, which are skipped rather than rejected.
+BLANK = "blank"
+
+US_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M")
+
+
+@lru_cache(maxsize=1 << 16)
+def trade_time_ns(text: str) -> int:
+    """
+    Epoch nanoseconds of a trade date, in ISO format or US month/day/year, with an
+    optional time. Naive times are local. Cached, as exports repeat the same dates.
+
+    Raises:
+        ValueError: If text is not a recognised date.
+    """
+    text = text.strip()
+    try:
+        return to_ns(datetime.datetime.fromisoformat(text))
+    except ValueError:
+        pass
+
+    for date_format in US_DATE_FORMATS:
+        try:
+            return to_ns(datetime.datetime.strptime(text, date_format))
+        except ValueError:
+            continue
+
+    raise ValueError(f"unrecognised date '{text}'")
+
+
+def parse_amount(text: str) -> float:
+    """
+    A number as brokerages write it, allowing a dollar sign and thousands separators.
+
+    Raises:
+        ValueError: If text is not a number.
+    """
+    return float(text.replace("$", "").replace(",", ""))
+
+
+def find_columns(header: list[str]) -> dict[str, int]:
+    """
+    Position of each known column in a header row.
+
+    Raises:
+        ValueError: If a required column is missing.
+    """
+    names = [name.strip().lower() for name in header]
+    columns = {}
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                columns[column] = names.index(alias)
+                break
+
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(missing)}")
+
+    return columns
+
+
+class ImportSummary:
+    """Outcome of a bulk import.
+
+    Attributes:
+        rows: Number of data rows read.
+        buys: Number of buys applied.
+        sells: Number of sells applied.
+        rejected: Number of rows not applied.
+        rejections: (line number, reason) of the first MAX_REPORTED_REJECTIONS rows not
+            applied.
+        tickers: Upper case names of the tickers traded, in order of first trade.
+    """
+
+    __slots__ = ("rows", "buys", "sells", "rejected", "rejections", "tickers")
+
+    def __init__(self):
+        self.rows = 0
+        self.buys = 0
+        self.sells = 0
+        self.rejected = 0
+        self.rejections: list[tuple[int, str]] = []
+        self.tickers: dict[str, None] = {}
+
+    def reject(self, line_number: int, reason: str):
+        self.rejected += 1
+        if len(self.rejections) < MAX_REPORTED_REJECTIONS:
+            self.rejections.append((line_number, reason))
+
+    def __str__(self):
+        return (
+            f"Imported {self.buys + self.sells} of {self.rows} trades"
+            f" ({self.buys} buys, {self.sells} sells) across {len(self.tickers)} tickers."
+            + (f" {self.rejected} rejected." if self.rejected else "")
+        )
+
+
+def convert_column(texts: list[str], convert, problems: list[Optional[str]], column: str) -> list:
+    """
+    Convert a whole column at once, falling back to row by row only when some value will
+    not convert. Rows that fail get None in their place, and a problem noted.
+    """
+    try:
+        return list(map(convert, texts))
+    except ValueError:
+        pass
+
+    values = []
+    for row, text in enumerate(texts):
+        try:
+            values.append(convert(text))
+        except ValueError:
+            values.append(None)
+            problems[row] = problems[row] or f"bad {column} '{text}'"
+
+    return values
+
+
+def parse_chunk(
+    rows: list[list[str]], columns: dict[str, int], first_line: int, summary: ImportSummary
+) -> list[tuple[int, str, Position]]:
+    """
+    Validate and convert a chunk of rows column by column, into positions sorted by time.
+    Rows are counted, and rows that fail validation recorded, on summary.
+
+    Arguments:
+        rows: The chunk's rows, as split by the CSV reader.
+        columns: Position of each column, from find_columns.
+        first_line: Line number in the file of the first row. Line numbers count rows
+            from the header as line 1, so are out by one for each quoted line break.
+        summary: The ImportSummary to record rejections on.
+
+    Returns:
+        (line number, upper case ticker name, Position) of each valid row, oldest first.
+        Rows at the same moment keep their order in the file.
+    """
+    width = max(columns.values()) + 1
+    problems: list[Optional[str]] = [None if len(row) >= width else "too few columns" for row in rows]
+    if any(problems):
+        # Blank lines are skipped, not rejected.
+        for row, fields in enumerate(rows):
+            if not any(fields):
+                problems[row] = BLANK
+        rows = [fields if len(fields) >= width else [""] * width for fields in rows]
+    summary.rows += len(rows) - problems.count(BLANK)
+
+    ticker_names = [row[columns["ticker"]].strip().upper() for row in rows]
+    def column_texts(column: str) -> list[str]:
+        return [fields[columns[column]] for fields in rows]
+
+    quantities = convert_column(column_texts("quantity"), parse_amount, problems, "quantity")
+    prices = convert_column(column_texts("price"), parse_amount, problems, "price")
+    times_ns = convert_column(column_texts("date"), trade_time_ns, problems, "date")
+
+    if "side" in columns:
+        sides = [SIDES.get(row[columns["side"]].strip().lower()) for row in rows]
+    else:
+        # Without a side column, sells are written as negative quantities.
+        sides = [quantity is not None and quantity < 0 for quantity in quantities]
+
+    columns_by_row = zip(ticker_names, quantities, prices, sides)
+    for row, (ticker_name, quantity, price, is_sell) in enumerate(columns_by_row):
+        if problems[row]:
+            continue
+        if not ticker_name or len(ticker_name.encode()) > MAX_TICKER_BYTES:
+            problems[row] = f"bad ticker '{ticker_name}'"
+        elif is_sell is None:
+            problems[row] = f"bad side '{rows[row][columns['side']].strip()}'"
+        elif not quantity or price < 0:
+            problems[row] = "quantity must be non-zero and price not negative"
+
+    for row, problem in enumerate(problems):
+        if problem and problem is not BLANK:
+            summary.reject(first_line + row, problem)
+
+    kept = [row for row, problem in enumerate(problems) if not problem]
+    kept_times_ns = list(map(times_ns.__getitem__, kept))
+    if any(map(gt, kept_times_ns, kept_times_ns[1:])):
+        kept.sort(key=times_ns.__getitem__)
+
+    allocate = position_ids.allocate
+    from_record = Position.from_record
+    with paused_gc():
+        return [
+            (
+                first_line + row,
+                ticker_names[row],
+                from_record(allocate(), abs(quantities[row]), prices[row], sides[row], times_ns[row]),
+            )
+            for row in kept
+        ]
+
+
+def read_chunks(
+    path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[tuple[int, list[list[str]], dict[str, int]]]:
+    """
+    Yield a CSV export's data rows chunk_size at a time, with the line number of each
+    chunk's first row and the columns found in the header.
+
+    Raises:
+        ValueError: If the file is empty or a required column is missing.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as trade_file:
+        reader = csv.reader(trade_file)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("file is empty")
+        columns = find_columns(header)
+
+        first_line = 2
+        while True:
+            chunk = list(islice(reader, chunk_size))
+            if not chunk:
+                return
+            yield first_line, chunk, columns
+            first_line += len(chunk)
+
+
+def import_trades(
+    portfolio: Portfolio,
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    transaction_log=None,
+) -> ImportSummary:
+    """
+    Bulk import a brokerage's trade history CSV into a portfolio.
+
+    The file is read chunk_size rows at a time. Each chunk is validated column by column,
+    sorted by trade time, and applied with Portfolio.import_positions, so each ticker's
+    totals are updated once per run of buys rather than once per trade. Chunks are applied
+    in file order, so the file should be oldest first. Sells are matched FIFO; sells of
+    shares not held are rejected.
+
+    Undo history is cleared, as the imported trades are not in it.
+
+    Arguments:
+        portfolio: The Portfolio to import into.
+        path: Path of the CSV file. It needs a header naming ticker, quantity, price and
+            date columns, and optionally a side column of buy or sell. Without a side
+            column, negative quantities are sells.
+        chunk_size: Optional number of rows per chunk.
+        transaction_log: Optional TransactionLog to record the applied trades to.
+
+    Returns:
+        An ImportSummary.
+
+    Raises:
+        ValueError: If the file has no header or lacks a required column.
+    """
+    summary = ImportSummary()
+
+    # Paused for the whole import, as each chunk leaves the heap larger, and each full
+    # collection revisits everything imported so far.
+    with paused_gc():
+        for first_line, rows, columns in read_chunks(path, chunk_size):
+            trades = parse_chunk(rows, columns, first_line, summary)
+            applied = portfolio.import_positions([trade[1:] for trade in trades])
+
+            if len(applied) < len(trades):
+                applied_ids = {position.id for _, position in applied}
+                for line_number, ticker_name, position in trades:
+                    if position.id not in applied_ids:
+                        summary.reject(line_number, f"not enough {ticker_name} shares held to sell")
+
+            sells = sum(position.is_sell for _, position in applied)
+            summary.sells += sells
+            summary.buys += len(applied) - sells
+            summary.tickers.update(dict.fromkeys(ticker_name for ticker_name, _ in applied))
+
+            if transaction_log is not None:
+                transaction_log.record_trades(applied)
+
+    portfolio.history.clear()
+
+    return summary
@@ -0,0 +1,209 @@
+import datetime
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache, partial
+from operator import add, gt, mul, sub
+from typing import Iterable, Iterator, Optional
+
+from classes import Portfolio, Ticker
+from clock import to_timestamp
+
+
+# Price history files live here under the data directory, one per ticker, as
+# <TICKER>.csv of date and closing price.
+PRICE_HISTORY_DIRECTORY = "prices"
+
+# (POSIX timestamps ascending, closing price at each)
+PriceHistory = tuple[array, array]
+
+END_OF_DAY = datetime.time(23, 59, 59, 999999)
+
+
+@lru_cache(maxsize=1 << 16)
+def close_timestamp(text: str) -> float:
+    """
+    POSIX timestamp of an ISO format date or date and time. A bare date means its close,
+    the very end of that day. Cached, as every ticker's history repeats the same dates.
+
+    Raises:
+        ValueError: If text is not a date.
+    """
+    moment = datetime.datetime.fromisoformat(text)
+    if len(text) == len("YYYY-MM-DD"):
+        moment = datetime.datetime.combine(moment.date(), END_OF_DAY)
+
+    return to_timestamp(moment)
+
+
+def read_price_history(path: str) -> PriceHistory:
+    """
+    Read a price history CSV file. Each line holds a date, or date and time, and a price.
+    An optional header line names the columns; the price is then taken from the 'close'
+    column if there is one, so exports with open, high, low and volume columns can be
+    used as they are. Without a header, the price is the second column.
+
+    Returns:
+        Arrays of timestamps and closing prices, sorted by time.
+    """
+    with open(path) as price_file:
+        lines = [line.split(",") for line in price_file.read().splitlines() if line.strip()]
+
+    price_column = 1
+    if lines:
+        try:
+            close_timestamp(lines[0][0].strip())
+        except ValueError:
+            header = [column.strip().lower() for column in lines.pop(0)]
+            if "close" in header:
+                price_column = header.index("close")
+
+    timestamps = array("d", (close_timestamp(fields[0].strip()) for fields in lines))
+    closes = array("d", (float(fields[price_column]) for fields in lines))
+
+    if any(map(gt, timestamps, timestamps[1:])):
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        timestamps = array("d", map(timestamps.__getitem__, order))
+        closes = array("d", map(closes.__getitem__, order))
+
+    return timestamps, closes
+
+
+def load_price_histories(directory: str, ticker_names: Iterable[str]) -> dict[str, PriceHistory]:
+    """
+    Read the price history of each named ticker that has a <TICKER>.csv file in directory.
+    """
+    histories = {}
+    for ticker_name in ticker_names:
+        path = os.path.join(directory, f"{ticker_name.upper()}.csv")
+        if os.path.exists(path):
+            histories[ticker_name.upper()] = read_price_history(path)
+
+    return histories
+
+
+class ValuationSeries:
+    """Value of some holdings at each of a run of moments.
+
+    Attributes:
+        timestamps: POSIX timestamp of each moment, ascending.
+        shares: Shares held at each moment, or None for a series across tickers.
+        cost_basis: Dollar cost basis of the holdings at each moment.
+        market_value: Dollar value of the holdings at each moment, at the latest close at
+            or before it. Holdings are valued at cost before their first close.
+    """
+
+    __slots__ = ("timestamps", "shares", "cost_basis", "market_value")
+
+    def __init__(self, timestamps: array, shares: Optional[array], cost_basis: array, market_value: array):
+        self.timestamps = timestamps
+        self.shares = shares
+        self.cost_basis = cost_basis
+        self.market_value = market_value
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def pnl(self) -> array:
+        """
+        Unrealized dollar profit or loss at each moment.
+        """
+        return array("d", map(sub, self.market_value, self.cost_basis))
+
+    @property
+    def returns(self) -> array:
+        """
+        Unrealized return on cost at each moment, as a fraction. Zero when nothing is held.
+        """
+        return array("d", (pnl / cost if cost else 0.0 for pnl, cost in zip(self.pnl, self.cost_basis)))
+
+    def rows(self) -> Iterator[tuple[float, float, float, float, float]]:
+        """
+        Yield (timestamp, market value, cost basis, pnl, return) for each moment.
+        """
+        return zip(self.timestamps, self.market_value, self.cost_basis, self.pnl, self.returns)
+
+
+def closes_at(history: PriceHistory, timestamps: Iterable[float]) -> Iterator[float]:
+    """
+    Close in effect at each of timestamps: the latest close at or before it, or 0.0 before
+    the first close. Each lookup is a binary search of the history.
+    """
+    close_timestamps, closes = history
+    # Offset by one, so moments before the first close pick up the leading 0.0.
+    padded_closes = array("d", [0.0])
+    padded_closes.extend(closes)
+
+    return map(padded_closes.__getitem__, map(partial(bisect_right, close_timestamps), timestamps))
+
+
+def value_ticker(ticker: Ticker, timestamps: array, history: Optional[PriceHistory] = None) -> ValuationSeries:
+    """
+    Value a ticker's holdings at each of timestamps.
+
+    Holdings come from running totals of the ticker's position changes, and prices are
+    carried forward from the latest close, each for the whole series at once. The cost is
+    O(positions + moments log(positions + closes)), not moments x positions.
+
+    Arguments:
+        ticker: The Ticker to value.
+        timestamps: Ascending POSIX timestamps to value it at.
+        history: Optional price history of the ticker. Without one, it is valued at cost.
+    """
+    shares, cost_basis = ticker.timeline.holdings_series(timestamps)
+
+    if history is None or not history[0]:
+        return ValuationSeries(timestamps, shares, cost_basis, array("d", cost_basis))
+
+    market_value = array("d", map(mul, shares, closes_at(history, timestamps)))
+
+    unpriced = bisect_left(timestamps, history[0][0])
+    market_value[:unpriced] = cost_basis[:unpriced]
+
+    return ValuationSeries(timestamps, shares, cost_basis, market_value)
+
+
+def value_portfolio(
+    portfolio: Portfolio,
+    histories: dict[str, PriceHistory],
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> tuple[ValuationSeries, dict[str, ValuationSeries]]:
+    """
+    Value every ticker of a portfolio, and the portfolio as a whole, at each close in the
+    price histories.
+
+    Arguments:
+        portfolio: The Portfolio to value.
+        histories: Price history of each ticker, by upper case name. Tickers without one
+            are valued at cost.
+        start: Optional POSIX timestamp of the first moment to value at.
+        end: Optional POSIX timestamp of the last moment to value at.
+
+    Returns:
+        Tuple of the portfolio's series, and each ticker's series by name. Every series
+        covers the same moments: the union of the closes of the held tickers, within
+        start and end.
+    """
+    moments = set()
+    for ticker_name in portfolio.tickers:
+        if ticker_name in histories:
+            moments.update(histories[ticker_name][0])
+
+    timestamps = array("d", sorted(moments))
+    if start is not None:
+        del timestamps[: bisect_left(timestamps, start)]
+    if end is not None:
+        del timestamps[bisect_right(timestamps, end) :]
+
+    ticker_series = {}
+    total_cost = array("d", [0.0]) * len(timestamps)
+    total_value = array("d", total_cost)
+
+    for ticker_name, ticker in portfolio.tickers.items():
+        series = ticker_series[ticker_name] = value_ticker(ticker, timestamps, histories.get(ticker_name))
+        total_cost = array("d", map(add, total_cost, series.cost_basis))
+        total_value = array("d", map(add, total_value, series.market_value))
+
+    return ValuationSeries(timestamps, None, total_cost, total_value), ticker_series